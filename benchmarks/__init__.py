@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The models live in src/ and import each other as top-level modules, as when running src/main.py
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
@@ -0,0 +1,127 @@
+from argparse import ArgumentParser
+import glob
+import itertools
+import json
+import os
+import re
+import resource
+import time
+
+import benchmarks  # noqa: F401  (puts src/ on the path)
+from backends import BACKENDS
+from batch import OPER_CONSTR, too_large
+from benchmarks.suite import run_isolated, seconds
+from instance_cache import load_instance
+
+# Models every backend solves (ISPBridgeColumns needs the duals of Gurobi)
+MODELS = {"ISP": None, "ISPBridge": "pairwise", "ISPBridgeCompact": "compact"}
+
+parser = ArgumentParser(description="Solve the instances with each backend, and find the fastest one per class")
+parser.add_argument("--instances-dir", type=str, default="instances", help="Directory of the instance files")
+parser.add_argument("--backend", choices=BACKENDS, nargs="+", default=BACKENDS, help="Backends to compare")
+parser.add_argument("--model", choices=list(MODELS), nargs="+", default=["ISP"], help="Models")
+parser.add_argument("--objective", choices=["OF1", "OF2"], nargs="+", default=["OF1", "OF2"], help="Objectives")
+parser.add_argument("--oper-constr", choices=list(OPER_CONSTR), nargs="+", default=["off", "on"],
+                    help="Without and/or with the operational constraints")
+parser.add_argument("--threads", type=int, default=0, help="Threads of each solve (0: the backend default)")
+parser.add_argument("--seed", type=int, default=0, help="Random seed of the solvers")
+parser.add_argument("--time-limit", type=float, default=600.0, help="Time limit per solve, in seconds")
+parser.add_argument("--output", type=str, default="backends.json", help="Results file")
+
+
+def instance_class(instance):
+    # Instances of a class share their number of sessions (isp-S400-I240.json: S400), other files are their own class
+    name = os.path.splitext(os.path.basename(instance))[0]
+    match = re.search(r"S\d+", name)
+    return match.group(0) if match else name
+
+
+def run_backend(instance, model_name, objective, oper, backend, threads, seed, time_limit):
+    # One solve, in a worker process of its own (see run_isolated)
+    run = {}
+    try:
+        import gurobipy as gp
+        from models import build_model
+
+        gp.setParam("OutputFlag", 0)
+        start = time.perf_counter()
+        model = build_model(instance, objective, OPER_CONSTR[oper], MODELS[model_name], "mip", backend=backend)
+        run["build_time"] = time.perf_counter() - start
+        model.model.setParam("Threads", threads)
+        model.model.setParam("Seed", seed)
+        model.model.setParam("TimeLimit", time_limit)
+        model.optimize()
+        run["solve_time"] = model.runtime
+        run["status"] = model.result.status
+        run["objective"] = model.objective_value if model.result.sol_count else None
+        run["mip_gap"] = model.mip_gap
+    except Exception as e:
+        run["error"] = f"{type(e).__name__}: {e}"
+    run["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return run
+
+
+def routes(results, backends, option="backend"):
+    # Fastest backend of each instance class: among the backends reaching the best objective of every case of the
+    # class, the one with the least total solve time, else the one with the best total objective. Any other option
+    # of the results can be compared in the same way (backends being then its values)
+    table = {}
+    for name in sorted({r["class"] for r in results}):
+        cases = {}
+        for r in results:
+            if r["class"] == name:
+                key = (r["instance"], r["model"], r["objective_function"], r["oper_constr"])
+                cases.setdefault(key, {})[r[option]] = r
+        best = {key: max((run.get("objective") for run in case.values() if run.get("objective") is not None),
+                         default=None) for key, case in cases.items()}
+        totals = {}
+        for backend in backends:
+            runs = {key: case.get(backend, {}) for key, case in cases.items()}
+            totals[backend] = {
+                "best": all(run.get("objective") is not None and run["objective"] >= best[key] - 1e-6
+                            for key, run in runs.items()),
+                "objective": sum(run.get("objective") or 0.0 for run in runs.values()),
+                "solve_time": sum(run.get("solve_time") or 0.0 for run in runs.values()),
+            }
+        candidates = [backend for backend in backends if totals[backend]["best"]]
+        if candidates:
+            fastest = min(candidates, key=lambda backend: totals[backend]["solve_time"])
+        else:
+            fastest = max(backends, key=lambda backend: (totals[backend]["objective"], -totals[backend]["solve_time"]))
+        table[name] = {option: fastest, "best_objective_everywhere": totals[fastest]["best"],
+                       "solve_time": totals[fastest]["solve_time"]}
+    return table
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    instances = sorted(glob.glob(os.path.join(args.instances_dir, "*.json")))
+    for path in instances:
+        load_instance(path)
+
+    results = []
+    cases = [case for case in itertools.product(instances, args.model, args.objective, args.oper_constr)
+             if not too_large(case[1], case[0])]
+    for k, (instance, model_name, objective, oper) in enumerate(cases, 1):
+        for backend in args.backend:
+            run = run_isolated(run_backend, instance, model_name, objective, oper, backend, args.threads, args.seed,
+                               args.time_limit)
+            result = {"instance": os.path.basename(instance), "class": instance_class(instance), "model": model_name,
+                      "objective_function": objective, "oper_constr": oper, "backend": backend}
+            result.update(run)
+            results.append(result)
+            if "error" in run:
+                outcome = f"ERROR {run['error']}"
+            else:
+                outcome = (f"objective {run['objective']}, gap {run['mip_gap']:.2%}, "
+                           f"solve {seconds(run['solve_time'])}, build {seconds(run['build_time'])}")
+            print(f"[{k}/{len(cases)}] {result['instance']} {model_name} {objective} {oper} {backend}: {outcome}")
+
+    table = routes(results, args.backend)
+    print("\nFastest backend per instance class:")
+    for name, route in table.items():
+        note = "" if route["best_objective_everywhere"] else " (best objectives not reached everywhere)"
+        print(f"  {name}: {route['backend']}, {seconds(route['solve_time'])}{note}")
+    with open(args.output, "w") as f:
+        json.dump({"results": results, "routes": table}, f, indent=2)
+    print(f"Results written to {args.output}")
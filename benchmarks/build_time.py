@@ -0,0 +1,67 @@
+from argparse import ArgumentParser
+import functools
+import resource
+import time
+
+import benchmarks  # noqa: F401  (puts src/ on the path)
+from isp import ISP
+from isp_bridge import ISPBridge
+from isp_bridge_compact import ISPBridgeCompact
+from isp_bridge_columns import ISPBridgeColumns
+from isp_aggregated import ISPAggregated
+
+MODELS = {"ISP": ISP, "ISPBridge": ISPBridge, "ISPBridgeCompact": ISPBridgeCompact,
+          "ISPBridgeColumns": ISPBridgeColumns, "ISPAggregated": ISPAggregated}
+PHASES = ["_add_variables", "_add_base_constraints", "_add_operational_constraints", "_add_objective"]
+
+parser = ArgumentParser(description="Measure the time spent building the ISP models, phase by phase")
+parser.add_argument("--instance", type=str, default="instances/isp-S400-I240.json", help="Path to instance file")
+parser.add_argument("--model", choices=sorted(MODELS), nargs="+", default=["ISP"], help="Models to build")
+parser.add_argument("--objective", choices=["OF1", "OF2"], default="OF1", help="Objective function")
+parser.add_argument("--oper-constr", action="store_true", help="Use operational constraints", default=False)
+parser.add_argument("--repeat", type=int, default=3, help="Number of builds per model (the best one is kept)")
+
+
+def timed(phase, timings, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = method(*args, **kwargs)
+        timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - start
+        return result
+    return wrapper
+
+
+def measure_build(cls, instance, objective, oper_constr):
+    timings = {}
+    originals = {phase: getattr(cls, phase) for phase in PHASES}
+    try:
+        for phase, method in originals.items():
+            setattr(cls, phase, timed(phase, timings, method))
+        start = time.perf_counter()
+        model = cls(instance, objective, oper_constr)
+        timings["total"] = time.perf_counter() - start
+    finally:
+        for phase, method in originals.items():
+            setattr(cls, phase, method)
+    model.model.update()
+    return timings, (model.model.NumVars, model.model.NumConstrs, model.model.NumNZs)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    for name in args.model:
+        best = None
+        for _ in range(args.repeat):
+            timings, size = measure_build(MODELS[name], args.instance, args.objective, args.oper_constr)
+            if best is None or timings["total"] < best["total"]:
+                best = timings
+
+        print(f"\n{name} on {args.instance} ({args.objective}, oper-constr={args.oper_constr})")
+        print(f"Variables: {size[0]}, constraints: {size[1]}, nonzeros: {size[2]}")
+        for phase in PHASES + ["total"]:
+            if phase in best:
+                print(f"{phase:<32}{best[phase]:>8.2f}s")
+
+    # ru_maxrss is in kilobytes on Linux
+    print(f"\nPeak resident memory: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
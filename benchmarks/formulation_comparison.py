@@ -0,0 +1,124 @@
+from argparse import ArgumentParser
+import glob
+import itertools
+import json
+import os
+import resource
+import time
+
+import benchmarks  # noqa: F401  (puts src/ on the path)
+from backends import BACKENDS
+from batch import OPER_CONSTR, too_large
+from benchmarks.backend_comparison import MODELS, instance_class, routes
+from benchmarks.suite import run_isolated, seconds
+from incremental import FORMULATIONS
+from instance_cache import load_instance
+
+parser = ArgumentParser(description="Compare the formulations of the models: LP bound, nodes and solve time")
+parser.add_argument("--instances-dir", type=str, default="instances", help="Directory of the instance files")
+parser.add_argument("--formulation", choices=FORMULATIONS, nargs="+", default=FORMULATIONS,
+                    help="Formulations to compare")
+parser.add_argument("--model", choices=list(MODELS), nargs="+", default=["ISP", "ISPBridgeCompact"], help="Models")
+parser.add_argument("--objective", choices=["OF1", "OF2"], nargs="+", default=["OF1", "OF2"], help="Objectives")
+parser.add_argument("--oper-constr", choices=list(OPER_CONSTR), nargs="+", default=["off", "on"],
+                    help="Without and/or with the operational constraints")
+parser.add_argument("--backend", choices=BACKENDS, default="gurobi", help="Solver of the models")
+parser.add_argument("--threads", type=int, default=1, help="Threads of each solve (0: the backend default)")
+parser.add_argument("--seed", type=int, default=0, help="Random seed of the solvers")
+parser.add_argument("--time-limit", type=float, default=600.0, help="Time limit per solve, in seconds")
+parser.add_argument("--output", type=str, default="formulations.json", help="Results file")
+
+
+def lp_bound(model, backend):
+    # Optimum of the LP relaxation of a built model: solved by Gurobi with the gurobi backend, by HiGHS otherwise
+    from gurobipy import GRB
+
+    if backend == "gurobi":
+        relaxed = model.model.relax()
+        relaxed.optimize()
+        return relaxed.ObjVal if relaxed.Status == GRB.OPTIMAL else None
+
+    import numpy as np
+    from scipy.optimize import Bounds, LinearConstraint, milp
+    from backends import matrix_form, row_bounds
+
+    form = matrix_form(model.model)
+    c, constant = form["objectives"][0][:2]
+    sign = -1.0 if form["maximize"] else 1.0
+    result = milp(sign * c, integrality=np.zeros(len(c), dtype=np.uint8), bounds=Bounds(form["lb"], form["ub"]),
+                  constraints=[LinearConstraint(form["A"], *row_bounds(form["sense"], form["rhs"]))])
+    return sign * result.fun + constant if result.status == 0 else None
+
+
+def run_formulation(instance, model_name, objective, oper, formulation, backend, threads, seed, time_limit):
+    # One build, LP relaxation and solve, in a worker process of its own (see run_isolated)
+    run = {}
+    try:
+        import gurobipy as gp
+        from models import build_model
+
+        gp.setParam("OutputFlag", 0)
+        start = time.perf_counter()
+        model = build_model(instance, objective, OPER_CONSTR[oper], MODELS[model_name], "mip", backend=backend,
+                            formulation=formulation)
+        run["build_time"] = time.perf_counter() - start
+        model.model.update()
+        run["rows"] = model.model.NumConstrs
+        run["nonzeros"] = model.model.NumNZs
+        model.model.setParam("Threads", threads)
+        model.model.setParam("Seed", seed)
+        model.model.setParam("TimeLimit", time_limit)
+
+        start = time.perf_counter()
+        run["lp_bound"] = lp_bound(model, backend)
+        run["lp_time"] = time.perf_counter() - start
+        model.optimize()
+        run["solve_time"] = model.runtime
+        run["status"] = model.result.status
+        run["objective"] = model.objective_value if model.result.sol_count else None
+        run["mip_gap"] = model.mip_gap
+        run["nodes"] = model.result.nodes
+    except Exception as e:
+        run["error"] = f"{type(e).__name__}: {e}"
+    run["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return run
+
+
+def bound(value):
+    return "-" if value is None else f"{value:g}"
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    instances = sorted(glob.glob(os.path.join(args.instances_dir, "*.json")))
+    for path in instances:
+        load_instance(path)
+
+    results = []
+    cases = [case for case in itertools.product(instances, args.model, args.objective, args.oper_constr)
+             if not too_large(case[1], case[0])]
+    for k, (instance, model_name, objective, oper) in enumerate(cases, 1):
+        for formulation in args.formulation:
+            run = run_isolated(run_formulation, instance, model_name, objective, oper, formulation, args.backend,
+                               args.threads, args.seed, args.time_limit)
+            result = {"instance": os.path.basename(instance), "class": instance_class(instance), "model": model_name,
+                      "objective_function": objective, "oper_constr": oper, "formulation": formulation,
+                      "backend": args.backend}
+            result.update(run)
+            results.append(result)
+            if "error" in run:
+                outcome = f"ERROR {run['error']}"
+            else:
+                outcome = (f"objective {bound(run['objective'])}, LP bound {bound(run['lp_bound'])}, "
+                           f"nodes {bound(run['nodes'])}, rows {run['rows']}, solve {seconds(run['solve_time'])}, "
+                           f"build {seconds(run['build_time'])}")
+            print(f"[{k}/{len(cases)}] {result['instance']} {model_name} {objective} {oper} {formulation}: {outcome}")
+
+    table = routes(results, args.formulation, option="formulation")
+    print("\nFastest formulation per instance class:")
+    for name, route in table.items():
+        note = "" if route["best_objective_everywhere"] else " (best objectives not reached everywhere)"
+        print(f"  {name}: {route['formulation']}, {seconds(route['solve_time'])}{note}")
+    with open(args.output, "w") as f:
+        json.dump({"results": results, "routes": table}, f, indent=2)
+    print(f"Results written to {args.output}")
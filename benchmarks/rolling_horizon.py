@@ -0,0 +1,145 @@
+from argparse import ArgumentParser
+import glob
+import itertools
+import json
+import os
+import resource
+import time
+
+import benchmarks  # noqa: F401  (puts src/ on the path)
+from backends import BACKENDS
+from batch import OPER_CONSTR
+from benchmarks.suite import run_isolated, seconds
+from generator import generate
+from instance_cache import load_instance
+from rules import BLOCKS_PER_DAY
+
+parser = ArgumentParser(description="Rolling-horizon solutions against the monolithic ISP model")
+parser.add_argument("--instances", type=str, nargs="+", default=["instances/*.json"],
+                    help="Instance files or glob patterns")
+parser.add_argument("--objective", choices=["OF1", "OF2"], nargs="+", default=["OF1", "OF2"], help="Objectives")
+parser.add_argument("--oper-constr", choices=list(OPER_CONSTR), nargs="+", default=["on"],
+                    help="Without and/or with the operational constraints")
+parser.add_argument("--window-days", type=int, default=2, help="Days of each window")
+parser.add_argument("--overlap-days", type=int, default=1, help="Days of each window solved again in the next one")
+parser.add_argument("--backend", choices=BACKENDS, default="gurobi", help="Solver of the models")
+parser.add_argument("--horizons", type=int, nargs="*", default=[],
+                    help="Also solve generated instances of these numbers of days with the rolling horizon only, to "
+                         "check that the time and memory of a step do not grow with the horizon")
+parser.add_argument("--sessions-per-block", type=int, default=10, help="Sessions per block of the generated instances")
+parser.add_argument("--interpreters", type=int, default=120, help="Interpreters of the generated instances")
+parser.add_argument("--instances-dir", type=str, default="instances/rolling",
+                    help="Directory of the generated instances (kept, and reused when they exist)")
+parser.add_argument("--threads", type=int, default=1, help="Threads of each solve")
+parser.add_argument("--time-limit", type=float, default=600.0,
+                    help="Time limit of the monolithic model and of each window, in seconds")
+parser.add_argument("--output", type=str, default="rolling.json", help="Results file")
+
+
+def run_model(instance, objective, oper, rolling, window_days, overlap_days, backend, threads, time_limit):
+    # One solve of the monolithic model (rolling=False) or of the rolling horizon, in a worker process of its own
+    run = {}
+    try:
+        import gurobipy as gp
+        from models import build_model
+
+        gp.setParam("OutputFlag", 0)
+        start = time.perf_counter()
+        model = build_model(instance, objective, OPER_CONSTR[oper], None, "rolling" if rolling else "mip",
+                            backend=backend, window_days=window_days, overlap_days=overlap_days)
+        run["build_time"] = time.perf_counter() - start
+        if rolling:
+            model.threads = threads
+            model.time_limit = time_limit
+        else:
+            model.model.setParam("Threads", threads)
+            model.model.setParam("TimeLimit", time_limit)
+        model.optimize()
+        run["runtime"] = model.runtime
+        run["objective"] = model.objective_value if rolling or model.result.sol_count else None
+        run["mip_gap"] = model.mip_gap if run["objective"] is not None else None
+        if rolling:
+            run["steps"] = model.history
+    except Exception as e:
+        run["error"] = f"{type(e).__name__}: {e}"
+    run["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return run
+
+
+def step_summary(steps):
+    # Largest window model, slowest step and largest memory of a window, and how much the resident memory after a
+    # step grows from the first step to the last one, and over the second half of the steps (the first steps also
+    # warm up the allocator and the solver)
+    return {
+        "steps": len(steps),
+        "max_step_variables": max(step["variables"] for step in steps),
+        "max_step_time": max(step["build_time"] + step["solve_time"] for step in steps),
+        "max_window_rss_mb": max(step["window_rss_mb"] for step in steps),
+        "step_rss_growth_mb": steps[-1]["rss_mb"] - steps[0]["rss_mb"],
+        "late_step_rss_growth_mb": steps[-1]["rss_mb"] - steps[len(steps) // 2]["rss_mb"],
+    }
+
+
+def compare(instance, objective, oper, args):
+    rolling = run_isolated(run_model, instance, objective, oper, True, args.window_days, args.overlap_days,
+                           args.backend, args.threads, args.time_limit)
+    monolithic = run_isolated(run_model, instance, objective, oper, False, args.window_days, args.overlap_days,
+                              args.backend, args.threads, args.time_limit)
+    result = {"instance": os.path.basename(instance), "objective_function": objective, "oper_constr": oper,
+              "rolling": rolling, "monolithic": monolithic}
+    if "error" in rolling or "error" in monolithic:
+        error = rolling.get("error") or monolithic.get("error")
+        print(f"{result['instance']} {objective} {oper}: ERROR {error}")
+        return result
+    result.update(step_summary(rolling["steps"]))
+    if monolithic["objective"] is not None:
+        # Relative loss of the rolling horizon against the monolithic solution, 0 when it does as well
+        best = monolithic["objective"]
+        result["gap_to_monolithic"] = (best - rolling["objective"]) / abs(best) if best else 0.0
+    outcome = (f"rolling {rolling['objective']} in {seconds(rolling['runtime'])} ({result['steps']} steps, at most "
+               f"{result['max_step_variables']} variables), monolithic {monolithic['objective']}")
+    if "gap_to_monolithic" in result:
+        outcome += (f" (gap {monolithic['mip_gap']:.2%}) in {seconds(monolithic['runtime'])}, "
+                    f"loss {result['gap_to_monolithic']:.2%}")
+    print(f"{result['instance']} {objective} {oper}: {outcome}")
+    return result
+
+
+def horizon(days, objective, oper, args):
+    # Rolling horizon alone on a generated instance of the given number of days
+    blocks = days * BLOCKS_PER_DAY
+    n_sessions = blocks * args.sessions_per_block
+    path = os.path.join(args.instances_dir, f"isp-D{days}-S{n_sessions}-I{args.interpreters}.json")
+    if not os.path.exists(path):
+        generate(path, n_sessions, args.interpreters, blocks)
+    load_instance(path)
+    run = run_isolated(run_model, path, objective, oper, True, args.window_days, args.overlap_days, args.backend,
+                       args.threads, args.time_limit)
+    result = {"instance": os.path.basename(path), "days": days, "objective_function": objective, "oper_constr": oper,
+              "rolling": run}
+    if "error" in run:
+        print(f"{days} days {objective} {oper}: ERROR {run['error']}")
+        return result
+    result.update(step_summary(run["steps"]))
+    print(f"{days} days {objective} {oper}: {result['steps']} steps in {seconds(run['runtime'])}, slowest step "
+          f"{seconds(result['max_step_time'])}, window memory at most {result['max_window_rss_mb']:.0f} MB, memory "
+          f"growth {result['step_rss_growth_mb']:+.0f} MB from the first step to the last, "
+          f"{result['late_step_rss_growth_mb']:+.0f} MB over the second half")
+    return result
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    instances = sorted({path for pattern in args.instances for path in glob.glob(pattern)})
+    for path in instances:
+        load_instance(path)
+
+    results = [compare(instance, objective, oper, args)
+               for instance, objective, oper in itertools.product(instances, args.objective, args.oper_constr)]
+    if args.horizons:
+        os.makedirs(args.instances_dir, exist_ok=True)
+    horizons = [horizon(days, objective, oper, args)
+                for days, objective, oper in itertools.product(args.horizons, args.objective, args.oper_constr)]
+    with open(args.output, "w") as f:
+        json.dump({"settings": vars(args), "results": results, "horizons": horizons}, f, indent=2)
+    print(f"Results written to {args.output}")
@@ -0,0 +1,93 @@
+from argparse import ArgumentParser
+import json
+import os
+
+import matplotlib.pyplot as plt
+
+import benchmarks  # noqa: F401  (puts src/ on the path)
+from batch import GUROBI_SOLVERS, MODELS, make_jobs
+from benchmarks.suite import format_case, run_case, run_isolated, summarize
+from generator import default_output, generate
+from instance_cache import load_instance
+
+GUROBI_MODELS = sorted(name for name, (_, solver) in MODELS.items() if solver in GUROBI_SOLVERS)
+
+parser = ArgumentParser(description="Build and solve time of the models against the size of generated instances")
+parser.add_argument("--sizes", type=str, nargs="+",
+                    default=["400x240", "1000x400", "2500x600", "5000x800", "10000x1000"],
+                    help="Instance sizes, as <sessions>x<interpreters>")
+parser.add_argument("--blocks", type=int, default=40, help="Number of blocks of the instances")
+parser.add_argument("--seed", type=int, default=0, help="Seed of the generated instances")
+parser.add_argument("--instances-dir", type=str, default="instances/scaling",
+                    help="Directory of the generated instances (kept, and reused when they exist)")
+parser.add_argument("--model", choices=GUROBI_MODELS, nargs="+",
+                    default=["ISP", "ISPBridgeCompact", "ISPBridgeColumns"], help="Model variants")
+parser.add_argument("--objective", choices=["OF1", "OF2"], nargs="+", default=["OF1"], help="Objective functions")
+parser.add_argument("--oper-constr", action="store_true", help="Use operational constraints", default=False)
+parser.add_argument("--all-sizes", action="store_true", default=False,
+                    help="Also run ISPBridge on instances without 40 sessions or interpreters")
+parser.add_argument("--build-only", action="store_true", default=False, help="Only build the models")
+parser.add_argument("--repeat", type=int, default=1, help="Runs of each case, the median times are kept")
+parser.add_argument("--threads", type=int, default=1, help="Gurobi Threads parameter")
+parser.add_argument("--time-limit", type=float, default=600.0, help="Gurobi time limit per solve, in seconds")
+parser.add_argument("--output", type=str, default="scaling.json", help="Results file")
+parser.add_argument("--plot", type=str, default="scaling.png", help="Plot file")
+
+
+def parse_size(size):
+    n_sessions, n_interpreters = map(int, size.lower().split("x"))
+    return n_sessions, n_interpreters
+
+
+def plot(results, path, build_only=False):
+    # Build (and solve) time against the number of sessions, one line per model and objective
+    measures = ["build_time"] if build_only else ["build_time", "solve_time"]
+    fig, axes = plt.subplots(1, len(measures), figsize=(7 * len(measures), 5), squeeze=False)
+    series = sorted({(r["model"], r["objective_function"]) for r in results})
+    for ax, measure in zip(axes[0], measures):
+        for model, objective in series:
+            points = sorted((r["sessions"], r[measure]) for r in results if r.get(measure) is not None
+                            and (r["model"], r["objective_function"]) == (model, objective))
+            if points:
+                ax.plot(*zip(*points), marker="o", label=f"{model} {objective}")
+        if ax.lines:
+            ax.legend()
+        ax.set_xscale("log")
+        ax.set_yscale("log")
+        ax.set_xlabel("Sessions")
+        ax.set_ylabel("Seconds")
+        ax.set_title(measure.replace("_", " ").capitalize())
+        ax.grid(True, which="both", linestyle="--", alpha=0.7)
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    os.makedirs(args.instances_dir, exist_ok=True)
+    instances = {}
+    for size in args.sizes:
+        n_sessions, n_interpreters = parse_size(size)
+        path = os.path.join(args.instances_dir, os.path.basename(default_output(n_sessions, n_interpreters, args.seed)))
+        if not os.path.exists(path):
+            generate(path, n_sessions, n_interpreters, args.blocks, seed=args.seed)
+        load_instance(path)
+        instances[path] = (n_sessions, n_interpreters)
+
+    oper = ["on" if args.oper_constr else "off"]
+    jobs = make_jobs(list(instances), args.model, args.objective, oper, args.all_sizes)
+    results = []
+    for k, job in enumerate(jobs, 1):
+        runs = [run_isolated(run_case, job, args.threads, 0, args.time_limit, not args.build_only)
+                for _ in range(args.repeat)]
+        n_sessions, n_interpreters = instances[job[0]]
+        result = {"instance": os.path.basename(job[0]), "sessions": n_sessions, "interpreters": n_interpreters,
+                  "model": job[1], "objective_function": job[2], "oper_constr": job[3]}
+        result.update(summarize(runs))
+        results.append(result)
+        print(f"[{k}/{len(jobs)}] {result['instance']} {job[1]} {job[2]}: {format_case(result)}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    plot(results, args.plot, args.build_only)
+    print(f"Results written to {args.output}, plot to {args.plot}")
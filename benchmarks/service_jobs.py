@@ -0,0 +1,79 @@
+from argparse import ArgumentParser
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import benchmarks  # noqa: F401  (puts src/ on the path)
+from benchmarks import SRC_DIR
+from benchmarks.suite import seconds
+from isp_flow import ISPFlow
+from models import SOLVERS
+from service import Client
+
+parser = ArgumentParser(description="Solve an instance with every solver through the solve service, and check that "
+                                    "each job ends with a result")
+parser.add_argument("--instance", type=str, default="instances/example.json", help="Path to instance file")
+parser.add_argument("--solver", choices=SOLVERS, nargs="+", default=SOLVERS, help="Solvers of the jobs")
+parser.add_argument("--objective", choices=["OF1", "OF2"], nargs="+", default=["OF1"], help="Objectives")
+parser.add_argument("--oper-constr", choices=["off", "on"], nargs="+", default=["off", "on"],
+                    help="Without and/or with the operational constraints")
+parser.add_argument("--workers", type=int, default=1, help="Workers of the service")
+# More than one thread per worker: ISPDecomposed then solves its blocks in a pool of the worker
+parser.add_argument("--threads", type=int, default=2, help="Gurobi threads of each worker")
+parser.add_argument("--time-limit", type=float, default=60.0, help="Time limit of each job, in seconds")
+parser.add_argument("--output", type=str, default="service_jobs.json", help="Results file")
+
+
+def start_service(path, workers, threads, timeout=60.0):
+    # Service in a process of its own, returned once it accepts connections
+    process = subprocess.Popen([sys.executable, os.path.join(SRC_DIR, "service.py"), "serve", "--socket", path,
+                                "--workers", str(workers), "--threads", str(workers * threads)])
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            return process, Client(path)
+        except OSError:
+            if process.poll() is not None or time.perf_counter() > deadline:
+                process.kill()
+                raise RuntimeError(f"The service did not start (exit code {process.poll()})")
+            time.sleep(0.1)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    path = os.path.join(tempfile.mkdtemp(), "isp-service.sock")
+    process, client = start_service(path, args.workers, args.threads)
+    results = []
+    try:
+        for solver in args.solver:
+            for objective in args.objective:
+                for oper in args.oper_constr:
+                    if solver == "flow" and not ISPFlow.supports(objective, oper == "on"):
+                        continue
+                    events = list(client.solve(instance=args.instance, solver=solver, objective=objective,
+                                               oper_constr=oper == "on", time_limit=args.time_limit))
+                    last = events[-1]
+                    result = {"solver": solver, "objective_function": objective, "oper_constr": oper,
+                              "event": last["event"], "model": last.get("model"),
+                              "objective": last.get("objective_value"), "latency": last["latency"],
+                              "error": last.get("error")}
+                    results.append(result)
+                    outcome = (f"{result['model']} {result['objective']} in {seconds(result['latency'])}"
+                               if last["event"] == "result" else f"{last['event'].upper()} {result['error'] or ''}")
+                    print(f"{solver} {objective} {oper}: {outcome}", flush=True)
+    finally:
+        try:
+            client.request("shutdown")
+        except OSError:
+            process.kill()
+        client.close()
+        process.wait()
+
+    with open(args.output, "w") as f:
+        json.dump({"settings": vars(args), "results": results}, f, indent=2)
+    failed = [r for r in results if r["event"] != "result"]
+    print(f"{len(results) - len(failed)}/{len(results)} jobs ended with a result, results written to {args.output}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,227 @@
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import datetime
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+import benchmarks  # noqa: F401  (puts src/ on the path)
+from batch import MODELS, OPER_CONSTR, make_jobs
+from instance_cache import load_instance
+
+# Version of the baseline files, changed whenever the cases or the measures change meaning
+VERSION = 1
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+# Fixed matrix of each tier: every combination of its instances, models, objectives and operational constraints
+# (without the combinations batch.make_jobs leaves out, such as ISPBridge on the large instances)
+TIERS = {
+    "quick": {
+        "instances": ["example.json", "isp-S40-I40.json", "isp-S40-I120.json", "isp-S40-I240.json"],
+        "models": ["ISP", "ISPBridge"],
+        "objectives": ["OF1", "OF2"],
+        "oper_constr": ["off", "on"],
+    },
+    "full": {
+        "instances": ["isp-S400-I40.json", "isp-S400-I120.json", "isp-S400-I240.json"],
+        "models": ["ISP", "ISPBridgeCompact", "ISPBridgeColumns"],
+        "objectives": ["OF1", "OF2"],
+        "oper_constr": ["off", "on"],
+    },
+}
+
+parser = ArgumentParser(description="Benchmark suite: runs a fixed matrix of cases and compares it to a baseline")
+parser.add_argument("--tier", choices=list(TIERS), default="quick", help="Cases to run")
+parser.add_argument("--instances-dir", type=str, default="instances", help="Directory of the instance files")
+parser.add_argument("--repeat", type=int, default=3, help="Runs of each case, the median times are kept")
+parser.add_argument("--threads", type=int, default=1, help="Gurobi Threads parameter")
+parser.add_argument("--seed", type=int, default=0, help="Gurobi Seed parameter")
+parser.add_argument("--time-limit", type=float, default=600.0, help="Gurobi time limit per run, in seconds")
+parser.add_argument("--baseline", type=str, default=None,
+                    help="Baseline file (default: benchmarks/baselines/<tier>.json)")
+parser.add_argument("--record", action="store_true", default=False,
+                    help="Write the results as the new baseline instead of comparing them to it")
+parser.add_argument("--threshold", type=float, default=0.25,
+                    help="Relative increase of the build or solve time reported as a regression")
+parser.add_argument("--min-seconds", type=float, default=0.05,
+                    help="Time increases below this many seconds are never regressions (timer noise)")
+parser.add_argument("--output", type=str, default=None, help="Also write the results of this run to this file")
+
+
+def case_key(instance, model, objective, oper):
+    return f"{os.path.basename(instance)}|{model}|{objective}|{oper}"
+
+
+def run_case(job, threads, seed, time_limit, solve=True):
+    # One run of a case, in a worker process of its own so that the peak RSS is the one of this run (the build
+    # alone when solve is False)
+    instance, model_name, objective, oper = job
+    run = {}
+    try:
+        import gurobipy as gp
+        from models import build_model
+
+        gp.setParam("OutputFlag", 0)
+        bridging, solver = MODELS[model_name]
+        start = time.perf_counter()
+        model = build_model(instance, objective, OPER_CONSTR[oper], bridging, solver, profile=True)
+        run["build_time"] = time.perf_counter() - start
+        if solve:
+            model.model.setParam("Threads", threads)
+            model.model.setParam("Seed", seed)
+            model.model.setParam("TimeLimit", time_limit)
+            model.optimize()
+
+            run["solve_time"] = model.runtime
+            run["status"] = model.model.Status
+            run["objective"] = model.model.ObjVal if model.model.SolCount else None
+            # First incumbent of the last solve (the MIP, after the LP relaxations of ISPBridgeColumns)
+            trajectory = model.profile()["solves"][-1]["trajectory"]
+            run["first_incumbent_time"] = next((p["time"] for p in trajectory if p["incumbent"] is not None), None)
+    except Exception as e:
+        run["error"] = f"{type(e).__name__}: {e}"
+    # ru_maxrss is in kilobytes on Linux
+    run["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return run
+
+
+def run_isolated(function, *args):
+    # function(*args) (run_case) in a fresh process, one at a time so that the runs do not compete for the CPU and
+    # memory. A worker killed by the system (out of memory) fails the run instead of the suite
+    with ProcessPoolExecutor(1) as pool:
+        try:
+            return pool.submit(function, *args).result()
+        except BrokenProcessPool:
+            return {"error": "worker process terminated abruptly (out of memory?)"}
+
+
+def summarize(runs):
+    # Median of the times over the runs, largest memory, worst objective (all are maximized), and the first error.
+    # A run whose solve failed still counts for the build time
+    summary = {"runs": len(runs)}
+    if any("build_time" in run for run in runs):
+        summary["status"] = next((run["status"] for run in runs if "status" in run), None)
+        for measure in ("build_time", "solve_time", "first_incumbent_time"):
+            values = [run[measure] for run in runs if run.get(measure) is not None]
+            summary[measure] = statistics.median(values) if values else None
+        summary["max_rss_mb"] = max(run["max_rss_mb"] for run in runs)
+        objectives = [run["objective"] for run in runs if run.get("objective") is not None]
+        summary["objective"] = min(objectives) if objectives else None
+    errors = [run["error"] for run in runs if "error" in run]
+    if errors:
+        summary["error"] = errors[0]
+    return summary
+
+
+def environment():
+    import gurobipy as gp
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "gurobi": ".".join(map(str, gp.gurobi.version())),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_suite(tier, instances_dir, repeat, threads, seed, time_limit):
+    spec = TIERS[tier]
+    instances = [os.path.join(instances_dir, name) for name in spec["instances"]]
+    # Compiled once, the runs then load them from the instance cache
+    for path in instances:
+        load_instance(path)
+    jobs = make_jobs(instances, spec["models"], spec["objectives"], spec["oper_constr"])
+
+    cases = {}
+    for k, job in enumerate(jobs, 1):
+        runs = [run_isolated(run_case, job, threads, seed, time_limit) for _ in range(repeat)]
+        key = case_key(*job)
+        cases[key] = summarize(runs)
+        print(f"[{k}/{len(jobs)}] {key}: {format_case(cases[key])}")
+    return {
+        "version": VERSION,
+        "tier": tier,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "settings": {"repeat": repeat, "threads": threads, "seed": seed, "time_limit": time_limit},
+        "environment": environment(),
+        "cases": cases,
+    }
+
+
+def seconds(value):
+    return "-" if value is None else f"{value:.3f}s"
+
+
+def format_case(case):
+    if "build_time" not in case:
+        return f"ERROR {case['error']}"
+    text = (f"objective {case['objective']}, build {seconds(case['build_time'])}, solve {seconds(case['solve_time'])}, "
+            f"first incumbent {seconds(case['first_incumbent_time'])}, {case['max_rss_mb']:.0f} MB")
+    return text + (f" (ERROR {case['error']})" if "error" in case else "")
+
+
+def compare(results, baseline, threshold, min_seconds):
+    # Regressions of results against baseline: slower build or solve, worse objective, new error or missing case
+    regressions = []
+    for key, reference in baseline["cases"].items():
+        case = results["cases"].get(key)
+        if case is None:
+            regressions.append(f"{key}: missing from this run")
+            continue
+        if "error" in case and "error" not in reference:
+            regressions.append(f"{key}: {case['error']}")
+            continue
+        if "error" in reference:
+            continue
+        for measure in ("build_time", "solve_time"):
+            before, after = reference[measure], case[measure]
+            if after > before * (1 + threshold) and after - before > min_seconds:
+                regressions.append(f"{key}: {measure} {before:.3f}s -> {after:.3f}s (+{after / before - 1:.0%})")
+        if reference["objective"] is not None and (case["objective"] is None
+                                                   or case["objective"] < reference["objective"] - 1e-6):
+            regressions.append(f"{key}: objective {reference['objective']} -> {case['objective']}")
+    return regressions
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    baseline_path = args.baseline or os.path.join(BASELINE_DIR, f"{args.tier}.json")
+    results = run_suite(args.tier, args.instances_dir, args.repeat, args.threads, args.seed, args.time_limit)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.record:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline written to {baseline_path}")
+        sys.exit(0)
+
+    if not os.path.exists(baseline_path):
+        sys.exit(f"\nNo baseline {baseline_path}, record one with --record")
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline.get("version") != VERSION:
+        sys.exit(f"\nBaseline {baseline_path} has version {baseline.get('version')}, expected {VERSION}: "
+                 "record it again with --record")
+    if baseline["settings"] != results["settings"]:
+        print(f"\nWarning: the baseline was recorded with {baseline['settings']}")
+
+    regressions = compare(results, baseline, args.threshold, args.min_seconds)
+    if regressions:
+        print(f"\n{len(regressions)} regressions against {baseline_path}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"\nNo regression against {baseline_path} ({len(baseline['cases'])} cases)")
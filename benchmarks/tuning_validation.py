@@ -0,0 +1,70 @@
+from argparse import ArgumentParser
+import json
+import os
+
+import benchmarks  # noqa: F401  (puts src/ on the path)
+from generator import LANGUAGES, generate
+from tuning import speedup, tune, validate
+
+parser = ArgumentParser(description="Tune the Gurobi parameters on generated instances, and validate the profiles on "
+                                    "held-out instances of the same classes")
+parser.add_argument("--sizes", type=str, nargs="+", default=["400x240", "1000x400"],
+                    help="Instance sizes, as <sessions>x<interpreters>")
+parser.add_argument("--blocks", type=int, default=40, help="Number of blocks of the instances")
+parser.add_argument("--languages", type=int, default=len(LANGUAGES), help="Number of languages of the instances")
+parser.add_argument("--session-languages", type=str, default="4-24",
+                    help="Distribution of the number of languages of a session, as in generator.py")
+parser.add_argument("--train-seeds", type=int, nargs="+", default=[0, 1, 2], help="Seeds of the tuning instances")
+parser.add_argument("--test-seeds", type=int, nargs="+", default=[100, 101, 102],
+                    help="Seeds of the held-out instances")
+parser.add_argument("--instances-dir", type=str, default="instances/tuning",
+                    help="Directory of the generated instances (kept, and reused when they exist)")
+parser.add_argument("--model", choices=["ISP", "ISPBridge", "ISPBridgeCompact"], default="ISP", help="Model")
+parser.add_argument("--objective", choices=["OF1", "OF2"], default="OF1", help="Objective function")
+parser.add_argument("--oper-constr", action="store_true", default=False, help="Use operational constraints")
+parser.add_argument("--method", choices=["sweep", "gurobi"], default="sweep", help="Tuning method, as in tuning.py")
+parser.add_argument("--seeds", type=int, nargs="+", default=[0, 1], help="Gurobi seeds of each solve")
+parser.add_argument("--threads", type=int, default=1, help="Gurobi Threads parameter")
+parser.add_argument("--time-limit", type=float, default=60.0, help="Time limit per solve, in seconds")
+parser.add_argument("--profiles", type=str, default="tuning_profiles.json",
+                    help="Profiles file written by the tuning (src/tuning_profiles.json is the one the models use)")
+parser.add_argument("--output", type=str, default="tuning_validation.json", help="Results file")
+
+
+def instances(sizes, seeds, args):
+    paths = []
+    for size in sizes:
+        n_sessions, n_interpreters = map(int, size.lower().split("x"))
+        for seed in seeds:
+            path = os.path.join(args.instances_dir, f"isp-S{n_sessions}-I{n_interpreters}-seed{seed}.json")
+            if not os.path.exists(path):
+                generate(path, n_sessions, n_interpreters, args.blocks, n_languages=args.languages,
+                         session_languages=args.session_languages, seed=seed)
+            paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    os.makedirs(args.instances_dir, exist_ok=True)
+    train = instances(args.sizes, args.train_seeds, args)
+    test = instances(args.sizes, args.test_seeds, args)
+
+    print(f"Tuning on {len(train)} instances")
+    profiles = tune(train, args.model, args.objective, args.oper_constr, method=args.method, seeds=args.seeds,
+                    threads=args.threads, time_limit=args.time_limit, path=args.profiles)
+    print(f"\nValidation on {len(test)} held-out instances")
+    results = validate(test, args.model, args.objective, args.oper_constr, seeds=args.seeds, threads=args.threads,
+                       time_limit=args.time_limit, path=args.profiles)
+
+    summary = {}
+    for key in sorted({r["class"] for r in results}):
+        members = [r for r in results if r["class"] == key]
+        summary[key] = {"speedup": speedup(members), "default_runtime": sum(r["default_runtime"] for r in members),
+                        "tuned_runtime": sum(r["tuned_runtime"] for r in members)}
+        gain = summary[key]["speedup"]
+        print(f"  {key}: {'no profile' if gain is None else f'{gain:.2f}x'} "
+              f"({summary[key]['tuned_runtime']:.3f}s against {summary[key]['default_runtime']:.3f}s)")
+    with open(args.output, "w") as f:
+        json.dump({"profiles": profiles, "results": results, "classes": summary}, f, indent=2)
+    print(f"Results written to {args.output}")
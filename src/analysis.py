@@ -0,0 +1,163 @@
+from argparse import ArgumentParser
+
+import numpy as np
+
+from instance_cache import load_instance
+from isp_flow import hopcroft_karp
+from rules import Rules, as_rules
+
+parser = ArgumentParser(description="Static analysis of an instance: what can never be covered, and upper bounds")
+parser.add_argument("--instance", type=str, default="instances/example.json", help="Path to instance file")
+parser.add_argument("--bridging", action="store_true", default=False, help="Allow bridges")
+parser.add_argument("--oper-constr", action="store_true", default=False, help="Use operational constraints")
+parser.add_argument("--rules", type=str, default=None,
+                    help="JSON file of the operational rules (implies --oper-constr, see rules.py)")
+
+
+class Analysis:
+    # What can be told about an instance before building a model, from matchings between language pairs and
+    # interpreters. An interpreter covers at most one pair per session and takes part in one session per block, so:
+    # - a pair without eligible interpreter (nor bridge, with bridging) is never covered;
+    # - a session is only fully covered if its pairs can be matched to distinct interpreters (with bridges, if it
+    #   has at most as many pairs as there are interpreters and each pair can be covered somehow);
+    # - the pairs covered in a block are at most a maximum matching of all the pairs of the block (at most the
+    #   number of interpreters with bridging), and the sessions fully covered in a block need distinct interpreters.
+    # The models use it to fix the y, u and t variables that are always 0 (see IncrementalModel._apply_analysis).
+
+    def __init__(self, data, bridging=None):
+        self.data = data
+        self.bridging = bool(bridging)
+        self.n_entries = len(data.session_pair_indices)
+
+        # direct[k], coverable[k]: whether the pair of the k-th y entry has an eligible interpreter, and whether it
+        # can be covered at all (directly or via a bridge)
+        n_eligible = np.diff(data.pair_interpreter_ptr)
+        self.direct = n_eligible[data.session_pair_indices] > 0
+        self.coverable = self.direct | self._bridgeable()[data.session_pair_indices] if self.bridging else self.direct
+
+        # completable[s]: whether session s can be fully covered
+        self.completable = np.array([self.session_completable(s) for s in range(data.n_sessions)], dtype=bool)
+
+        # Bounds of each block: pairs covered (OF1) and sessions fully covered (OF2)
+        self.block_pairs = np.zeros(data.n_blocks, dtype=np.int64)
+        self.block_sessions = np.zeros(data.n_blocks, dtype=np.int64)
+        entry_block = np.repeat(data.session_block, np.diff(data.session_pair_ptr))
+        for b in range(data.n_blocks):
+            if self.bridging:
+                self.block_pairs[b] = min(int(self.coverable[entry_block == b].sum()), data.n_interpreters)
+            else:
+                pairs = data.session_pair_indices[entry_block == b]
+                adjacency = [data.eligible_interpreters(p) for p in pairs.tolist()]
+                self.block_pairs[b] = sum(1 for v in hopcroft_karp(adjacency, data.n_interpreters) if v != -1)
+            self.block_sessions[b] = self._fitting_sessions(data.block_sessions(b), data.n_interpreters)
+
+    def _bridgeable(self):
+        # bridgeable[p]: whether two distinct interpreters can relay the pair p = (l1, l2) through a third language
+        data = self.data
+        speaks = data.language_matrix
+        bridgeable = np.zeros(data.n_pairs, dtype=bool)
+        for p in np.flatnonzero(np.diff(data.pair_session_ptr)).tolist():
+            l1, l2 = data.pair_languages[p].tolist()
+            first = speaks[:, [l1]] & speaks
+            second = speaks[:, [l2]] & speaks
+            n_first, n_second = first.sum(axis=0), second.sum(axis=0)
+            # Only one interpreter on both sides, and the same one, is not a bridge
+            alone = (n_first == 1) & (n_second == 1) & (first == second).all(axis=0)
+            valid = (n_first > 0) & (n_second > 0) & ~alone
+            valid[[l1, l2]] = False
+            bridgeable[p] = valid.any()
+        return bridgeable
+
+    def session_completable(self, s):
+        data = self.data
+        low, high = data.session_pair_ptr[s], data.session_pair_ptr[s + 1]
+        if high - low > data.n_interpreters or not self.coverable[low:high].all():
+            return False
+        if self.bridging:
+            return True
+        adjacency = [data.eligible_interpreters(p) for p in data.session_pair_indices[low:high].tolist()]
+        return all(v != -1 for v in hopcroft_karp(adjacency, data.n_interpreters))
+
+    def fully_covered_together(self, sessions):
+        # Whether the completable sessions can all be fully covered at the same time, within a block: with
+        # bridging, if they have at most as many pairs as there are interpreters, else if all their pairs can be
+        # matched to distinct interpreters
+        data = self.data
+        pairs = [p for s in sessions for p in data.session_pairs(s)]
+        if len(pairs) > data.n_interpreters:
+            return False
+        if self.bridging:
+            return True
+        adjacency = [data.eligible_interpreters(p) for p in pairs]
+        return all(v != -1 for v in hopcroft_karp(adjacency, data.n_interpreters))
+
+    def session_cliques(self, b):
+        # Sets of completable sessions of block b of which at most one can be fully covered, each pair of sessions
+        # in a set conflicting (see fully_covered_together). Every conflict is in at least one of the sets, each
+        # grown greedily into a maximal clique of the conflict graph
+        sessions = [s for s in self.data.block_sessions(b) if self.completable[s]]
+        conflicts = {s: set() for s in sessions}
+        for k, s1 in enumerate(sessions):
+            for s2 in sessions[k + 1:]:
+                if not self.fully_covered_together([s1, s2]):
+                    conflicts[s1].add(s2)
+                    conflicts[s2].add(s1)
+
+        cliques, covered = [], set()
+        for s1 in sessions:
+            for s2 in sorted(conflicts[s1]):
+                if s2 < s1 or (s1, s2) in covered:
+                    continue
+                clique = [s1, s2]
+                candidates = conflicts[s1] & conflicts[s2]
+                while candidates:
+                    # The candidate with the most conflicts with the other candidates
+                    s = max(sorted(candidates), key=lambda c: len(conflicts[c] & candidates))
+                    clique.append(s)
+                    candidates &= conflicts[s]
+                clique.sort()
+                covered.update((a, c) for a in clique for c in clique if a < c)
+                cliques.append(clique)
+        return cliques
+
+    def _fitting_sessions(self, sessions, n_interpreters):
+        # Number of completable sessions among sessions that distinct interpreters can cover, smallest first
+        sizes = np.sort(np.diff(self.data.session_pair_ptr)[[s for s in sessions if self.completable[s]]])
+        return int(np.sum(np.cumsum(sizes) <= n_interpreters))
+
+    def upper_bound(self, objective, operational_constraints: bool = False):
+        # operational_constraints is a bool (the default rules) or Rules, see rules.py
+        data = self.data
+        rules = as_rules(operational_constraints)
+        # Each interpreter covers at most one pair in at most as many sessions as the rules allow (15 by default)
+        sessions = int(rules.session_caps(data.n_blocks, data.interpreters).sum()) if rules is not None else None
+        if objective == "OF1":
+            bound = int(self.block_pairs.sum())
+            if sessions is not None:
+                bound = min(bound, sessions)
+        else:
+            bound = int(self.block_sessions.sum())
+            if sessions is not None:
+                bound = min(bound, self._fitting_sessions(range(data.n_sessions), sessions))
+        return float(bound)
+
+    def report(self, objective=None, operational_constraints: bool = False):
+        # Counts of what the analysis rules out, and the upper bounds (of objective, or of both)
+        objectives = ["OF1", "OF2"] if objective is None else [objective]
+        report = {
+            "pairs": self.n_entries,
+            "pairs_never_covered": int((~self.coverable).sum()),
+            "pairs_without_interpreter": int((~self.direct).sum()),
+            "sessions": self.data.n_sessions,
+            "sessions_never_complete": int((~self.completable).sum()),
+        }
+        report.update({f"upper_bound_{o}": self.upper_bound(o, operational_constraints) for o in objectives})
+        return report
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    analysis = Analysis(load_instance(args.instance).compile(), args.bridging)
+    operational_constraints = Rules.load(args.rules) if args.rules else args.oper_constr
+    for key, value in analysis.report(operational_constraints=operational_constraints).items():
+        print(f"{key}: {value}")
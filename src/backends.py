@@ -0,0 +1,295 @@
+import time
+
+import gurobipy as gp
+from gurobipy import GRB
+import numpy as np
+from scipy.optimize import Bounds, LinearConstraint, milp
+import scipy.sparse as sp
+
+# Backends solving the Gurobi models of ISP and ISPBridge (and ISPBridgeCompact). The models are always built with
+# gurobipy, which has no size limit as long as the model is not optimized: the other backends read the matrix form
+# of the built model (see matrix_form), so that they solve exactly the same formulation, and give back the values
+# of its columns. Solver parameters are read from the Gurobi model parameters (TimeLimit, Threads, Seed, MIPGap).
+BACKENDS = ["gurobi", "highs", "cpsat"]
+
+
+class GurobiResult:
+    # Result of the last solve of a Gurobi model, read from its attributes
+    x = None
+
+    def __init__(self, model):
+        self.model = model
+
+    @property
+    def status(self):
+        return self.model.Status
+
+    @property
+    def sol_count(self):
+        return self.model.SolCount
+
+    @property
+    def objective(self):
+        return self.model.ObjVal
+
+    @property
+    def runtime(self):
+        return self.model.Runtime
+
+    @property
+    def nodes(self):
+        return self.model.NodeCount if self.model.IsMIP else 0
+
+    @property
+    def mip_gap(self):
+        if self.model.NumObj > 1:
+            # No gap is given for several objectives, each one is solved to the MIPGap parameter
+            return 0.0 if self.model.Status == GRB.OPTIMAL else float("nan")
+        return self.model.MIPGap
+
+
+class SolveResult:
+    # Result of a solve by another backend, with the same attributes as GurobiResult: status is a GRB.Status code,
+    # objective the value of the first objective, x the value of each column of the model (None without solution),
+    # nodes the branch and bound nodes (CP-SAT branches) of all the objectives
+    def __init__(self, status, x=None, objective=None, bound=None, runtime=0.0, last_objective=True, nodes=None):
+        self.status = status
+        self.nodes = nodes
+        self.x = x
+        self.sol_count = int(x is not None)
+        self._objective = objective
+        self.bound = bound
+        self.runtime = runtime
+        # The bound is the one of the last objective, the gap is only given when it is the first one
+        self._single = last_objective
+
+    @property
+    def objective(self):
+        if self.x is None:
+            raise ValueError("No solution available")
+        return self._objective
+
+    @property
+    def mip_gap(self):
+        if not self._single:
+            return 0.0 if self.status == GRB.OPTIMAL else float("nan")
+        if self.x is None:
+            return float("inf")
+        if self.bound is None:
+            return 0.0 if self.status == GRB.OPTIMAL else float("inf")
+        return abs(self.bound - self._objective) / max(abs(self._objective), 1e-10)
+
+
+def matrix_form(model):
+    # Constraint matrix, bounds, variable types, starts and objectives of a Gurobi model. The objectives are listed
+    # from the highest priority down, as (coefficients, constant, reltol, abstol), the ones of equal priority blended
+    # by their weights
+    model.update()
+    variables = gp.MVar.fromlist(model.getVars())
+    if model.NumQConstrs or model.NumGenConstrs or model.NumSOS or model.IsQP:
+        raise ValueError("Only linear models can be solved by another backend than Gurobi")
+    form = {
+        "A": model.getA().tocsr(),
+        "sense": np.asarray(model.getAttr("Sense", model.getConstrs()), dtype="<U1"),
+        "rhs": np.asarray(model.getAttr("RHS", model.getConstrs()), dtype=float),
+        "lb": np.asarray(variables.LB, dtype=float),
+        "ub": np.asarray(variables.UB, dtype=float),
+        "integer": np.isin(np.asarray(variables.VType), ["B", "I"]),
+        "start": np.asarray(variables.Start, dtype=float),
+        "maximize": model.ModelSense == GRB.MAXIMIZE,
+    }
+    form["start"][form["start"] >= GRB.UNDEFINED] = np.nan
+
+    if model.NumObj <= 1:
+        form["objectives"] = [(np.asarray(variables.Obj, dtype=float), model.ObjCon, 0.0, 0.0)]
+        return form
+    levels = {}
+    for k in range(model.NumObj):
+        model.params.ObjNumber = k
+        c = model.ObjNWeight * np.asarray(variables.ObjN, dtype=float)
+        c0, reltol, abstol = model.ObjNWeight * model.ObjNCon, model.ObjNRelTol, model.ObjNAbsTol
+        if model.ObjNPriority in levels:
+            previous = levels[model.ObjNPriority]
+            c, c0 = c + previous[0], c0 + previous[1]
+            reltol, abstol = min(reltol, previous[2]), min(abstol, previous[3])
+        levels[model.ObjNPriority] = (c, c0, reltol, abstol)
+    form["objectives"] = [levels[priority] for priority in sorted(levels, reverse=True)]
+    return form
+
+
+def row_bounds(sense, rhs):
+    lower = np.where(sense == "<", -np.inf, rhs)
+    upper = np.where(sense == ">", np.inf, rhs)
+    return lower, upper
+
+
+class MatrixBackend:
+    # Backend solving the matrix form of the model. Several objectives are optimized one after the other, each one
+    # then kept within its tolerance (as Gurobi does for hierarchical objectives)
+    name = None
+
+    def solve(self, model, profiler, label="mip"):
+        form = matrix_form(model)
+        params = model.Params
+        time_limit = params.TimeLimit
+        start = time.perf_counter()
+        # Added up by _solve over the objectives
+        self.nodes = 0
+        with profiler.solve(label) as record:
+            A, lower, upper = form["A"], *row_bounds(form["sense"], form["rhs"])
+            sign = 1.0 if form["maximize"] else -1.0
+            objectives = form["objectives"]
+            status, x, value, bound = GRB.LOADED, None, None, None
+            for k, (c, constant, reltol, abstol) in enumerate(objectives):
+                remaining = max(time_limit - (time.perf_counter() - start), 0.0)
+                status, x_k, value, bound = self._solve(form, A, lower, upper, c, remaining, params.Threads,
+                                                        params.Seed, params.MIPGap)
+                if x_k is None:
+                    break
+                x = np.where(form["integer"], np.round(x_k), x_k)
+                if status != GRB.OPTIMAL or k == len(objectives) - 1:
+                    break
+                # The next objectives keep this one within max(abstol, reltol * |value|) of its optimum
+                threshold = value - sign * max(abstol, reltol * abs(value))
+                A = sp.vstack([A, sp.csr_matrix(c)], format="csr")
+                lower = np.append(lower, threshold if form["maximize"] else -np.inf)
+                upper = np.append(upper, np.inf if form["maximize"] else threshold)
+
+            c, constant = objectives[0][:2]
+            objective = float(c @ x + constant) if x is not None else None
+            bound = bound + objectives[-1][1] if bound is not None and len(objectives) == 1 else None
+            result = SolveResult(status, x, objective, bound, time.perf_counter() - start, len(objectives) == 1,
+                                 self.nodes)
+            if record is not None:
+                record.update({"status": status, "runtime": result.runtime, "objective": objective, "bound": bound,
+                               "iterations": None, "nodes": self.nodes, "backend": self.name})
+                profiler.add_point(record["trajectory"], result.runtime, objective, bound)
+        return result
+
+    def _solve(self, form, A, lower, upper, c, time_limit, threads, seed, mip_gap):
+        # Solves the model with the rows A x in [lower, upper] and the objective c, returns its status, values,
+        # objective value (without constant) and bound
+        raise NotImplementedError
+
+
+class HighsBackend(MatrixBackend):
+    # HiGHS through scipy.optimize.milp, which does not expose its Threads and Seed options, nor MIP starts
+    name = "highs"
+
+    STATUS = {0: GRB.OPTIMAL, 1: GRB.TIME_LIMIT, 2: GRB.INFEASIBLE, 3: GRB.UNBOUNDED}
+
+    def _solve(self, form, A, lower, upper, c, time_limit, threads, seed, mip_gap):
+        sign = -1.0 if form["maximize"] else 1.0
+        options = {"disp": False, "mip_rel_gap": mip_gap}
+        if np.isfinite(time_limit):
+            options["time_limit"] = time_limit
+        constraints = [LinearConstraint(A, lower, upper)] if A.shape[0] else []
+        result = milp(sign * c, integrality=form["integer"].astype(np.uint8), bounds=Bounds(form["lb"], form["ub"]),
+                      constraints=constraints, options=options)
+        # Other failures (status 4) are reported as numerical trouble
+        status = self.STATUS.get(result.status, GRB.NUMERIC)
+        self.nodes += getattr(result, "mip_node_count", None) or 0
+        if result.x is None:
+            return status, None, None, None
+        bound = getattr(result, "mip_dual_bound", None)
+        bound = sign * bound if bound is not None and np.isfinite(bound) else None
+        return status, result.x, sign * result.fun, bound
+
+
+def integer_rows(A, lower, upper, max_scale=10 ** 6):
+    # Rows scaled to integer coefficients (by powers of 10), as CP-SAT needs them, and their scale. The variables
+    # being integer, the bounds are then rounded inwards
+    A = A.tocsr().astype(float)
+    scale = np.ones(A.shape[0])
+    while True:
+        fractional = np.zeros(A.shape[0], dtype=bool)
+        fractional[np.repeat(np.arange(A.shape[0]), np.diff(A.indptr))[np.abs(A.data - np.round(A.data)) > 1e-9]] = True
+        if not fractional.any():
+            break
+        if scale[fractional].max() >= max_scale:
+            raise ValueError("CP-SAT needs integer coefficients, some rows cannot be scaled to integers")
+        factor = np.where(fractional, 10.0, 1.0)
+        scale *= factor
+        A = (sp.diags(factor) @ A).tocsr()
+    A.data = np.round(A.data)
+    with np.errstate(invalid="ignore"):
+        lower = np.ceil(lower * scale - 1e-9)
+        upper = np.floor(upper * scale + 1e-9)
+    return A, lower, upper, scale
+
+
+class CpSatBackend(MatrixBackend):
+    # OR-Tools CP-SAT (optional dependency), with Threads search workers (8 when Threads is 0) running in parallel.
+    # The variables must be integer and bounded, the coefficients are scaled to integers
+    name = "cpsat"
+
+    def __init__(self):
+        try:
+            from ortools.sat.python import cp_model
+        except ImportError as e:
+            raise ImportError("The cpsat backend needs OR-Tools: pip install ortools") from e
+        self.cp_model = cp_model
+
+    def _solve(self, form, A, lower, upper, c, time_limit, threads, seed, mip_gap):
+        cp_model = self.cp_model
+        if not form["integer"].all():
+            raise ValueError("CP-SAT only solves models whose variables are all integer")
+        lb, ub = form["lb"], form["ub"]
+        if not (np.isfinite(lb).all() and np.isfinite(ub).all()):
+            raise ValueError("CP-SAT needs bounded variables")
+        A, lower, upper, _ = integer_rows(A, lower, upper)
+        c_row, _, _, (c_scale,) = integer_rows(sp.csr_matrix(c), np.zeros(1), np.zeros(1))
+        c_integer = np.asarray(c_row.todense()).ravel().astype(np.int64)
+
+        model = cp_model.CpModel()
+        variables = [model.new_int_var(int(l), int(u), "") for l, u in zip(lb.tolist(), ub.tolist())]
+        for k in range(A.shape[0]):
+            low, high = A.indptr[k], A.indptr[k + 1]
+            expression = cp_model.LinearExpr.weighted_sum([variables[j] for j in A.indices[low:high].tolist()],
+                                                          A.data[low:high].astype(np.int64).tolist())
+            if np.isfinite(lower[k]):
+                model.add(expression >= int(lower[k]))
+            if np.isfinite(upper[k]):
+                model.add(expression <= int(upper[k]))
+        nonzero = np.flatnonzero(c_integer)
+        objective = cp_model.LinearExpr.weighted_sum([variables[j] for j in nonzero.tolist()],
+                                                     c_integer[nonzero].tolist())
+        if form["maximize"]:
+            model.maximize(objective)
+        else:
+            model.minimize(objective)
+        for j in np.flatnonzero(np.isfinite(form["start"])).tolist():
+            model.add_hint(variables[j], int(round(form["start"][j])))
+
+        solver = cp_model.CpSolver()
+        if np.isfinite(time_limit):
+            solver.parameters.max_time_in_seconds = time_limit
+        solver.parameters.num_workers = threads or 8
+        solver.parameters.random_seed = seed
+        solver.parameters.relative_gap_limit = mip_gap
+        status = solver.solve(model)
+        self.nodes += solver.num_branches
+        if status == cp_model.MODEL_INVALID:
+            raise ValueError(f"Invalid CP-SAT model: {model.validate()}")
+        if status == cp_model.INFEASIBLE:
+            return GRB.INFEASIBLE, None, None, None
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            return GRB.TIME_LIMIT, None, None, None
+        x = np.asarray(solver.response_proto.solution, dtype=float)[:len(variables)]
+        return (GRB.OPTIMAL if status == cp_model.OPTIMAL else GRB.TIME_LIMIT, x,
+                solver.objective_value / c_scale, solver.best_objective_bound / c_scale)
+
+
+class GurobiBackend:
+    name = "gurobi"
+
+    def solve(self, model, profiler, label="mip"):
+        profiler.optimize(model, label)
+        return GurobiResult(model)
+
+
+def get_backend(name):
+    backends = {"gurobi": GurobiBackend, "highs": HighsBackend, "cpsat": CpSatBackend}
+    if name not in backends:
+        raise ValueError(f"Backend must be one of {BACKENDS}, got: {name}")
+    return backends[name]()
@@ -0,0 +1,236 @@
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import csv
+import glob
+import itertools
+import json
+import os
+import resource
+import time
+import traceback
+
+from instance_cache import load_instance
+from isp_flow import ISPFlow
+
+# Model name -> (bridging, solver) options of build_model
+MODELS = {"ISP": (None, "mip"), "ISPBridge": ("pairwise", "mip"), "ISPBridgeCompact": ("compact", "mip"),
+          "ISPBridgeColumns": ("columns", "mip"), "ISPFlow": (None, "flow"),
+          "ISPDecomposed": (None, "decomposed"), "ISPHeuristic": (None, "heuristic"),
+          "ISPAggregated": (None, "aggregated"), "ISPRolling": (None, "rolling")}
+# Solvers whose model is a single Gurobi model (model.model)
+GUROBI_SOLVERS = {"mip", "aggregated"}
+OBJECTIVES = ["OF1", "OF2"]
+OPER_CONSTR = {"off": False, "on": True}
+
+# Columns of the results, the first ones are those written by the former run scripts
+COLUMNS = ["Instance", "Model", "Objective", "OperationalConstraints", "ObjectiveValue", "MIPGap", "Runtime",
+           "Status", "StatusCode", "Bound", "BuildTime", "PeakRSS_MB", "Threads", "Error", "SolutionCache"]
+KEY = ["Instance", "Model", "Objective", "OperationalConstraints"]
+# Rows with these statuses are run again on resume
+FAILED = {"ERROR", "FAIL"}
+
+parser = ArgumentParser(description="Run the models on a grid of instances and options, in parallel")
+parser.add_argument("--instances", type=str, nargs="+", default=["instances/*.json"],
+                    help="Instance files or glob patterns")
+parser.add_argument("--models", choices=list(MODELS), nargs="+", default=["ISP", "ISPBridge"], help="Models to run")
+parser.add_argument("--objectives", choices=OBJECTIVES, nargs="+", default=OBJECTIVES, help="Objective functions")
+parser.add_argument("--oper-constr", choices=list(OPER_CONSTR), nargs="+", default=list(OPER_CONSTR),
+                    help="Run without (off) and/or with (on) operational constraints")
+parser.add_argument("--all-sizes", action="store_true", default=False,
+                    help="Also run ISPBridge on the large instances (by default only on *I40* and S40-* ones)")
+parser.add_argument("--workers", type=int, default=None, help="Number of jobs run at the same time (default: all CPUs)")
+parser.add_argument("--threads", type=int, default=None,
+                    help="Total number of Gurobi threads, split evenly across the workers (default: all CPUs)")
+parser.add_argument("--warm-start", action="store_true", default=False,
+                    help="Start the Gurobi models from the heuristic solution")
+parser.add_argument("--time-limit", type=float, default=None, help="Gurobi time limit per job, in seconds")
+parser.add_argument("--solution-cache", type=str, default=None, metavar="DIR",
+                    help="Solution cache of the mip models (solution_cache.py): proven optimal cached solutions are "
+                         "reported without solving, the others give a MIP start")
+parser.add_argument("--output", type=str, default="results.csv",
+                    help="Results file, CSV or JSON according to its extension")
+parser.add_argument("--resume", action="store_true", default=False,
+                    help="Keep the results already in the output file and skip their jobs (failed jobs run again)")
+
+
+def too_large(model, instance):
+    # The pairwise bridge model grows quadratically with the number of interpreters
+    name = os.path.basename(instance)
+    return model == "ISPBridge" and "I40" not in name and "S40-" not in name
+
+
+def make_jobs(instances, models, objectives, oper_constr, all_sizes=False):
+    jobs = []
+    for instance, model, objective, oper in itertools.product(instances, models, objectives, oper_constr):
+        if model == "ISPFlow" and not ISPFlow.supports(objective, OPER_CONSTR[oper]):
+            continue
+        if not all_sizes and too_large(model, instance):
+            continue
+        jobs.append((instance, model, objective, oper))
+    return jobs
+
+
+def job_key(instance, model, objective, oper):
+    return os.path.basename(instance), model, objective, "--oper-constr" if OPER_CONSTR[oper] else "--none--"
+
+
+def set_limits(model, threads, time_limit):
+    # Threads and time limit of a built model, whatever its class (time_limit None keeps the one of the model)
+    if hasattr(model, "model"):
+        model.model.setParam("Threads", threads)
+        if time_limit is not None:
+            model.model.setParam("TimeLimit", time_limit)
+    elif hasattr(model, "workers"):
+        # ISPDecomposed: the threads of the job solve the blocks in parallel
+        model.workers = threads
+        model.time_limit = time_limit
+    elif hasattr(model, "threads"):
+        # ISPRolling: threads and time limit of each window
+        model.threads = threads
+        model.time_limit = time_limit
+    elif hasattr(model, "time_limit") and time_limit is not None:
+        model.time_limit = time_limit
+
+
+def run_job(job, threads, time_limit, warm_start=False, solution_cache=None):
+    # Runs in a worker process of its own (max_tasks_per_child=1), so that the peak RSS is the one of this job.
+    # With solution_cache, the SolutionCache column is "hit" for a proven optimal cached solution (its Runtime being
+    # the one of the solve that found it) and "start" for a model started from a cached solution
+    instance, model_name, objective, oper = job
+    row = dict(zip(KEY, job_key(*job)))
+    row["Threads"] = threads
+    try:
+        import gurobipy as gp
+        from gurobipy import GRB
+        from models import build_model
+
+        gp.setParam("OutputFlag", 0)
+        bridging, solver = MODELS[model_name]
+        cache, cached = None, None
+        if solution_cache is not None and solver == "mip":
+            from solution_cache import SolutionCache, cache_options
+
+            cache = SolutionCache(solution_cache)
+            options = cache_options(objective, OPER_CONSTR[oper], bridging)
+            cached = cache.optimal(instance, options)
+
+        if cached is not None:
+            row.update({"Status": "OPTIMAL", "StatusCode": GRB.OPTIMAL, "Runtime": cached.runtime,
+                        "ObjectiveValue": cached.objective_value, "Bound": cached.objective_value, "MIPGap": 0.0,
+                        "BuildTime": 0.0, "SolutionCache": "hit"})
+        else:
+            start = time.perf_counter()
+            model = build_model(instance, objective, OPER_CONSTR[oper], bridging, solver, warm_start)
+            row["BuildTime"] = time.perf_counter() - start
+
+            set_limits(model, threads, time_limit)
+            if cache is not None and cache.start(model, instance, options) is not None:
+                row["SolutionCache"] = "start"
+            model.optimize()
+            if cache is not None:
+                cache.put(model, instance, options)
+
+            if solver in GUROBI_SOLVERS:
+                status = model.model.Status
+                names = {getattr(GRB.Status, name): name for name in dir(GRB.Status) if name.isupper()}
+                row["Status"] = names.get(status, str(status))
+                row["StatusCode"] = status
+                row["Runtime"] = model.model.Runtime
+                if model.model.SolCount > 0:
+                    row["ObjectiveValue"] = model.model.ObjVal
+                    row["Bound"] = model.model.ObjBound
+                    row["MIPGap"] = model.model.MIPGap
+            else:
+                optimal = model.mip_gap < 1e-9
+                row["Status"] = "OPTIMAL" if optimal else "SUBOPTIMAL"
+                row["StatusCode"] = GRB.OPTIMAL if optimal else GRB.SUBOPTIMAL
+                row["Runtime"] = model.runtime
+                row["ObjectiveValue"] = model.objective_value
+                row["Bound"] = getattr(model, "bound", model.objective_value)
+                row["MIPGap"] = model.mip_gap
+    except Exception as e:
+        row["Status"] = "ERROR"
+        row["Error"] = f"{type(e).__name__}: {e}"
+        traceback.print_exc()
+
+    row["PeakRSS_MB"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return row
+
+
+def read_results(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", newline="") as f:
+        if path.endswith(".json"):
+            return json.load(f)
+        return list(csv.DictReader(f))
+
+
+class ResultWriter:
+    # Writes every row as soon as its job is done, so that an interrupted sweep can be resumed
+    def __init__(self, path, rows):
+        self.path = path
+        self.rows = list(rows)
+        if path.endswith(".json"):
+            self._dump()
+        else:
+            # The whole file is written again, older files may have fewer columns
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, COLUMNS, extrasaction="ignore")
+                writer.writeheader()
+                writer.writerows(self.rows)
+
+    def _dump(self):
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.rows, f, indent=2)
+        os.replace(temporary, self.path)
+
+    def add(self, row):
+        self.rows.append(row)
+        if self.path.endswith(".json"):
+            self._dump()
+        else:
+            with open(self.path, "a", newline="") as f:
+                csv.DictWriter(f, COLUMNS, extrasaction="ignore").writerow(row)
+
+
+def run_batch(jobs, output, workers=None, threads=None, time_limit=None, resume=False, warm_start=False,
+              solution_cache=None):
+    rows = read_results(output) if resume else []
+    rows = [row for row in rows if row.get("Status") not in FAILED]
+    done = {tuple(row[k] for k in KEY) for row in rows}
+    jobs = [job for job in jobs if job_key(*job) not in done]
+
+    workers = max(1, min(workers or os.cpu_count(), len(jobs) or 1))
+    threads = max(1, (threads or os.cpu_count()) // workers)
+    print(f"{len(jobs)} jobs to run ({len(done)} already done), {workers} workers with {threads} Gurobi threads each")
+
+    writer = ResultWriter(output, rows)
+    if not jobs:
+        return writer.rows
+
+    start = time.perf_counter()
+    # Not a multiprocessing.Pool: its daemon processes could not start the pool of ISPDecomposed
+    with ProcessPoolExecutor(workers, max_tasks_per_child=1) as pool:
+        futures = [pool.submit(run_job, job, threads, time_limit, warm_start, solution_cache) for job in jobs]
+        for k, future in enumerate(as_completed(futures), 1):
+            row = future.result()
+            writer.add(row)
+            print(f"[{k}/{len(jobs)}] {row['Instance']} {row['Model']} {row['Objective']} "
+                  f"{row['OperationalConstraints']}: {row['Status']} {row.get('ObjectiveValue', '')} "
+                  f"({time.perf_counter() - start:.1f}s)")
+    return writer.rows
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    instances = sorted({path for pattern in args.instances for path in glob.glob(pattern)})
+
+    # Compile the instances once, the jobs then load them from the instance cache
+    for path in instances:
+        load_instance(path)
+
+    jobs = make_jobs(instances, args.models, args.objectives, args.oper_constr, args.all_sizes)
+    run_batch(jobs, args.output, args.workers, args.threads, args.time_limit, args.resume, args.warm_start,
+              args.solution_cache)
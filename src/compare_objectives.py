@@ -1,79 +1,63 @@
 from argparse import ArgumentParser
 from isp import ISP
-from isp_bridge import ISPBridge
+from models import build_model
+from solution import Solution
 import matplotlib.pyplot as plt
 import numpy as np
-import itertools
 import os
 
 parser = ArgumentParser()
 parser.add_argument("--instance", type=str, default="instances/example.json", help="Path to instance file")
 parser.add_argument("--oper-constr", action="store_true", help="Use operational constraints", default=False)
-parser.add_argument("--bridging", action="store_true", help="Compare OF1 to bridging", default=False)
+parser.add_argument("--bridging", nargs="?", const="pairwise", choices=["pairwise", "compact", "columns"],
+                    default=None,
+                    help="Compare OF1 to bridging, with the pairwise (default), compact or column generation bridge "
+                         "model")
+parser.add_argument("--lexicographic", action="store_true", default=False,
+                    help="Also plot the schedule maximizing OF2 first, then OF1 (on the bridge model with --bridging)")
+parser.add_argument("--tolerance", type=float, default=0.0,
+                    help="Relative loss of OF2 allowed when OF1 is maximized in the lexicographic schedule")
 
 def get_coverage_ratios(model, bridging):
-    instance = model.instance
-    coverage_ratios = {}
-
-    for s in instance.sessions:
-        languages = instance.languages_per_session[s]
-        language_pairs = list(itertools.combinations(languages, 2))
-        total_pairs = len(language_pairs)
-
-        covered = 0
-        for l1, l2 in language_pairs:
-            is_covered = False
-
-            # Direct coverage by interpreters
-            for i in instance.interpreters:
-                zkey = (i, s, l1, l2)
-                if zkey in model.z and model.z[zkey].X > 0.5:
-                    is_covered = True
-                    break
-
-            # Coverage via bridging
-            if not is_covered and bridging:
-                for i1, i2, s1, la, lb, lp in model.w:
-                    if {la, lb} == {l1, l2} and s1 == s:
-                        if model.w[i1, i2, s1, la, lb, lp].X > 0.5:
-                            is_covered = True
-                            break
-
-            if is_covered:
-                covered += 1
-
-        coverage_ratios[s] = covered / total_pairs if total_pairs > 0 else 0.0
-
-    return coverage_ratios
+    # Coverage ratio of each session, the pairs covered via bridging counting with bridging
+    return Solution.from_model(model, relays=bool(bridging)).coverage_by_session()
 
 if __name__ == "__main__":
     args = parser.parse_args()
-    first_obj = ISP(args.instance, "OF1", args.oper_constr)
     if args.bridging:
-        second_obj = ISPBridge(args.instance, "OF1", args.oper_constr)
+        first_obj = build_model(args.instance, "OF1", args.oper_constr)
+        first_obj.optimize()
+        model = build_model(args.instance, "OF1", args.oper_constr, args.bridging, "mip")
+        model.optimize()
+        series = [("OF1", get_coverage_ratios(first_obj, False)),
+                  ("Bridging OF1", get_coverage_ratios(model, args.bridging))]
     else:
-        second_obj = ISP(args.instance, "OF2", args.oper_constr)
-
-    first_obj.optimize()
-    second_obj.optimize()
-
-    ratios1 = get_coverage_ratios(first_obj, False)
-    ratios2 = get_coverage_ratios(second_obj, args.bridging)
-
-    sessions = sorted(ratios1.keys())
+        # OF1 and OF2 only differ by their objective: the model is built once, and solved again from the previous
+        # solution after the objective changes
+        model = ISP(args.instance, "OF1", args.oper_constr)
+        model.optimize()
+        series = [("OF1", get_coverage_ratios(model, False))]
+        model.set_objective("OF2")
+        model.reoptimize()
+        series.append(("OF2", get_coverage_ratios(model, False)))
+
+    if args.lexicographic:
+        model.set_lexicographic(["OF2", "OF1"], reltol=args.tolerance)
+        model.reoptimize()
+        series.append(("OF2 then OF1", get_coverage_ratios(model, args.bridging)))
+        print(f"Lexicographic schedule: {model.objective_values}")
+
+    sessions = sorted(series[0][1].keys())
     x = np.arange(len(sessions))
 
-    values1 = [ratios1[s] for s in sessions]
-    values2 = [ratios2[s] for s in sessions]
-
     instance_name = os.path.basename(args.instance)
     instance_name = os.path.splitext(instance_name)[0]
 
     plt.figure(figsize=(14, 6))
-    width = 0.35
-    plt.bar(x - width/2, values1, width, label="OF1", color="skyblue")
-    label = "OF2" if not args.bridging else "Bridging OF1"
-    plt.bar(x + width/2, values2, width, label=label, color="salmon")
+    width = 0.7 / len(series)
+    for k, ((label, ratios), color) in enumerate(zip(series, ["skyblue", "salmon", "mediumseagreen"])):
+        offset = (k - (len(series) - 1) / 2) * width
+        plt.bar(x + offset, [ratios[s] for s in sessions], width, label=label, color=color)
     plt.xlabel("Sessions")
     plt.ylabel("Coverage Ratio")
     if not args.bridging:
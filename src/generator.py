@@ -0,0 +1,139 @@
+from argparse import ArgumentParser
+import json
+import math
+
+import numpy as np
+
+# Languages of the shipped instances, from the most to the least spoken by the interpreters
+LANGUAGES = ["English", "German", "French", "Spanish", "Italian", "Polish", "Dutch", "Portuguese", "Swedish", "Greek",
+             "Romanian", "Czech", "Hungarian", "Danish", "Finnish", "Bulgarian", "Slovak", "Croatian", "Lithuanian",
+             "Slovenian", "Latvian", "Estonian", "Irish", "Maltese"]
+
+parser = ArgumentParser(description="Generate a random instance, written as it is generated")
+parser.add_argument("--sessions", type=int, default=400, help="Number of sessions")
+parser.add_argument("--interpreters", type=int, default=240, help="Number of interpreters")
+parser.add_argument("--blocks", type=int, default=40, help="Number of blocks")
+parser.add_argument("--sessions-per-block", type=int, default=None,
+                    help="Sessions in each block, instead of spreading the sessions over --blocks blocks")
+parser.add_argument("--languages", type=int, default=len(LANGUAGES), help="Number of languages")
+parser.add_argument("--interpreter-languages", type=str, default="2:31,3:27,4:20,5:13,6:9",
+                    help="Distribution of the number of languages of an interpreter, as size:weight,... or min-max")
+parser.add_argument("--session-languages", type=str, default="4-24",
+                    help="Distribution of the number of languages of a session, as size:weight,... or min-max")
+parser.add_argument("--interpreter-skew", type=float, default=1.0,
+                    help="Zipf exponent of the popularity of the languages among interpreters (0 for uniform)")
+parser.add_argument("--session-skew", type=float, default=0.0,
+                    help="Zipf exponent of the popularity of the languages among sessions (0 for uniform)")
+parser.add_argument("--seed", type=int, default=0, help="Random seed")
+parser.add_argument("--output", type=str, default=None,
+                    help="Instance file (default: instances/isp-S<sessions>-I<interpreters>-seed<seed>.json)")
+
+
+def parse_sizes(spec, n_languages):
+    # Sizes and probabilities of a size distribution "size:weight,..." or "min-max" (uniform), capped to n_languages
+    if ":" in spec:
+        sizes, weights = zip(*(map(float, item.split(":")) for item in spec.split(",")))
+    else:
+        low, high = map(int, spec.split("-"))
+        sizes, weights = range(low, high + 1), [1.0] * (high - low + 1)
+    sizes, weights = np.array(sizes, dtype=np.int64), np.array(weights, dtype=float)
+    if sizes.min() < 1 or weights.min() < 0 or weights.sum() <= 0:
+        raise ValueError(f"Invalid size distribution {spec!r}")
+    return np.minimum(sizes, n_languages), weights / weights.sum()
+
+
+def popularity(n_languages, skew):
+    # Probability of each language, by rank (Zipf law)
+    weights = 1.0 / np.arange(1, n_languages + 1) ** skew
+    return weights / weights.sum()
+
+
+def language_names(n_languages):
+    return LANGUAGES[:n_languages] + [f"Language {k:03d}" for k in range(len(LANGUAGES) + 1, n_languages + 1)]
+
+
+def names(prefix, n):
+    width = max(3, len(str(n)))
+    return (f"{prefix} {k:0{width}d}" for k in range(1, n + 1))
+
+
+def language_sets(rng, item_names, languages, sizes, probabilities):
+    # (name, languages) of each item, with a random number of distinct languages drawn by popularity, listed in the
+    # order of the instance languages
+    order = np.argsort(languages)
+    rank = np.empty(len(languages), dtype=np.int64)
+    rank[order] = np.arange(len(languages))
+    size_values, size_probabilities = sizes
+    for name in item_names:
+        size = rng.choice(size_values, p=size_probabilities)
+        drawn = rng.choice(len(languages), size, replace=False, p=probabilities)
+        yield name, [languages[l] for l in drawn[np.argsort(rank[drawn])]]
+
+
+def _write_array(f, values):
+    f.write("[")
+    for k, value in enumerate(values):
+        f.write(("," if k else "") + "\n        " + json.dumps(value))
+    f.write("\n    ]")
+
+
+def _write_object(f, items):
+    # Object of lists, each list written in the format of json.dump(indent=4)
+    f.write("{")
+    for k, (key, values) in enumerate(items):
+        f.write(("," if k else "") + "\n        " + json.dumps(key) + ": ")
+        f.write(json.dumps(values, indent=4).replace("\n", "\n        "))
+    f.write("\n    }")
+
+
+def generate(output, n_sessions, n_interpreters, n_blocks=40, sessions_per_block=None, n_languages=len(LANGUAGES),
+             interpreter_languages="2:31,3:27,4:20,5:13,6:9", session_languages="4-24", interpreter_skew=1.0,
+             session_skew=0.0, seed=0):
+    # Writes a random instance to output, in the format of the shipped instances (json.dump(indent=4)). Each session
+    # and interpreter is written as soon as it is drawn, so the memory used does not grow with the instance.
+    # Sessions are spread evenly over the blocks, in order. The defaults follow the shipped instances.
+    if sessions_per_block is not None:
+        n_blocks = math.ceil(n_sessions / sessions_per_block)
+    languages = language_names(n_languages)
+    # Independent random streams for the sessions and the interpreters, so that each one only depends on the seed
+    session_rng, interpreter_rng = (np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(2))
+    sorted_languages = sorted(languages)
+
+    def blocks():
+        sessions = names("Session", n_sessions)
+        for b, block in enumerate(names("Block", n_blocks)):
+            size = (b + 1) * n_sessions // n_blocks - b * n_sessions // n_blocks
+            yield block, [next(sessions) for _ in range(size)]
+
+    members = [
+        ("Blocks", _write_array, names("Block", n_blocks)),
+        ("Sessions", _write_array, names("Session", n_sessions)),
+        ("Sessions_b", _write_object, blocks()),
+        ("Interpreters", _write_array, names("Interpreter", n_interpreters)),
+        ("Languages", _write_array, sorted_languages),
+        ("Languages_s", _write_object,
+         language_sets(session_rng, names("Session", n_sessions), languages,
+                       parse_sizes(session_languages, n_languages), popularity(n_languages, session_skew))),
+        ("Languages_i", _write_object,
+         language_sets(interpreter_rng, names("Interpreter", n_interpreters), languages,
+                       parse_sizes(interpreter_languages, n_languages), popularity(n_languages, interpreter_skew))),
+    ]
+    with open(output, "w") as f:
+        f.write("{")
+        for k, (key, write, values) in enumerate(members):
+            f.write(("," if k else "") + "\n    " + json.dumps(key) + ": ")
+            write(f, values)
+        f.write("\n}")
+    return output
+
+
+def default_output(n_sessions, n_interpreters, seed):
+    return f"instances/isp-S{n_sessions}-I{n_interpreters}-seed{seed}.json"
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    output = args.output or default_output(args.sessions, args.interpreters, args.seed)
+    generate(output, args.sessions, args.interpreters, args.blocks, args.sessions_per_block, args.languages,
+             args.interpreter_languages, args.session_languages, args.interpreter_skew, args.session_skew, args.seed)
+    print(f"Instance written to {output}")
@@ -0,0 +1,345 @@
+import time
+
+import numpy as np
+
+from instance_cache import load_instance
+from isp_flow import _Value, _Values, hopcroft_karp
+from analysis import Analysis
+from rules import as_rules
+
+
+# Time budget of the heuristic when it provides the MIP start of a model (warm_start=True), in seconds
+WARM_START_TIME_LIMIT = 2.0
+
+
+def y_entries(data, s, p):
+    # Position of the pairs p of the sessions s in session_pair_indices, i.e. the index of their y variable.
+    # Pair ids are increasing within a session, so the (session, pair) keys of the entries are sorted.
+    keys = np.repeat(np.arange(data.n_sessions), np.diff(data.session_pair_ptr)) * data.n_pairs
+    keys += data.session_pair_indices
+    return np.searchsorted(keys, np.asarray(s) * data.n_pairs + np.asarray(p))
+
+
+def evaluate(data, objective, z):
+    # Objective value of the assignments z (rows (i, s, p): interpreter i covers pair p in session s)
+    covered = np.zeros(len(data.session_pair_indices), dtype=bool)
+    if len(z):
+        covered[y_entries(data, z[:, 1], z[:, 2])] = True
+    if objective == "OF1":
+        return float(covered.sum())
+    # A session without any pair is fully covered
+    n_pairs = np.diff(data.session_pair_ptr)
+    n_covered = np.add.reduceat(np.append(covered, False).astype(int), data.session_pair_ptr[:-1])
+    return float(np.sum(np.where(n_pairs > 0, n_covered, 0) == n_pairs))
+
+
+def solution_values(data, z):
+    # Values of the x, y, z and t variables of the assignments z, keyed as in ISP
+    x, y, zs, t = _Values(), _Values(), _Values(), _Values()
+    for i, s, p in np.asarray(z).tolist():
+        x[i, s] = _Value(1.0)
+        y[s, p] = _Value(1.0)
+        zs[i, s, p] = _Value(1.0)
+    for s in range(data.n_sessions):
+        if all((s, p) in y for p in data.session_pairs(s)):
+            t[s] = _Value(1.0)
+    return x, y, zs, t
+
+
+class _Schedule:
+    # Solution being built or improved, one block at a time. In block b, interpreter i is assigned to at most one
+    # entry k of block_pairs[b] (a pair p of a session s of the block); blocks_of[i] are the blocks of interpreter i.
+
+    def __init__(self, data, objective, operational_constraints):
+        self.data = data
+        self.objective = objective
+        self.operational_constraints = operational_constraints
+        # block_rules[b][i]: (first block, end block, limit) of the rows of the operational rules (rules.py) of
+        # interpreter i that include block b
+        rules = as_rules(operational_constraints)
+        self.block_rules = [{} for _ in range(data.n_blocks)]
+        if rules is not None:
+            for row_i, starts, ends, limits in rules.compile(data.n_blocks, data.interpreters).values():
+                for i, a, e, limit in zip(row_i.tolist(), starts.tolist(), ends.tolist(), limits.tolist()):
+                    for b in range(a, e):
+                        self.block_rules[b].setdefault(i, []).append((a, e, limit))
+
+        # Interpreters with fewer languages are used first, the others are more likely to be needed elsewhere
+        n_languages = [bin(mask).count("1") for mask in data.interpreter_masks]
+        self.interpreter_order = sorted(range(data.n_interpreters), key=lambda i: n_languages[i])
+
+        self.block_pairs = []
+        self.session_entries = []
+        self.block_adjacency = []
+        for b in range(data.n_blocks):
+            pairs, entries = [], {}
+            for s in data.block_sessions(b):
+                entries[s] = (len(pairs), len(pairs) + len(data.session_pairs(s)))
+                pairs.extend((s, p) for p in data.session_pairs(s))
+            adjacency = {}
+            for k, (s, p) in enumerate(pairs):
+                for i in data.eligible_interpreters(p):
+                    adjacency.setdefault(i, []).append(k)
+            self.block_pairs.append(pairs)
+            self.session_entries.append(entries)
+            self.block_adjacency.append(adjacency)
+
+        self.blocks_of = [set() for _ in range(data.n_interpreters)]
+        self.solution = [[] for _ in range(data.n_blocks)]
+
+    def can_join(self, i, b):
+        # Whether interpreter i can be assigned in block b, given its assignments in the other blocks
+        blocks = self.blocks_of[i]
+        if b in blocks or not self.operational_constraints:
+            return True
+        for a, e, limit in self.block_rules[b].get(i, ()):
+            if sum(1 for b2 in blocks if a <= b2 < e) >= limit:
+                return False
+        return True
+
+    def candidates(self, b, excluded=None):
+        # Interpreters that can cover a pair of block b, least loaded first
+        candidates = [i for i in self.interpreter_order
+                      if i in self.block_adjacency[b] and i != excluded and self.can_join(i, b)]
+        return sorted(candidates, key=lambda i: len(self.blocks_of[i] - {b}))
+
+    def match(self, b, interpreters, entries=None):
+        # Maximum matching between the interpreters and the entries of block b (all of them, or those in the range
+        # entries), as a list of (i, k)
+        if entries is None:
+            adjacency = [self.block_adjacency[b][i] for i in interpreters]
+            n_right, offset = len(self.block_pairs[b]), 0
+        else:
+            low, high = entries
+            adjacency = [[k - low for k in self.block_adjacency[b][i] if low <= k < high] for i in interpreters]
+            n_right, offset = high - low, low
+        match_left = hopcroft_karp(adjacency, n_right)
+        return [(i, k + offset) for i, k in zip(interpreters, match_left) if k != -1]
+
+    def cover_sessions(self, b, interpreters, order):
+        # Fully covers the sessions of block b in the given order, each one if a perfect matching between its pairs
+        # and the interpreters not used yet exists
+        free = list(interpreters)
+        solution = []
+        for s in order:
+            low, high = self.session_entries[b][s]
+            matching = self.match(b, [i for i in free if i in self.block_adjacency[b]], (low, high))
+            if len(matching) == high - low:
+                solution.extend(matching)
+                used = {i for i, _ in matching}
+                free = [i for i in free if i not in used]
+        return solution
+
+    def solve_block(self, b, excluded=None, first=None):
+        # Best block b solution found with the interpreters that can join it. For OF2, the sessions are covered from
+        # the smallest, after the session first and the ones already covered
+        interpreters = self.candidates(b, excluded)
+        if self.objective == "OF1":
+            return self.match(b, interpreters)
+        covered = self.covered_sessions(b)
+        order = sorted(self.session_entries[b], key=lambda s: (s != first, s not in covered, self._size(b, s)))
+        return self.cover_sessions(b, interpreters, order)
+
+    def _size(self, b, s):
+        low, high = self.session_entries[b][s]
+        return high - low
+
+    def covered_sessions(self, b, solution=None):
+        # Sessions of block b whose pairs are all covered (sessions without pairs excluded)
+        counts = {}
+        for _, k in self.solution[b] if solution is None else solution:
+            s = self.block_pairs[b][k][0]
+            counts[s] = counts.get(s, 0) + 1
+        return {s for s, count in counts.items() if count == self._size(b, s)}
+
+    def value(self, b, solution=None):
+        solution = self.solution[b] if solution is None else solution
+        if self.objective == "OF1":
+            return len(solution)
+        empty = sum(1 for s in self.session_entries[b] if self._size(b, s) == 0)
+        return len(self.covered_sessions(b, solution)) + empty
+
+    def assign(self, b, solution):
+        for i, _ in self.solution[b]:
+            self.blocks_of[i].discard(b)
+        for i, _ in solution:
+            self.blocks_of[i].add(b)
+        self.solution[b] = solution
+
+    def assignments(self):
+        rows = [(i, *self.block_pairs[b][k]) for b in range(self.data.n_blocks) for i, k in self.solution[b]]
+        return np.array(rows, dtype=np.int64).reshape(-1, 3)
+
+    def load(self, z):
+        for b in range(self.data.n_blocks):
+            self.assign(b, [])
+        for i, s, p in np.asarray(z).tolist():
+            b = int(self.data.session_block[s])
+            low, high = self.session_entries[b][s]
+            k = low + self.data.session_pairs(s).index(p)
+            self.solution[b].append((i, k))
+            self.blocks_of[i].add(b)
+
+
+def greedy(data, objective, operational_constraints: bool = False):
+    # Builds a solution block by block: for OF1 a maximum matching between the interpreters that can still join the
+    # block and its pairs, for OF2 the sessions that can be fully covered, smallest first
+    schedule = _Schedule(data, objective, operational_constraints)
+    for b in range(data.n_blocks):
+        schedule.assign(b, schedule.solve_block(b))
+    return schedule.assignments()
+
+
+def local_search(data, objective, z, operational_constraints: bool = False, time_limit=None):
+    # Improves the assignments z until no move improves them or time_limit (seconds) is reached. Moves:
+    # - a block is solved again with the interpreters that can join it, which also follows augmenting paths
+    #   (chains of ejections within the block), and for OF2 tries to cover each uncovered session first;
+    # - with operational constraints, an interpreter blocked by the operational rules (such as 15 sessions or 3
+    #   consecutive blocks) is ejected from one of its other blocks (if that block keeps its value without it) to
+    #   join a block it improves.
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    schedule = _Schedule(data, objective, operational_constraints)
+    schedule.load(z)
+
+    def out_of_time():
+        return deadline is not None and time.perf_counter() > deadline
+
+    improved = True
+    while improved and not out_of_time():
+        improved = False
+        for b in range(data.n_blocks):
+            if out_of_time():
+                break
+            firsts = [None] if objective == "OF1" else [
+                s for s in schedule.session_entries[b] if s not in schedule.covered_sessions(b)
+            ]
+            for first in firsts:
+                solution = schedule.solve_block(b, first=first)
+                if schedule.value(b, solution) > schedule.value(b):
+                    schedule.assign(b, solution)
+                    improved = True
+                    break
+
+        if improved or not operational_constraints:
+            continue
+        for b in range(data.n_blocks):
+            if out_of_time() or improved:
+                break
+            if schedule.value(b) == len(schedule.block_pairs[b] if objective == "OF1" else schedule.session_entries[b]):
+                continue
+            blocked = [i for i in schedule.block_adjacency[b] if not schedule.can_join(i, b)]
+            for i in blocked:
+                if improved or out_of_time():
+                    break
+                for b2 in sorted(schedule.blocks_of[i]):
+                    previous = schedule.solution[b2]
+                    solution = schedule.solve_block(b2, excluded=i)
+                    if schedule.value(b2, solution) < schedule.value(b2):
+                        continue
+                    schedule.assign(b2, solution)
+                    if schedule.can_join(i, b):
+                        candidate = schedule.solve_block(b)
+                        if schedule.value(b, candidate) > schedule.value(b):
+                            schedule.assign(b, candidate)
+                            improved = True
+                            break
+                    schedule.assign(b2, previous)
+
+    return schedule.assignments()
+
+
+def solve(data, objective, operational_constraints: bool = False, time_limit=1.0):
+    # Greedy solution improved by local search within time_limit seconds (the greedy itself always completes)
+    start = time.perf_counter()
+    z = greedy(data, objective, operational_constraints)
+    remaining = None if time_limit is None else max(time_limit - (time.perf_counter() - start), 0.0)
+    return local_search(data, objective, z, operational_constraints, remaining)
+
+
+def upper_bound(data, objective, operational_constraints: bool = False):
+    # Combinatorial bound of the static analysis (analysis.py): for OF1 the maximum matching of every block, for OF2
+    # the number of sessions that can each be fully covered, as many per block as the interpreters allow
+    return Analysis(data).upper_bound(objective, operational_constraints)
+
+
+class ISPHeuristic:
+    # Greedy and local search solution of ISP (no bridging), for quick answers within time_limit seconds. The
+    # reported gap is to the combinatorial bound of upper_bound.
+
+    def __init__(self, name, objective, operational_constraints: bool = False, time_limit=1.0):
+        if objective not in ("OF1", "OF2"):
+            raise ValueError("Objective function must be either 'OF1' or 'OF2', got: " + objective)
+        self.instance = load_instance(name)
+        self.data = self.instance.compile()
+        self.objective = objective
+        self.operational_constraints = operational_constraints
+        self.time_limit = time_limit
+
+        self.x = _Values()
+        self.y = _Values()
+        self.z = _Values()
+        self.t = _Values()
+
+        self.is_optimized = False
+        self._runtime = None
+        self._objective_value = None
+        self._bound = None
+
+    @staticmethod
+    def supports(objective, operational_constraints: bool = False, bridging=None):
+        return not bridging
+
+    def optimize(self):
+        start = time.perf_counter()
+        z = solve(self.data, self.objective, self.operational_constraints, self.time_limit)
+        self._runtime = time.perf_counter() - start
+
+        self._objective_value = evaluate(self.data, self.objective, z)
+        self._bound = upper_bound(self.data, self.objective, self.operational_constraints)
+        self.x, self.y, self.z, self.t = solution_values(self.data, z)
+        self.is_optimized = True
+
+    def print_results(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return
+
+        print("\n--- Result ---")
+        print(f"Objective value: {self._objective_value} (upper bound: {self._bound})")
+        for i, s, l1, l2 in self.assignments():
+            print(f"{i} assigned to {s} covers pair ({l1}, {l2})")
+
+    def assignments(self):
+        # Names (interpreter, session, l1, l2) of the pairs covered in the solution
+        data = self.data
+        return [(data.interpreters[i], data.sessions[s], *data.pair_names(p)) for (i, s, p) in self.z]
+
+    @property
+    def runtime(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return None
+        return self._runtime
+
+    @property
+    def bound(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return None
+        return self._bound
+
+    @property
+    def mip_gap(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return None
+        if self._objective_value == 0:
+            return 0.0 if self._bound == 0 else float("inf")
+        return abs(self._bound - self._objective_value) / abs(self._objective_value)
+
+    @property
+    def objective_value(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return None
+        return self._objective_value
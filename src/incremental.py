@@ -0,0 +1,527 @@
+from instance import Instance
+import heuristics
+import gurobipy as gp
+from gurobipy import GRB
+import numpy as np
+
+
+# Formulations of ISP and ISPBridge (the formulation argument of the models):
+# - current: the model as described, constraint families 1 to 5 (and 8 to 10 with bridging);
+# - minimal: without the rows other rows imply: constraint 2 (y <= sum of x, from 4 and z <= x in 3) and 9 (the
+#   participations of a slot are at most x <= 1 by 3), and constraint 5 as one row per session,
+#   n_pairs(s) * t[s] <= sum of the pairs covered in s, instead of one row per pair;
+# - strengthened: the current model with valid inequalities from the static analysis (see _add_valid_inequalities).
+FORMULATIONS = ["current", "minimal", "strengthened"]
+
+
+class IncrementalModel:
+    # Schedule changes applied in place to a built Gurobi model (ISP, ISPBridge), which is then solved again from
+    # its previous solution with reoptimize(). Interpreters, sessions and blocks are given by name or by id.
+    # Removing and fixing only change variable bounds. Adding sessions and language pairs adds their variables
+    # (relays included) and rows, and changes the coefficients of the existing rows they appear in.
+    # The sessions pruned by the static analysis (see _pruned_sessions) get their variables when their languages
+    # change, but a model with pruned sessions cannot switch to OF1.
+
+    # Name of the constraint families edited by the changes, and of the variable family counted by OF1
+    SLOT_ROWS = "one_translation_per_session"
+    T_ROWS = "t_impl_y"
+    COVER = "y"
+    COVER_ROWS = None
+    # Position of the session and pair in the keys of the variable families that depend on a (session, pair)
+    SESSION_PAIR_KEYS = {"y": (0, 1), "u": (0, 1), "z": (1, 2), "w": (2, 3), "h": (1, 2), "r": (0, 1)}
+
+    def _init_changes(self):
+        self.n_original_sessions = self.data.n_sessions
+        self.removed_interpreters = set()
+        self.removed_sessions = set()
+        # fixed[i, s] is True if interpreter i must be assigned to session s, False if it must not
+        self.fixed = {}
+        # Rows added by the changes, by (kind, ...) key, None for a removed row
+        self._rows = {}
+        self._previous = None
+        self.changes = None
+
+    # === Static analysis ===
+    def _pruned_sessions(self, objective, prune):
+        # pruned[s] is True if session s gets no z and relay variables: with OF2 alone, the sessions that can never
+        # be fully covered do not change the objective, whatever their interpreters do
+        if prune and objective == "OF2":
+            return ~self.analysis.completable
+        return np.zeros(self.data.n_sessions, dtype=bool)
+
+    def _apply_analysis(self):
+        # Fixes to 0 the variables that the analysis shows are always 0: t of the sessions that are never fully
+        # covered, y of the pairs without eligible interpreter, and u of the pairs never covered
+        analysis = self.analysis
+        self.t.set("UB", 0.0, np.flatnonzero(~analysis.completable))
+        self.y.set("UB", 0.0, np.flatnonzero(~analysis.direct))
+        if self.COVER == "u":
+            self.u.set("UB", 0.0, np.flatnonzero(~analysis.coverable))
+
+    # === Formulations ===
+    def _check_formulation(self, formulation):
+        if formulation not in FORMULATIONS:
+            raise ValueError(f"Formulation must be one of {FORMULATIONS}, got: {formulation}")
+        return formulation
+
+    def _add_session_cover_rows(self, name):
+        # 5 (minimal formulation): n_pairs(s) * t[s] <= sum of the pairs covered in s, one row per session
+        cover = self.builder.families[self.COVER]
+        y_s = cover.keys_array[0]
+        n_pairs = np.diff(self.data.session_pair_ptr)
+        n_sessions = self.data.n_sessions
+        self.builder.add_constraints(
+            name, n_sessions,
+            np.concatenate([np.arange(n_sessions), y_s]),
+            np.concatenate([self.t.columns, cover.columns]),
+            np.concatenate([n_pairs, -np.ones(len(cover))]), GRB.LESS_EQUAL, 0.0,
+            lambda k: f"{name}_{k}"
+        )
+
+    def _add_valid_inequalities(self):
+        # Valid inequalities of the strengthened formulation, from the bounds of the static analysis (analysis.py).
+        # Only the rows tighter than what the other rows give are added:
+        # - block_cover_capacity: the pairs covered in a block are at most analysis.block_pairs[b];
+        # - block_session_capacity: the sessions fully covered in a block are at most analysis.block_sessions[b];
+        # - session_clique: at most one session of each set of session_cliques(b) is fully covered.
+        # They stay valid when interpreters or sessions are removed or assignments fixed, which only lower bounds
+        data, analysis = self.data, self.analysis
+        cover = self.builder.families[self.COVER]
+        entry_block = data.session_block[cover.keys_array[0]]
+        coverable = analysis.coverable if self.COVER == "u" else analysis.direct
+        blocks = np.flatnonzero(analysis.block_pairs < np.bincount(entry_block[coverable], minlength=data.n_blocks))
+        rows = np.searchsorted(blocks, entry_block)
+        kept = np.isin(entry_block, blocks) & coverable
+        self.builder.add_constraints(
+            "block_cover_capacity", len(blocks), rows[kept], cover.columns[kept], 1.0, GRB.LESS_EQUAL,
+            analysis.block_pairs[blocks], lambda k: f"block_cover_capacity_{blocks[k]}"
+        )
+
+        completable = np.flatnonzero(analysis.completable)
+        session_block = data.session_block[completable]
+        blocks = np.flatnonzero(analysis.block_sessions < np.bincount(session_block, minlength=data.n_blocks))
+        kept = np.isin(session_block, blocks)
+        self.builder.add_constraints(
+            "block_session_capacity", len(blocks), np.searchsorted(blocks, session_block[kept]),
+            self.t.columns[completable[kept]], 1.0, GRB.LESS_EQUAL, analysis.block_sessions[blocks],
+            lambda k: f"block_session_capacity_{blocks[k]}"
+        )
+
+        cliques = [clique for b in range(data.n_blocks) for clique in analysis.session_cliques(b)]
+        sizes = [len(clique) for clique in cliques]
+        self.builder.add_constraints(
+            "session_clique", len(cliques), np.repeat(np.arange(len(cliques)), sizes),
+            self.t.columns[np.array([s for clique in cliques for s in clique], dtype=np.int64)], 1.0, GRB.LESS_EQUAL,
+            1.0, lambda k: "session_clique_" + "_".join(map(str, cliques[k]))
+        )
+
+    def _check_editable(self):
+        # Sessions and pairs are only added to the current formulation: the rows of the minimal one are per session,
+        # and the valid inequalities of the strengthened one would not hold for the new sessions
+        formulation = getattr(self, "formulation", "current")
+        if formulation != "current":
+            raise ValueError(f"Sessions and language pairs can only be changed in the current formulation, the model "
+                             f"has the {formulation} one")
+
+    def _unprune_session(self, s):
+        # Adds the z and relay variables that _pruned_sessions left out of session s to the rows of its pairs
+        data = self.data
+        self.pruned[s] = False
+        for p in data.session_pairs(s):
+            # The pairs of a pruned session were never changed, their rows are those of the build
+            k = int(self.y.positions(([s], [p]))[0])
+            interpreters = np.array(data.eligible_interpreters(p), dtype=np.int64)
+            n = len(interpreters)
+            self.builder.add_variables("z", (interpreters, np.full(n, s), np.full(n, p)), GRB.BINARY)
+            relays = self._add_pair_relays([k]) if self.COVER == "u" else None
+            self.model.update()
+            if relays is not None:
+                self._add_relays_to_rows(relays)
+
+            z = [self.z.var(j) for j in range(len(self.z) - n, len(self.z))]
+            for i, var in zip(interpreters.tolist(), z):
+                # 2: the assigned interpreter covers the pair, 3: in its row of the session, 4: the pair y
+                self.model.chgCoeff(self._row("cover_pair", k), self._x_var(i, s), 1.0)
+                self.model.chgCoeff(self._slot_row(i, s), var, 1.0)
+                self.model.chgCoeff(self._row("y_impl_z", k), var, -1.0)
+
+    @property
+    def upper_bound(self):
+        # Combinatorial bound of the primary objective on the instance as built, before any change
+        return self.analysis.upper_bound(self.objective, self.operational_constraints)
+
+    # === Ids ===
+    def _interpreter_id(self, i):
+        return self.data.interpreters.index(i) if isinstance(i, str) else int(i)
+
+    def _session_id(self, s):
+        return self.data.sessions.index(s) if isinstance(s, str) else int(s)
+
+    def _block_id(self, b):
+        return self.data.blocks.index(b) if isinstance(b, str) else int(b)
+
+    # === Changes ===
+    def remove_interpreter(self, i):
+        i = self._interpreter_id(i)
+        self._before_change()
+        self.removed_interpreters.add(i)
+        self._update_x_bounds(interpreters=[i])
+
+    def restore_interpreter(self, i):
+        i = self._interpreter_id(i)
+        self._before_change()
+        self.removed_interpreters.discard(i)
+        self._update_x_bounds(interpreters=[i])
+
+    def fix_assignment(self, i, s, assigned: bool = True):
+        # Forces interpreter i to be assigned to session s (assigned=True) or not to be (assigned=False)
+        i, s = self._interpreter_id(i), self._session_id(s)
+        self._before_change()
+        self.fixed[i, s] = assigned
+        self._update_x_bounds(interpreters=[i], sessions=[s])
+
+    def release_assignment(self, i, s):
+        i, s = self._interpreter_id(i), self._session_id(s)
+        self._before_change()
+        self.fixed.pop((i, s), None)
+        self._update_x_bounds(interpreters=[i], sessions=[s])
+
+    def remove_session(self, s):
+        s = self._session_id(s)
+        self._before_change()
+        self.removed_sessions.add(s)
+        self._update_x_bounds(sessions=[s])
+        # A session without interpreters cannot cover any pair, but a session without pairs would still count in OF2
+        self.t.set("UB", 0.0, self.t.positions(([s],)))
+
+    def cancel_block(self, b):
+        for s in self.data.block_sessions(self._block_id(b)):
+            self.remove_session(s)
+
+    def add_session(self, session, block, languages):
+        # Adds a new session to an existing block, returns its id
+        b = self._block_id(block)
+        self._check_editable()
+        if session in self.data.sessions:
+            raise ValueError(f"Session {session} already exists")
+        self._check_languages(languages)
+        self._before_change()
+
+        def change(instance):
+            instance.sessions.append(session)
+            instance.languages_per_session[session] = list(languages)
+            instance.sessions_per_block[instance.blocks[b]].append(session)
+        self._update_instance(change)
+
+        data = self.data
+        s = data.sessions.index(session)
+        n_interpreters = data.n_interpreters
+        ub = np.array([0.0 if i in self.removed_interpreters else 1.0 for i in range(n_interpreters)])
+        self.builder.add_variables("x", (np.arange(n_interpreters), np.full(n_interpreters, s)), GRB.BINARY, ub=ub)
+        self.builder.add_variables("t", ([s],), GRB.BINARY, obj=self._objective_coefficient("t"))
+        self.model.update()
+
+        # The new x variables join the rows of constraint 1 of their interpreter, and those of the operational rules
+        # whose blocks include b (see rules.py)
+        for i in range(n_interpreters):
+            row = self._row("one_session_per_interpreter", b * n_interpreters + i)
+            self.model.chgCoeff(row, self._x_var(i, s), 1.0)
+        for name, (row_i, starts, ends, _) in self.rule_groups.items():
+            for k in np.flatnonzero((starts <= b) & (b < ends)).tolist():
+                self.model.chgCoeff(self._row(name, k), self._x_var(int(row_i[k]), s), 1.0)
+
+        self._add_pairs(s, data.session_pairs(s))
+        return s
+
+    def update_session_languages(self, s, languages):
+        # Replaces the languages of session s: the pairs it no longer uses are disabled, the new ones are added
+        s = self._session_id(s)
+        self._check_editable()
+        self._check_languages(languages)
+        self._before_change()
+        if s < self.n_original_sessions and self.pruned[s]:
+            self._unprune_session(s)
+        previous = set(self.data.session_pairs(s))
+
+        def change(instance):
+            instance.languages_per_session[instance.sessions[s]] = list(languages)
+        self._update_instance(change)
+
+        current = set(self.data.session_pairs(s))
+        self._remove_pairs(s, sorted(previous - current))
+        self._add_pairs(s, sorted(current - previous))
+        # The analysis may have fixed t[s] for the previous languages
+        if s not in self.removed_sessions:
+            self.t.set("UB", 1.0, self.t.positions(([s],)))
+
+    # === Objectives ===
+    def set_objective(self, objective):
+        # Switches the model to another objective, reoptimize() then starts from the solution of the previous one
+        self._before_change()
+        self._add_objective(objective)
+
+    def set_lexicographic(self, objectives, reltol=0.0, abstol=0.0):
+        # Optimizes the objectives in the given order (e.g. ["OF2", "OF1"]) with the multi-objective API of Gurobi:
+        # each one is optimized while the previous ones may only degrade by reltol (relative) or abstol (absolute)
+        self._before_change()
+        self._add_objective(objectives, reltol, abstol)
+
+    def _add_objective(self, objectives, reltol=0.0, abstol=0.0):
+        objectives = [objectives] if isinstance(objectives, str) else list(objectives)
+        for objective in objectives:
+            if objective not in ("OF1", "OF2"):
+                raise ValueError("Objective function must be either 'OF1' or 'OF2', got: " + objective)
+        if "OF1" in objectives and self.pruned.any():
+            raise ValueError("OF1 counts the pairs of the pruned sessions, build the model with prune=False")
+        # self.objective is the primary objective
+        self.objective = objectives[0]
+        self.objectives = tuple(objectives)
+        self.objective_tolerances = (reltol, abstol)
+
+        # NumObj only reflects objectives set since the last update
+        self.model.update()
+        if self.model.NumObj > 1:
+            self.model.NumObj = 0
+            self.model.update()
+        if len(objectives) == 1:
+            self.model.setObjective(self._objective_expression(objectives[0]), GRB.MAXIMIZE)
+            return
+        self.model.ModelSense = GRB.MAXIMIZE
+        for k, objective in enumerate(objectives):
+            self.model.setObjectiveN(self._objective_expression(objective), k, priority=len(objectives) - k,
+                                     reltol=reltol, abstol=abstol, name=objective)
+
+    def _objective_family(self, objective):
+        # OF1 counts the covered pairs (y, or u with bridges), OF2 the fully covered sessions
+        return self.builder.families[self.COVER if objective == "OF1" else "t"]
+
+    def _objective_expression(self, objective):
+        return self._objective_family(objective).mvar.sum()
+
+    def _objective_coefficient(self, name):
+        # Objective coefficient of the new variables of a family, the multi-objective expressions are set again
+        # once they have been added (see _add_pairs)
+        if len(self.objectives) > 1:
+            return 0.0
+        return 1.0 if self._objective_family(self.objective) is self.builder.families[name] else 0.0
+
+    @property
+    def objective_values(self):
+        # Value of both objectives in the solution, whichever one is optimized
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return None
+        return {objective: float(np.round(self._objective_family(objective).X.sum())) for objective in ("OF1", "OF2")}
+
+    # === Solving again ===
+    def reoptimize(self):
+        # Solves the changed model, starting from the previous solution without the assignments the changes
+        # forbid, and returns the changes of the schedule (see self.changes)
+        previous = self._previous
+        if previous is not None:
+            self.model.update()
+            z = previous["z"]
+            keep = self.z.get("UB", self.z.positions(tuple(z.T), strict=False)) > 0.5
+            keep &= self.x.get("UB", self.x.positions((z[:, 0], z[:, 1]))) > 0.5
+            keep &= self.z.positions(tuple(z.T), strict=False) >= 0
+            self.set_start(z[keep])
+        self.optimize()
+
+        before = previous["schedule"] if previous is not None else set()
+        after = self._schedule() if self.result.sol_count else set()
+        added, removed = sorted(after - before), sorted(before - after)
+        self.changes = {
+            "kept": len(before & after),
+            "added": added,
+            "removed": removed,
+            "interpreters_changed": len({i for a in added + removed for i in a[:self._n_interpreters(a)]}),
+            "objective_before": previous["objective"] if previous is not None else None,
+            "objective_after": self.result.objective if self.result.sol_count else None,
+        }
+        self._previous = None
+        return self.changes
+
+    def set_start(self, z):
+        # MIP start from the direct assignments z, rows (i, s, p): interpreter i covers the pair p in session s
+        # The other variables (relays) start at 0, and the start respects the bounds set by the changes
+        data = self.data
+        z = np.asarray(z, dtype=np.int64).reshape(-1, 3)
+        # Pruned sessions have no z variables
+        z = z[self.z.positions(tuple(z.T), strict=False) >= 0]
+        start = {name: np.zeros(len(family)) for name, family in self.builder.families.items()}
+        start["x"][self.x.positions((z[:, 0], z[:, 1]))] = 1.0
+        start["y"][self.y.positions((z[:, 1], z[:, 2]))] = 1.0
+        start["z"][self.z.positions((z[:, 0], z[:, 1], z[:, 2]))] = 1.0
+        # A session is fully covered when all its pairs are (a session without pairs always is)
+        covered = np.zeros(len(data.session_pair_indices) + 1)
+        covered[heuristics.y_entries(data, z[:, 1], z[:, 2])] = 1.0
+        n_pairs = np.diff(data.session_pair_ptr)
+        n_covered = np.add.reduceat(covered, data.session_pair_ptr[:-1])
+        full = np.where(n_pairs > 0, n_covered, 0) == n_pairs
+        start["t"][self.t.positions((np.arange(data.n_sessions),))] = full
+        if "u" in start:
+            start["u"] = start["y"]
+
+        self.model.update()
+        for name, values in start.items():
+            family = self.builder.families[name]
+            if len(family):
+                family.set("Start", np.clip(values, family.get("LB"), family.get("UB")))
+
+    # === Internals ===
+    def _before_change(self):
+        # Keeps the current solution, it is discarded by Gurobi as soon as the model changes
+        if self.is_optimized and self._previous is None and self.result.sol_count:
+            selected = self.z.X > 0.5
+            self._previous = {
+                "z": np.stack([k[selected] for k in self.z.keys_array], axis=1),
+                "schedule": self._schedule(),
+                "objective": self.result.objective,
+            }
+        self.is_optimized = False
+
+    def _print_values(self):
+        # Nonzero variables of the solution, as printAttr("X") of Gurobi prints them
+        if self.backend.name == "gurobi":
+            self.model.printAttr("X")
+            return
+        if self.result.x is None:
+            return
+        for name, family in self.builder.families.items():
+            values = family.X
+            for k in np.flatnonzero(np.abs(values) > 1e-9).tolist():
+                print(f"{name}[{','.join(str(key[k]) for key in family.keys_array)}] {values[k]:g}")
+
+    def _schedule(self):
+        schedule = set(self.assignments())
+        if hasattr(self, "relays"):
+            schedule.update(self.relays())
+        return schedule
+
+    @staticmethod
+    def _n_interpreters(entry):
+        # Assignments are (i, s, l1, l2), relays (i1, i2, s, l1, l2, l_prime)
+        return 2 if len(entry) == 6 else 1
+
+    def _check_languages(self, languages):
+        unknown = set(languages) - set(self.data.languages)
+        if unknown:
+            raise ValueError(f"Unknown languages: {sorted(unknown)}")
+
+    def _update_instance(self, change):
+        # Applies change to a copy of the instance lists, and compiles the result. Existing ids do not change
+        instance = Instance.from_compiled(self.instance.name, self.data)
+        change(instance)
+        instance._compiled = None
+        self.instance = instance
+        self.data = instance.compile()
+
+    def _update_x_bounds(self, interpreters=None, sessions=None):
+        data = self.data
+        interpreters = range(data.n_interpreters) if interpreters is None else interpreters
+        sessions = range(data.n_sessions) if sessions is None else sessions
+        i, s = (k.ravel() for k in np.meshgrid(list(interpreters), list(sessions), indexing="ij"))
+        removed = np.array([
+            i_ in self.removed_interpreters or s_ in self.removed_sessions or self.fixed.get((i_, s_)) is False
+            for i_, s_ in zip(i.tolist(), s.tolist())
+        ], dtype=bool)
+        forced = np.array([self.fixed.get(key) is True for key in zip(i.tolist(), s.tolist())], dtype=bool)
+        positions = self.x.positions((i, s))
+        self.x.set("UB", np.where(removed, 0.0, 1.0), positions)
+        self.x.set("LB", np.where(forced & ~removed, 1.0, 0.0), positions)
+
+    def _row(self, family, k):
+        return self.builder.constraints[family][k].item()
+
+    def _x_var(self, i, s):
+        return self.x.var(int(self.x.positions(([i], [s]))[0]))
+
+    def _slot_row(self, i, s):
+        # Row of constraint 3 of interpreter i in session s, created for the sessions added by the changes
+        if s < self.n_original_sessions:
+            return self._row(self.SLOT_ROWS, i * self.n_original_sessions + s)
+        key = ("slot", i, s)
+        if key not in self._rows:
+            self._rows[key] = self.model.addLConstr(gp.LinExpr(-1.0, self._x_var(i, s)), GRB.LESS_EQUAL, 0.0)
+        return self._rows[key]
+
+    def _cover_row(self, k):
+        # Row of constraint 8 of the k-th y variable, created in _add_pairs for the pairs added by the changes
+        if k < self.builder.constraints[self.COVER_ROWS].size:
+            return self._row(self.COVER_ROWS, k)
+        return self._rows["cover", *(int(key[k]) for key in self.y.keys_array)]
+
+    def _add_relays_to_rows(self, relays):
+        # Adds relay variables created after the build (relay_slots and relay_cover arrays) to their rows
+        (slots, slot_columns), (cover, cover_columns) = relays
+        # 3: the relays join the rows of their two interpreters in the session
+        for slot, var in zip(slots.tolist(), self.builder.variables(slot_columns)):
+            self.model.chgCoeff(self._slot_row(*divmod(slot, self.data.n_sessions)), var, 1.0)
+        # 8: u is covered directly or by one of the relays
+        for k, var in zip(cover.tolist(), self.builder.variables(cover_columns)):
+            self.model.chgCoeff(self._cover_row(k), var, -1.0)
+
+    def _pair_positions(self, name, s, p):
+        family = self.builder.families[name]
+        ks, kp = self.SESSION_PAIR_KEYS[name]
+        return np.flatnonzero((family.keys_array[ks] == s) & (family.keys_array[kp] == p))
+
+    def _remove_pairs(self, s, pairs):
+        for p in pairs:
+            for name in self.SESSION_PAIR_KEYS:
+                if name in self.builder.families:
+                    self.builder.families[name].set("UB", 0.0, self._pair_positions(name, s, p))
+            # Constraint 5 (t[s] <= y[s, p]) would keep the session from being fully covered
+            key = ("t", s, p)
+            if key in self._rows:
+                if self._rows[key] is not None:
+                    self.model.remove(self._rows[key])
+            else:
+                self.model.remove(self._row(self.T_ROWS, int(self.y.positions(([s], [p]))[0])))
+            self._rows[key] = None
+
+    def _add_pairs(self, s, pairs):
+        data = self.data
+        for p in pairs:
+            position = int(self.y.positions(([s], [p]), strict=False)[0])
+            if position >= 0:
+                # A pair removed before: its variables are enabled again
+                for name in self.SESSION_PAIR_KEYS:
+                    if name in self.builder.families:
+                        self.builder.families[name].set("UB", 1.0, self._pair_positions(name, s, p))
+            else:
+                interpreters = np.array(data.eligible_interpreters(p), dtype=np.int64)
+                n = len(interpreters)
+                self.builder.add_variables("y", ([s], [p]), GRB.BINARY, obj=self._objective_coefficient("y"))
+                if self.COVER == "u":
+                    self.builder.add_variables("u", ([s], [p]), GRB.BINARY, obj=self._objective_coefficient("u"))
+                self.builder.add_variables("z", (interpreters, np.full(n, s), np.full(n, p)), GRB.BINARY)
+                self.model.update()
+
+                y = self.y.var(len(self.y) - 1)
+                z = [self.z.var(k) for k in range(len(self.z) - n, len(self.z))]
+                x = [self._x_var(i, s) for i in interpreters.tolist()]
+                # 2: the pair is covered only if an interpreter speaking both languages is assigned
+                self.model.addLConstr(gp.LinExpr([1.0] * n + [-1.0], x + [y]), GRB.GREATER_EQUAL, 0.0)
+                # 3: the new z join the row of their interpreter in the session
+                for i, var in zip(interpreters.tolist(), z):
+                    self.model.chgCoeff(self._slot_row(i, s), var, 1.0)
+                # 4: y is only covered if one of the z is selected
+                self.model.addLConstr(gp.LinExpr([1.0] + [-1.0] * n, [y] + z), GRB.LESS_EQUAL, 0.0)
+                if self.COVER == "u":
+                    # 8: u is covered directly or by one of the relays
+                    u = self.u.var(len(self.u) - 1)
+                    self._rows["cover", s, p] = self.model.addLConstr(gp.LinExpr([1.0, -1.0], [u, y]), GRB.LESS_EQUAL,
+                                                                      0.0)
+                    relays = self._add_pair_relays([len(self.y) - 1])
+                    self.model.update()
+                    self._add_relays_to_rows(relays)
+
+            # 5: the session is fully covered only if the pair is
+            cover = self.builder.families[self.COVER]
+            cover_var = cover.var(int(cover.positions(([s], [p]))[0]))
+            t = self.t.var(int(self.t.positions(([s],))[0]))
+            self._rows["t", s, p] = self.model.addLConstr(gp.LinExpr([1.0, -1.0], [t, cover_var]), GRB.LESS_EQUAL, 0.0)
+
+        if len(self.objectives) > 1:
+            self._add_objective(self.objectives, *self.objective_tolerances)
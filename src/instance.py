@@ -1,5 +1,8 @@
+import itertools
 import json
 
+import numpy as np
+
 class Instance:
     def __init__(self, name):
         self.name = name
@@ -15,6 +18,33 @@ class Instance:
         self.languages_per_session = data["Languages_s"]
         self.sessions_per_block = data["Sessions_b"]
 
+        self._compiled = None
+
+    @classmethod
+    def from_compiled(cls, name, compiled):
+        # Rebuilds the instance lists from a compiled instance (as loaded from the cache), without the JSON file
+        instance = cls.__new__(cls)
+        instance.name = name
+        instance.interpreters = list(compiled.interpreters)
+        instance.sessions = list(compiled.sessions)
+        instance.blocks = list(compiled.blocks)
+        instance.languages = list(compiled.languages)
+
+        instance.languages_per_interpreter = {
+            i: [compiled.languages[l] for l in compiled.languages_of(mask)]
+            for i, mask in zip(compiled.interpreters, compiled.interpreter_masks)
+        }
+        instance.languages_per_session = {
+            s: [compiled.languages[l] for l in compiled.languages_of(mask)]
+            for s, mask in zip(compiled.sessions, compiled.session_masks)
+        }
+        instance.sessions_per_block = {
+            block: [compiled.sessions[s] for s in compiled.block_sessions(b)] for b, block in enumerate(compiled.blocks)
+        }
+
+        instance._compiled = compiled
+        return instance
+
     def __str__(self):
         return (f"Instance: {self.name}\n"
                 f"Interpreters: {self.interpreters}\n"
@@ -22,4 +52,201 @@ class Instance:
                 f"Blocks: {self.blocks}\n"
                 f"Languages of interpreters: {self.languages_per_interpreter}\n"
                 f"Languages per session: {self.languages_per_session}\n"
-                f"Sessions per block: {self.sessions_per_block}")
\ No newline at end of file
+                f"Sessions per block: {self.sessions_per_block}")
+
+    def compile(self):
+        if self._compiled is None:
+            self._compiled = CompiledInstance(self)
+        return self._compiled
+
+
+class CompiledInstance:
+    # Integer form of an instance, used to build the models. Interpreters, sessions, blocks and languages are
+    # identified by their position in the instance lists, language sets are bitmasks and the relations between
+    # them are stored as CSR arrays (the items of row k are indices[ptr[k]:ptr[k + 1]]).
+    # Names are only needed to report the results.
+
+    # Attributes stored by to_arrays: names as string arrays, the others as they are
+    NAMES = ("interpreters", "sessions", "blocks", "languages")
+    ARRAYS = ("pair_id", "pair_languages", "session_block", "block_session_ptr", "block_session_indices",
+              "session_pair_ptr", "session_pair_indices", "interpreter_pair_ptr", "interpreter_pair_indices",
+              "pair_session_ptr", "pair_session_indices", "pair_session_entries", "language_matrix",
+              "pair_interpreter_ptr", "pair_interpreter_indices")
+
+    def __init__(self, instance):
+        self.interpreters = list(instance.interpreters)
+        self.sessions = list(instance.sessions)
+        self.blocks = list(instance.blocks)
+        self.languages = list(instance.languages)
+        self.n_interpreters = len(self.interpreters)
+        self.n_sessions = len(self.sessions)
+        self.n_blocks = len(self.blocks)
+        self.n_languages = len(self.languages)
+
+        language_id = {l: k for k, l in enumerate(self.languages)}
+        session_id = {s: k for k, s in enumerate(self.sessions)}
+
+        # Bitmask of the languages spoken by each interpreter and used in each session
+        self.interpreter_masks = [self._mask(instance.languages_per_interpreter[i], language_id)
+                                  for i in self.interpreters]
+        self.session_masks = [self._mask(instance.languages_per_session[s], language_id) for s in self.sessions]
+
+        # pair_id[l1, l2] = pair_id[l2, l1] is the id of the language pair {l1, l2}, pairs are numbered in the
+        # order of itertools.combinations over the languages
+        first, second = np.triu_indices(self.n_languages, 1)
+        self.n_pairs = len(first)
+        self.pair_id = np.full((self.n_languages, self.n_languages), -1, dtype=np.int32)
+        self.pair_id[first, second] = np.arange(self.n_pairs, dtype=np.int32)
+        self.pair_id[second, first] = np.arange(self.n_pairs, dtype=np.int32)
+        self.pair_languages = np.stack([first, second], axis=1).astype(np.int32)
+        self.pair_masks = [(1 << int(l1)) | (1 << int(l2)) for l1, l2 in self.pair_languages]
+
+        self.session_block = np.empty(self.n_sessions, dtype=np.int32)
+        block_sessions = []
+        for b, block in enumerate(self.blocks):
+            sessions = [session_id[s] for s in instance.sessions_per_block[block]]
+            self.session_block[sessions] = b
+            block_sessions.append(sessions)
+        self.block_session_ptr, self.block_session_indices = self._csr(block_sessions)
+
+        self.session_pair_ptr, self.session_pair_indices = self._csr(
+            [self._pairs_of(mask) for mask in self.session_masks]
+        )
+        interpreter_pairs = [self._pairs_of(mask) for mask in self.interpreter_masks]
+        self.interpreter_pair_ptr, self.interpreter_pair_indices = self._csr(interpreter_pairs)
+
+        # Sessions using each pair, with the position of the pair in session_pair_indices
+        self.pair_session_ptr, self.pair_session_indices, self.pair_session_entries = self._pair_sessions(
+            self.session_pair_ptr, self.session_pair_indices, self.n_pairs
+        )
+
+        # language_matrix[i, l] is True if interpreter i speaks language l
+        self.language_matrix = self._matrix(self.interpreter_masks, self.n_languages)
+
+        pair_interpreters = [[] for _ in range(self.n_pairs)]
+        for i, pairs in enumerate(interpreter_pairs):
+            for p in pairs:
+                pair_interpreters[p].append(i)
+        self.pair_interpreter_ptr, self.pair_interpreter_indices = self._csr(pair_interpreters)
+
+    def to_arrays(self):
+        # Everything needed to rebuild the compiled instance, as NumPy arrays (see from_arrays)
+        arrays = {name: np.array(getattr(self, name), dtype=str) for name in self.NAMES}
+        arrays.update({name: getattr(self, name) for name in self.ARRAYS})
+        arrays["session_language_matrix"] = self._matrix(self.session_masks, self.n_languages)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        compiled = cls.__new__(cls)
+        for name in cls.NAMES:
+            setattr(compiled, name, arrays[name].tolist())
+        for name in cls.ARRAYS:
+            setattr(compiled, name, arrays[name])
+        compiled.n_interpreters = len(compiled.interpreters)
+        compiled.n_sessions = len(compiled.sessions)
+        compiled.n_blocks = len(compiled.blocks)
+        compiled.n_languages = len(compiled.languages)
+        compiled.n_pairs = len(compiled.pair_languages)
+
+        compiled.interpreter_masks = cls._masks(compiled.language_matrix)
+        compiled.session_masks = cls._masks(arrays["session_language_matrix"])
+        compiled.pair_masks = [(1 << int(l1)) | (1 << int(l2)) for l1, l2 in compiled.pair_languages]
+        return compiled
+
+    def subset(self, blocks):
+        # Compiled instance restricted to the given blocks and their sessions, with the same interpreters, languages
+        # and pair ids. Sessions are numbered in the order of the blocks, see block_sessions.
+        blocks = list(blocks)
+        sessions = [s for b in blocks for s in self.block_sessions(b)]
+        arrays = self.to_arrays()
+        arrays["blocks"] = arrays["blocks"][blocks]
+        arrays["sessions"] = arrays["sessions"][sessions]
+        arrays["session_language_matrix"] = arrays["session_language_matrix"][sessions]
+
+        block_sizes = [len(self.block_sessions(b)) for b in blocks]
+        arrays["session_block"] = np.repeat(np.arange(len(blocks), dtype=np.int32), block_sizes)
+        arrays["block_session_ptr"], arrays["block_session_indices"] = self._csr(
+            np.split(np.arange(len(sessions)), np.cumsum(block_sizes)[:-1]) if blocks else []
+        )
+        arrays["session_pair_ptr"], arrays["session_pair_indices"] = self._csr(
+            [self.session_pairs(s) for s in sessions]
+        )
+        (arrays["pair_session_ptr"], arrays["pair_session_indices"],
+         arrays["pair_session_entries"]) = self._pair_sessions(
+            arrays["session_pair_ptr"], arrays["session_pair_indices"], self.n_pairs
+        )
+        return CompiledInstance.from_arrays(arrays)
+
+    @staticmethod
+    def _pair_sessions(session_pair_ptr, session_pair_indices, n_pairs):
+        # Transpose of the session -> pair CSR arrays, with the position of each entry in session_pair_indices
+        order = np.argsort(session_pair_indices, kind="stable")
+        counts = np.bincount(session_pair_indices, minlength=n_pairs)
+        ptr = np.zeros(n_pairs + 1, dtype=np.int64)
+        ptr[1:] = np.cumsum(counts)
+        n_sessions = len(session_pair_ptr) - 1
+        indices = np.repeat(np.arange(n_sessions, dtype=np.int32), np.diff(session_pair_ptr))[order]
+        return ptr, indices, order.astype(np.int64)
+
+    @staticmethod
+    def _matrix(masks, n_languages):
+        return np.array(
+            [[mask >> l & 1 for l in range(n_languages)] for mask in masks], dtype=bool
+        ).reshape(len(masks), n_languages)
+
+    @staticmethod
+    def _masks(matrix):
+        # Inverse of _matrix: one bitmask per row of a boolean matrix
+        return [int.from_bytes(np.packbits(row, bitorder="little").tobytes(), "little") for row in matrix]
+
+    @staticmethod
+    def _mask(languages, language_id):
+        mask = 0
+        for l in languages:
+            mask |= 1 << language_id[l]
+        return mask
+
+    @staticmethod
+    def _csr(rows):
+        ptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        ptr[1:] = np.cumsum([len(row) for row in rows])
+        indices = np.fromiter((k for row in rows for k in row), dtype=np.int32, count=int(ptr[-1]))
+        return ptr, indices
+
+    def _pairs_of(self, mask):
+        languages = self.languages_of(mask)
+        return [int(self.pair_id[l1, l2]) for l1, l2 in itertools.combinations(languages, 2)]
+
+    def languages_of(self, mask):
+        return [l for l in range(self.n_languages) if mask >> l & 1]
+
+    def block_sessions(self, b):
+        return self.block_session_indices[self.block_session_ptr[b]:self.block_session_ptr[b + 1]].tolist()
+
+    def session_pairs(self, s):
+        return self.session_pair_indices[self.session_pair_ptr[s]:self.session_pair_ptr[s + 1]].tolist()
+
+    def interpreter_pairs(self, i):
+        return self.interpreter_pair_indices[self.interpreter_pair_ptr[i]:self.interpreter_pair_ptr[i + 1]].tolist()
+
+    def eligible_interpreters(self, p):
+        return self.pair_interpreter_indices[self.pair_interpreter_ptr[p]:self.pair_interpreter_ptr[p + 1]].tolist()
+
+    def interpreter_classes(self):
+        # Groups the interpreters speaking exactly the same languages, which are interchangeable in the models.
+        # Returns class_of[i] and the members of each class as CSR arrays, classes being numbered in the order of
+        # their first interpreter and members in increasing order
+        _, first, class_of = np.unique(self.language_matrix, axis=0, return_index=True, return_inverse=True)
+        # Renumber the classes in the order of their first interpreter
+        rank = np.empty(len(first), dtype=np.int64)
+        rank[np.argsort(first, kind="stable")] = np.arange(len(first))
+        class_of = rank[class_of.ravel()]
+        order = np.argsort(class_of, kind="stable")
+        ptr = np.zeros(len(first) + 1, dtype=np.int64)
+        ptr[1:] = np.cumsum(np.bincount(class_of, minlength=len(first)))
+        return class_of, ptr, order.astype(np.int32)
+
+    def pair_names(self, p):
+        l1, l2 = self.pair_languages[p]
+        return self.languages[l1], self.languages[l2]
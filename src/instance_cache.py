@@ -0,0 +1,101 @@
+from argparse import ArgumentParser
+import hashlib
+import os
+import zipfile
+
+import numpy as np
+
+from instance import CompiledInstance, Instance
+
+# Bumped whenever the compiled instance changes, so that older cache files are not loaded anymore
+FORMAT_VERSION = 1
+DEFAULT_CACHE_DIR = ".cache"
+
+parser = ArgumentParser(description="Compile the JSON instances of a directory into the binary instance cache")
+parser.add_argument("directory", type=str, nargs="?", default="instances", help="Directory of the instance files")
+parser.add_argument("--cache-dir", type=str, default=None,
+                    help="Cache directory (default: $ISP_CACHE_DIR, or .cache next to the instance files)")
+parser.add_argument("--force", action="store_true", help="Compile the instances again even if they are cached",
+                    default=False)
+
+# Instances already loaded by this process, by content hash
+_loaded = {}
+
+
+def content_hash(name):
+    digest = hashlib.sha256(f"isp-instance-v{FORMAT_VERSION}".encode())
+    with open(name, "rb") as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def cache_path(name, key, cache_dir=None):
+    cache_dir = cache_dir or os.environ.get("ISP_CACHE_DIR") or os.path.join(os.path.dirname(name), DEFAULT_CACHE_DIR)
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return os.path.join(cache_dir, f"{stem}-{key[:16]}.npz")
+
+
+def load_instance(name, cache_dir=None, use_cache=True):
+    # Instance of the JSON file name, read from the cache when the file has been compiled before. The cache file
+    # is keyed by the content of the instance file, so an edited instance is compiled again.
+    # An Instance object is returned as it is, so that the models can also be built from an instance in memory.
+    if isinstance(name, Instance):
+        return name
+    if not use_cache:
+        return Instance(name)
+
+    key = content_hash(name)
+    if key in _loaded:
+        return Instance.from_compiled(name, _loaded[key])
+
+    path = cache_path(name, key, cache_dir)
+    compiled = _read(path)
+    if compiled is None:
+        compiled = Instance(name).compile()
+        _write(path, compiled)
+    _loaded[key] = compiled
+    return Instance.from_compiled(name, compiled)
+
+
+def _read(path):
+    try:
+        with np.load(path, allow_pickle=False) as arrays:
+            return CompiledInstance.from_arrays({name: arrays[name] for name in arrays.files})
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        # Missing, truncated or outdated cache file
+        return None
+
+
+def _write(path, compiled):
+    # Written to a temporary file first, so that concurrent runs never read a partial cache file
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            np.savez(f, **compiled.to_arrays())
+        os.replace(temporary, path)
+    except OSError:
+        # The cache is only an optimization, a read-only directory just means compiling the instance every time
+        pass
+
+
+def warm(directory, cache_dir=None, force=False):
+    # Compiles every JSON instance of directory into the cache, returns the number of instances compiled
+    compiled = 0
+    for file in sorted(os.listdir(directory)):
+        if not file.endswith(".json"):
+            continue
+        name = os.path.join(directory, file)
+        path = cache_path(name, content_hash(name), cache_dir)
+        if not force and _read(path) is not None:
+            print(f"{name}: already cached")
+            continue
+        _write(path, Instance(name).compile())
+        compiled += 1
+        print(f"{name}: cached in {path}")
+    return compiled
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    warm(args.directory, args.cache_dir, args.force)
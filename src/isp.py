@@ -1,15 +1,47 @@
-from instance import Instance
+from instance_cache import load_instance
+from incremental import IncrementalModel
+from analysis import Analysis
+from profiling import Profiler
+from backends import get_backend
+from rules import as_rules
+from matrix import MatrixBuilder, csr_expand
+import heuristics
+import tuning
 import gurobipy as gp
-from gurobipy import GRB, quicksum
-import itertools
-
-
-class ISP:
-    def __init__(self, name, objective, operational_constraints: bool = False):
-        self.instance = Instance(name)
+from gurobipy import GRB
+import numpy as np
+
+
+class ISP(IncrementalModel):
+    def __init__(self, name, objective, operational_constraints: bool = False, names: bool = False,
+                 warm_start: bool = False, prune: bool = True, profile: bool = False, backend: str = "gurobi",
+                 formulation: str = "current", tuned: bool = True):
+        # profile=True records the time and memory of each build phase and family, and the solves (see profile())
+        # formulation is current, minimal or strengthened (see incremental.FORMULATIONS)
+        self.formulation = self._check_formulation(formulation)
+        self.profiler = Profiler(profile)
+        # The model is built with gurobipy whatever the backend, which solves it (gurobi, highs or cpsat, backends.py)
+        self.backend = get_backend(backend)
+        self.result = None
+        with self.profiler.phase("load_instance"):
+            self.instance = load_instance(name)
+            self.data = self.instance.compile()
+        self.operational_constraints = operational_constraints
+        # Rules of the operational constraints, the default ones for operational_constraints=True (rules.py)
+        self.rules = as_rules(operational_constraints)
+        self.rule_groups = {}
+
+        # Static analysis of the instance (analysis.py): the variables it shows are always 0 are fixed, and with OF2
+        # alone (prune=True) the sessions that can never be fully covered get no interpreter variables
+        with self.profiler.phase("analysis"):
+            self.analysis = Analysis(self.data)
+        self.pruned = self._pruned_sessions(objective, prune)
 
         self.model = gp.Model("SimpleISP")
         self.model.reset()
+        self.profiler.model = self.model
+        # Constraints are added one family at a time with the matrix API, names=True gives them readable names
+        self.builder = MatrixBuilder(self.model, names, self.profiler)
 
         self.x = None
         self.y = None
@@ -17,170 +49,189 @@ class ISP:
         self.t = None
 
         self.is_optimized = False
-        self._add_variables()
-        self._add_base_constraints()
+        with self.profiler.phase("_add_variables"):
+            self._add_variables()
+        with self.profiler.phase("_add_base_constraints"):
+            self._add_base_constraints()
+        if formulation == "strengthened":
+            with self.profiler.phase("_add_valid_inequalities"):
+                self._add_valid_inequalities()
         if operational_constraints:
-            self._add_operational_constraints()
+            with self.profiler.phase("_add_operational_constraints"):
+                self._add_operational_constraints()
 
-        self.model.update()
-        self._add_objective(objective)
-        self.model.update()
+        with self.profiler.phase("_add_objective"):
+            self.model.update()
+            # A list of objectives is optimized in lexicographic order, see IncrementalModel.set_lexicographic
+            self._add_objective(objective)
+            self._apply_analysis()
+            self.model.update()
 
         self.model._x = self.x
         self.model._y = self.y
         self.model._z = self.z
         self.model._t = self.t
 
+        # Changes applied later with the methods of IncrementalModel
+        self._init_changes()
+
         self.model.setParam("TimeLimit", 600)
+        # Gurobi parameters tuned for the class of the instance (tuning.py), tuned=False keeps the defaults
+        self.tuning = tuning.apply_profile(self) if tuned else None
+
+        # warm_start=True starts Gurobi from the greedy and local search solution of heuristics.py
+        if warm_start:
+            with self.profiler.phase("warm_start"):
+                self.set_start(heuristics.solve(self.data, self.objective, operational_constraints,
+                                                heuristics.WARM_START_TIME_LIMIT))
 
     def _add_variables(self):
         # === Variables ===
-        interpreters = self.instance.interpreters
-        sessions = self.instance.sessions
-
-        # x_i,s = 1 if interpreter i is assigned to session s, 0 otherwise
-        self.x = self.model.addVars(interpreters, sessions, vtype=GRB.BINARY, name="x")
-
-        # y_i,l1,l2 = 1 if the pair (l1, l2) is covered in session s, 0 otherwise
-        self.y = self.model.addVars(
-            [
-                (s, l1, l2)
-                for s in sessions
-                for l1, l2 in itertools.combinations(self.instance.languages_per_session[s], 2)
-            ],
-            vtype=GRB.BINARY, name="y"
-        )
-
-        # z_i,s,l1,l2 = 1 if interpreter i covers the pair (l1, l2) in session s, 0 otherwise
-        self.z = self.model.addVars(
-            [
-                (i, s, l1, l2)
-                for i in interpreters
-                for s in sessions
-                for l1, l2 in itertools.combinations(self.instance.languages_per_interpreter[i], 2)
-                if l1 in self.instance.languages_per_session[s] and l2 in self.instance.languages_per_session[s]
-            ],
-            vtype=GRB.BINARY, name="z"
-        )
+        # Interpreters, sessions, blocks and languages are referred to by their integer id in self.data, and a
+        # language pair (l1, l2) by its pair id p. Each family is a VariableFamily: its keys are index arrays
+        data = self.data
+        n_interpreters, n_sessions = data.n_interpreters, data.n_sessions
+
+        # x_i,s = 1 if interpreter i is assigned to session s, 0 otherwise (column i * n_sessions + s of the family)
+        x_i, x_s = np.divmod(np.arange(n_interpreters * n_sessions), n_sessions)
+        self.x = self.builder.add_variables("x", (x_i, x_s), GRB.BINARY)
+
+        # y_s,p = 1 if the pair p = (l1, l2) is covered in session s, 0 otherwise (in the order of the CSR arrays)
+        y_s = np.repeat(np.arange(n_sessions), np.diff(data.session_pair_ptr))
+        y_p = data.session_pair_indices
+        self.y = self.builder.add_variables("y", (y_s, y_p), GRB.BINARY)
+
+        # z_i,s,p = 1 if interpreter i covers the pair p = (l1, l2) in session s, 0 otherwise
+        # z_pair[k] is the y variable that the k-th z variable covers
+        self.z_pair, z_i = csr_expand(data.pair_interpreter_ptr, data.pair_interpreter_indices, y_p)
+        # Pruned sessions do not count in OF2 whatever their interpreters do
+        kept = ~self.pruned[y_s[self.z_pair]]
+        self.z_pair, z_i = self.z_pair[kept], z_i[kept]
+        self.z = self.builder.add_variables("z", (z_i, y_s[self.z_pair], y_p[self.z_pair]), GRB.BINARY)
 
         # t[s] = 1 if all pairs are covered in session s, 0 otherwise
-        self.t = self.model.addVars(sessions, vtype=GRB.BINARY, name="t")
+        self.t = self.builder.add_variables("t", (np.arange(n_sessions),), GRB.BINARY)
+
+    def _x_columns(self, i, s):
+        return self.x.start + i * self.data.n_sessions + s
 
     def _add_base_constraints(self):
 
         # === Constraints ===
-        blocks = self.instance.blocks
-        interpreters = self.instance.interpreters
-        sessions = self.instance.sessions
+        data = self.data
+        n_interpreters, n_sessions = data.n_interpreters, data.n_sessions
+        x_i, x_s = self.x.keys_array
+        y_s, y_p = self.y.keys_array
+        z_i, z_s, z_p = self.z.keys_array
+        n_y, n_z = len(self.y), len(self.z)
+        y_rows = np.arange(n_y)
 
         # 1: An interpreter can only be assigned to one session in a block
-        for b in blocks:
-            for i in interpreters:
-                self.model.addConstr(quicksum(self.x[i, s] for s in self.instance.sessions_per_block[b]) <= 1,
-                                name=f"one_session_per_interpreter_{i}_{b}")
+        self.builder.add_constraints(
+            "one_session_per_interpreter", data.n_blocks * n_interpreters,
+            data.session_block[x_s] * n_interpreters + x_i, self.x.columns, 1.0, GRB.LESS_EQUAL, 1.0,
+            lambda k: f"one_session_per_interpreter_{k % n_interpreters}_{k // n_interpreters}"
+        )
 
         # 2: In a given session, translation l1 to l2 can only be covered if an interpreter that speaks both
-        # languages is assigned
-        for s in sessions:
-            languages = self.instance.languages_per_session[s]
-            for l1, l2 in itertools.combinations(languages, 2):
-                eligible_interpreters = [i for i in interpreters if l1 in self.instance.languages_per_interpreter[i] and
-                                         l2 in self.instance.languages_per_interpreter[i]]
-                self.model.addConstr(
-                    quicksum(self.x[i, s] for i in eligible_interpreters) >= self.y[s, l1, l2],
-                    name=f"cover_pair_{s}_{l1}_{l2}"
-                )
+        # languages is assigned (implied by 3 and 4, left out of the minimal formulation)
+        if self.formulation != "minimal":
+            self.builder.add_constraints(
+                "cover_pair", n_y,
+                np.concatenate([self.z_pair, y_rows]),
+                np.concatenate([self._x_columns(z_i, z_s), self.y.columns]),
+                np.concatenate([np.ones(n_z), -np.ones(n_y)]), GRB.GREATER_EQUAL, 0.0,
+                lambda k: f"cover_pair_{y_s[k]}_{y_p[k]}"
+            )
 
         # 3: A given interpreter can only cover one translation pair in a session
-        for i in interpreters:
-            for s in sessions:
-                self.model.addConstr(
-                    quicksum(self.z[i, s, l1, l2] for (i2, s2, l1, l2) in self.z if i2 == i and s2 == s) <= self.x[i, s],
-                    name=f"one_translation_per_session_{i}_{s}"
-                )
+        self.builder.add_constraints(
+            "one_translation_per_session", n_interpreters * n_sessions,
+            np.concatenate([z_i * n_sessions + z_s, np.arange(n_interpreters * n_sessions)]),
+            np.concatenate([self.z.columns, self.x.columns]),
+            np.concatenate([np.ones(n_z), -np.ones(len(self.x))]), GRB.LESS_EQUAL, 0.0,
+            lambda k: f"one_translation_per_session_{k // n_sessions}_{k % n_sessions}"
+        )
 
         # 4: A language pair is considered covered if at least one interpreter is actively assigned to interpret it
-        for s in sessions:
-            languages = self.instance.languages_per_session[s]
-            language_pairs = list(itertools.combinations(languages, 2))
-            for l1, l2 in language_pairs:
-                self.model.addConstr(
-                    self.y[s, l1, l2] <= quicksum(self.z[i, s, l1, l2] for i in interpreters if (i, s, l1, l2) in self.z),
-                    name=f"y_impl_z_{s}_{l1}_{l2}"
-                )
+        self.builder.add_constraints(
+            "y_impl_z", n_y,
+            np.concatenate([y_rows, self.z_pair]),
+            np.concatenate([self.y.columns, self.z.columns]),
+            np.concatenate([np.ones(n_y), -np.ones(n_z)]), GRB.LESS_EQUAL, 0.0,
+            lambda k: f"y_impl_z_{y_s[k]}_{y_p[k]}"
+        )
 
         # 5: A session can only be considered fully covered if all language pairs used in the session are covered
-        for s in sessions:
-            languages = self.instance.languages_per_session[s]
-            language_pairs = list(itertools.combinations(languages, 2))
-            for l1, l2 in language_pairs:
-                self.model.addConstr(self.t[s] <= self.y[s, l1, l2], name=f"t_impl_y_{s}_{l1}_{l2}")
+        # (one row per session in the minimal formulation)
+        if self.formulation == "minimal":
+            self._add_session_cover_rows("t_impl_all_y")
+        else:
+            self.builder.add_constraints(
+                "t_impl_y", n_y,
+                np.concatenate([y_rows, y_rows]),
+                np.concatenate([self.t.start + y_s, self.y.columns]),
+                np.concatenate([np.ones(n_y), -np.ones(n_y)]), GRB.LESS_EQUAL, 0.0,
+                lambda k: f"t_impl_y_{y_s[k]}_{y_p[k]}"
+            )
 
 
     def _add_operational_constraints(self):
         # === Additional Constraints ===
         # 6: An interpreter can only be assigned to a maximum of 15 sessions
-        interpreters = self.instance.interpreters
-        sessions = self.instance.sessions
-        blocks = self.instance.blocks
-        for i in interpreters:
-            self.model.addConstr(quicksum(self.x[i, s] for s in sessions) <= 15, name=f"max_sessions_per_interpreter_{i}")
-
         # 7: An interpreter can only be assigned to a maximum of 3 consecutive blocks
-        for i in interpreters:
-            for k in range(len(blocks) - 3):
-                group = blocks[k:k + 4]
-                sessions_in_group = sum((self.instance.sessions_per_block[b] for b in group), [])
-                self.model.addConstr(
-                    quicksum(self.x[i, s] for s in sessions_in_group) <= 3,
-                    name=f"max_3_consecutive_blocks_{i}_from_{group[0]}"
-                )
-
-    def _add_objective(self, objective):
-        sessions = self.instance.sessions
-        if objective == "OF1":
-            self.model.setObjective(gp.quicksum(self.y[s, l1, l2] for (s, l1, l2) in self.y.keys()), GRB.MAXIMIZE)
-        elif objective == "OF2":
-            self.model.setObjective(quicksum(self.t[s] for s in sessions), GRB.MAXIMIZE)
-        else:
-            raise ValueError("Objective function must be either 'OF1' or 'OF2', got: " + objective)
+        # These are the default rules, any other ones are given as Rules (rules.py). Each rule family is added in bulk
+        # from a prefix index of x over the blocks
+        self.rule_groups = self.rules.add_constraints(self.builder, self.x, self.data)
 
     def optimize(self):
-        self.model.optimize()
+        self.result = self.backend.solve(self.model, self.profiler)
+        self.builder.set_solution(self.result.x)
         self.is_optimized = True
 
+    def profile(self):
+        # Build phases, families and solves recorded with profile=True
+        return self.profiler.report(self.builder)
+
     def print_results(self):
         if not self.is_optimized:
             print("Model has not been optimized yet. Call optimize() first.")
             return
 
-        z = self.model._z
-        self.model.printAttr("X")
+        self._print_values()
 
         print("\n--- Result ---")
-        if self.model.status == GRB.OPTIMAL or self.model.status == GRB.TIME_LIMIT:
-            print(f"Objective value: {self.model.ObjVal}")
-            for i, s, l1, l2 in z:
-                if z[i, s, l1, l2].X > 0.5:
-                    print(f"{i} assigned to {s} covers pair ({l1}, {l2})")
+        if self.result.status == GRB.OPTIMAL or self.result.status == GRB.TIME_LIMIT:
+            print(f"Objective value: {self.result.objective}")
+            for i, s, l1, l2 in self.assignments():
+                print(f"{i} assigned to {s} covers pair ({l1}, {l2})")
+
+    def assignments(self):
+        # Names (interpreter, session, l1, l2) of the pairs covered directly in the solution
+        data = self.data
+        selected = self.z.X > 0.5
+        return [
+            (data.interpreters[i], data.sessions[s], *data.pair_names(p))
+            for i, s, p in zip(*(k[selected].tolist() for k in self.z.keys_array))
+        ]
 
     @property
     def runtime(self):
         if not self.is_optimized:
             print("Model has not been optimized yet. Call optimize() first.")
             return None
-        return self.model.Runtime
+        return self.result.runtime
 
     @property
     def mip_gap(self):
         if not self.is_optimized:
             print("Model has not been optimized yet. Call optimize() first.")
             return None
-        return self.model.MIPGap
+        return self.result.mip_gap
 
     @property
     def objective_value(self):
         if not self.is_optimized:
             print("Model has not been optimized yet. Call optimize() first.")
             return None
-        return self.model.ObjVal
+        return self.result.objective
@@ -0,0 +1,306 @@
+from instance_cache import load_instance
+from matrix import MatrixBuilder, csr_expand
+from rules import as_rules
+import heuristics
+import gurobipy as gp
+from gurobipy import GRB
+import numpy as np
+
+
+class ISPAggregated:
+    # ISP with the interpreters speaking exactly the same languages grouped into classes (see
+    # CompiledInstance.interpreter_classes), as the members of a class are interchangeable.
+    # z[c, s, p] is the number of members of class c covering the pair p in session s. Without operational
+    # constraints, x[c, s] is the number of members of class c assigned to session s. Constraints 6 and 7 are per
+    # interpreter: with them, x[i, s] stays per interpreter, and the members of a class are ordered by decreasing
+    # number of sessions to break the symmetry between them. split() turns the solution back into assignments of
+    # individual interpreters.
+
+    def __init__(self, name, objective, operational_constraints: bool = False, names: bool = False,
+                 warm_start: bool = False):
+        self.instance = load_instance(name)
+        self.data = self.instance.compile()
+        self.objective = objective
+        self.operational_constraints = operational_constraints
+        self.rules = as_rules(operational_constraints)
+
+        self.class_of, self.class_ptr, self.class_members = self.data.interpreter_classes()
+        self.n_classes = len(self.class_ptr) - 1
+        self.class_size = np.diff(self.class_ptr)
+
+        # x is indexed by unit: the classes, or the interpreters with operational constraints
+        if operational_constraints:
+            self.n_units = self.data.n_interpreters
+            self.unit_class = self.class_of
+            self.unit_capacity = np.ones(self.n_units)
+        else:
+            self.n_units = self.n_classes
+            self.unit_class = np.arange(self.n_classes)
+            self.unit_capacity = self.class_size.astype(float)
+
+        self.model = gp.Model("AggregatedISP")
+        self.model.reset()
+        # Constraints are added one family at a time with the matrix API, names=True gives them readable names
+        self.builder = MatrixBuilder(self.model, names)
+
+        self.x = None
+        self.y = None
+        self.z = None
+        self.t = None
+
+        self.is_optimized = False
+        self._split = None
+        self._add_variables()
+        self._add_base_constraints()
+        if operational_constraints:
+            self._add_operational_constraints()
+
+        self.model.update()
+        self._add_objective(objective)
+        self.model.update()
+
+        self.model.setParam("TimeLimit", 600)
+
+        # warm_start=True starts Gurobi from the greedy and local search solution of heuristics.py
+        if warm_start:
+            self.set_start(heuristics.solve(self.data, objective, operational_constraints,
+                                            heuristics.WARM_START_TIME_LIMIT))
+
+    def _pair_classes(self):
+        # Classes eligible for each pair (their members speak both languages), as CSR arrays
+        data = self.data
+        speaks = data.language_matrix[self.class_members[self.class_ptr[:-1]]]
+        l1, l2 = data.pair_languages[:, 0], data.pair_languages[:, 1]
+        pairs, classes = np.nonzero((speaks[:, l1] & speaks[:, l2]).T)
+        ptr = np.zeros(data.n_pairs + 1, dtype=np.int64)
+        ptr[1:] = np.cumsum(np.bincount(pairs, minlength=data.n_pairs))
+        return ptr, classes
+
+    def _add_variables(self):
+        # === Variables ===
+        data = self.data
+        n_sessions = data.n_sessions
+
+        # x_u,s = number of members of class u (or 1 if interpreter u) assigned to session s
+        # (column u * n_sessions + s of the family)
+        x_u, x_s = np.divmod(np.arange(self.n_units * n_sessions), n_sessions)
+        if self.operational_constraints:
+            self.x = self.builder.add_variables("x", (x_u, x_s), GRB.BINARY)
+        else:
+            self.x = self.builder.add_variables("x", (x_u, x_s), GRB.INTEGER, ub=self.unit_capacity[x_u])
+
+        # y_s,p = 1 if the pair p = (l1, l2) is covered in session s, 0 otherwise (in the order of the CSR arrays)
+        y_s = np.repeat(np.arange(n_sessions), np.diff(data.session_pair_ptr))
+        y_p = data.session_pair_indices
+        self.y = self.builder.add_variables("y", (y_s, y_p), GRB.BINARY)
+
+        # z_c,s,p = number of members of class c covering the pair p = (l1, l2) in session s
+        # z_pair[k] is the y variable that the k-th z variable covers
+        self.class_pair_ptr, self.class_pair_indices = self._pair_classes()
+        self.z_pair, z_c = csr_expand(self.class_pair_ptr, self.class_pair_indices, y_p)
+        self.z = self.builder.add_variables("z", (z_c, y_s[self.z_pair], y_p[self.z_pair]), GRB.INTEGER,
+                                            ub=self.class_size[z_c].astype(float))
+
+        # t[s] = 1 if all pairs are covered in session s, 0 otherwise
+        self.t = self.builder.add_variables("t", (np.arange(n_sessions),), GRB.BINARY)
+
+    def _x_columns(self, u, s):
+        return self.x.start + u * self.data.n_sessions + s
+
+    def _add_base_constraints(self):
+        # === Constraints ===
+        data = self.data
+        n_sessions, n_units = data.n_sessions, self.n_units
+        x_u, x_s = self.x.keys_array
+        y_s, y_p = self.y.keys_array
+        z_c, z_s, z_p = self.z.keys_array
+        n_y, n_z = len(self.y), len(self.z)
+        y_rows = np.arange(n_y)
+
+        # 1: An interpreter can only be assigned to one session in a block (each member of a class)
+        self.builder.add_constraints(
+            "one_session_per_interpreter", data.n_blocks * n_units,
+            data.session_block[x_s] * n_units + x_u, self.x.columns, 1.0, GRB.LESS_EQUAL,
+            np.tile(self.unit_capacity, data.n_blocks),
+            lambda k: f"one_session_per_interpreter_{k % n_units}_{k // n_units}"
+        )
+
+        # 2: In a given session, translation l1 to l2 can only be covered if an interpreter that speaks both
+        # languages is assigned
+        if self.operational_constraints:
+            unit_pair, unit = csr_expand(data.pair_interpreter_ptr, data.pair_interpreter_indices, y_p)
+        else:
+            unit_pair, unit = self.z_pair, z_c
+        self.builder.add_constraints(
+            "cover_pair", n_y,
+            np.concatenate([unit_pair, y_rows]),
+            np.concatenate([self._x_columns(unit, y_s[unit_pair]), self.y.columns]),
+            np.concatenate([np.ones(len(unit)), -np.ones(n_y)]), GRB.GREATER_EQUAL, 0.0,
+            lambda k: f"cover_pair_{y_s[k]}_{y_p[k]}"
+        )
+
+        # 3: A given interpreter can only cover one translation pair in a session: the members of class c cover at
+        # most as many pairs as there are members assigned
+        self.builder.add_constraints(
+            "one_translation_per_session", self.n_classes * n_sessions,
+            np.concatenate([z_c * n_sessions + z_s, self.unit_class[x_u] * n_sessions + x_s]),
+            np.concatenate([self.z.columns, self.x.columns]),
+            np.concatenate([np.ones(n_z), -np.ones(len(self.x))]), GRB.LESS_EQUAL, 0.0,
+            lambda k: f"one_translation_per_session_{k // n_sessions}_{k % n_sessions}"
+        )
+
+        # 4: A language pair is considered covered if at least one interpreter is actively assigned to interpret it
+        self.builder.add_constraints(
+            "y_impl_z", n_y,
+            np.concatenate([y_rows, self.z_pair]),
+            np.concatenate([self.y.columns, self.z.columns]),
+            np.concatenate([np.ones(n_y), -np.ones(n_z)]), GRB.LESS_EQUAL, 0.0,
+            lambda k: f"y_impl_z_{y_s[k]}_{y_p[k]}"
+        )
+
+        # 5: A session can only be considered fully covered if all language pairs used in the session are covered
+        self.builder.add_constraints(
+            "t_impl_y", n_y,
+            np.concatenate([y_rows, y_rows]),
+            np.concatenate([self.t.start + y_s, self.y.columns]),
+            np.concatenate([np.ones(n_y), -np.ones(n_y)]), GRB.LESS_EQUAL, 0.0,
+            lambda k: f"t_impl_y_{y_s[k]}_{y_p[k]}"
+        )
+
+    def _add_operational_constraints(self):
+        # === Additional Constraints ===
+        # 6: An interpreter can only be assigned to a maximum of 15 sessions
+        # 7: An interpreter can only be assigned to a maximum of 3 consecutive blocks
+        # These are the default rules, any other ones are given as Rules (rules.py)
+        data = self.data
+        n_sessions = data.n_sessions
+        self.rules.add_constraints(self.builder, self.x, data)
+
+        # Symmetry breaking: within a class, each member has at least as many sessions as the next one. Members are
+        # only interchangeable if the rules are the same for all interpreters
+        if any("interpreters" in rule for rule in self.rules.rules):
+            return
+        last = np.zeros(data.n_interpreters, dtype=bool)
+        last[self.class_ptr[1:] - 1] = True
+        first = self.class_members[~last]
+        second = self.class_members[np.flatnonzero(~last) + 1]
+        n_rows = len(first)
+        rows = np.repeat(np.arange(n_rows), n_sessions)
+        sessions = np.tile(np.arange(n_sessions), n_rows)
+        self.builder.add_constraints(
+            "class_order", n_rows,
+            np.concatenate([rows, rows]),
+            np.concatenate([self._x_columns(np.repeat(first, n_sessions), sessions),
+                            self._x_columns(np.repeat(second, n_sessions), sessions)]),
+            np.concatenate([np.ones(len(rows)), -np.ones(len(rows))]), GRB.GREATER_EQUAL, 0.0,
+            lambda k: f"class_order_{first[k]}_{second[k]}"
+        )
+
+    def _add_objective(self, objective):
+        if objective == "OF1":
+            self.model.setObjective(self.y.mvar.sum(), GRB.MAXIMIZE)
+        elif objective == "OF2":
+            self.model.setObjective(self.t.mvar.sum(), GRB.MAXIMIZE)
+        else:
+            raise ValueError("Objective function must be either 'OF1' or 'OF2', got: " + objective)
+
+    def set_start(self, z):
+        # MIP start from the direct assignments z, rows (i, s, p): interpreter i covers the pair p in session s
+        data = self.data
+        z = np.asarray(z, dtype=np.int64).reshape(-1, 3)
+        i, s, p = z[:, 0], z[:, 1], z[:, 2]
+        if self.operational_constraints:
+            # Members of a class are renumbered by decreasing number of sessions, as required by class_order
+            sessions = np.unique(z[:, :2], axis=0)
+            load = np.bincount(sessions[:, 0], minlength=data.n_interpreters)
+            renumber = np.arange(data.n_interpreters)
+            for c in range(self.n_classes):
+                members = self.class_members[self.class_ptr[c]:self.class_ptr[c + 1]]
+                renumber[members[np.argsort(-load[members], kind="stable")]] = members
+            i = renumber[i]
+
+        start = {name: np.zeros(len(family)) for name, family in self.builder.families.items()}
+        # Distinct (interpreter, session) assignments, counted per class without operational constraints
+        assigned = np.unique(np.stack([i, s], axis=1), axis=0)
+        units = assigned[:, 0] if self.operational_constraints else self.class_of[assigned[:, 0]]
+        np.add.at(start["x"], self.x.positions((units, assigned[:, 1])), 1.0)
+        np.add.at(start["z"], self.z.positions((self.class_of[i], s, p)), 1.0)
+        start["y"][self.y.positions((s, p))] = 1.0
+        # A session is fully covered when all its pairs are (a session without pairs always is)
+        n_pairs = np.diff(data.session_pair_ptr)
+        n_covered = np.add.reduceat(np.append(start["y"], 0.0), data.session_pair_ptr[:-1])
+        start["t"][np.where(n_pairs > 0, n_covered, 0) == n_pairs] = 1.0
+        for name, values in start.items():
+            if len(values):
+                self.builder.families[name].set("Start", values)
+
+    def optimize(self):
+        self.model.optimize()
+        self._split = None
+        self.is_optimized = True
+
+    def split(self):
+        # Assignments (i, s, p) of individual interpreters: in each session, the members of class c assigned to it
+        # cover its z[c, s, p] pairs, one pair each
+        if self._split is not None:
+            return self._split
+        data = self.data
+        x = np.round(self.x.X).astype(np.int64)
+        x_u, x_s = (k[x > 0].tolist() for k in self.x.keys_array)
+        assigned = {}
+        if self.operational_constraints:
+            for i, s in zip(x_u, x_s):
+                assigned.setdefault((int(self.class_of[i]), s), []).append(i)
+        else:
+            # The members of a class are handed out block by block, constraint 1 leaves enough of them
+            handed_out = {}
+            for c, s, count in zip(x_u, x_s, x[x > 0].tolist()):
+                b = int(data.session_block[s])
+                k = self.class_ptr[c] + handed_out.get((c, b), 0)
+                assigned[c, s] = self.class_members[k:k + count].tolist()
+                handed_out[c, b] = handed_out.get((c, b), 0) + count
+
+        z = np.round(self.z.X).astype(np.int64)
+        rows = []
+        for c, s, p, count in zip(*(k[z > 0].tolist() for k in self.z.keys_array), z[z > 0].tolist()):
+            members = assigned[c, s]
+            rows.extend((members.pop(), s, p) for _ in range(count))
+        self._split = np.array(rows, dtype=np.int64).reshape(-1, 3)
+        return self._split
+
+    def print_results(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return
+
+        print("\n--- Result ---")
+        if self.model.status == GRB.OPTIMAL or self.model.status == GRB.TIME_LIMIT:
+            print(f"Objective value: {self.model.ObjVal}")
+            for i, s, l1, l2 in self.assignments():
+                print(f"{i} assigned to {s} covers pair ({l1}, {l2})")
+
+    def assignments(self):
+        # Names (interpreter, session, l1, l2) of the pairs covered directly in the solution
+        data = self.data
+        return [(data.interpreters[i], data.sessions[s], *data.pair_names(p)) for i, s, p in self.split().tolist()]
+
+    @property
+    def runtime(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return None
+        return self.model.Runtime
+
+    @property
+    def mip_gap(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return None
+        return self.model.MIPGap
+
+    @property
+    def objective_value(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return None
+        return self.model.ObjVal
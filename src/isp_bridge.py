@@ -1,16 +1,52 @@
-from instance import Instance
+from instance_cache import load_instance
+from incremental import IncrementalModel
+from analysis import Analysis
+from profiling import Profiler
+from backends import get_backend
+from rules import as_rules
+from matrix import MatrixBuilder, concatenate_keys, csr_expand
+import heuristics
+import tuning
 import gurobipy as gp
-from gurobipy import GRB, quicksum
-import itertools
-
-class ISPBridge:
-    def __init__(self, name, objective, operational_constraints: bool = False):
-        self.instance = Instance(name)
+from gurobipy import GRB
+import numpy as np
+
+class ISPBridge(IncrementalModel):
+    # Families edited by the changes of IncrementalModel: relays take part in constraint 3, and OF1 counts u
+    SLOT_ROWS = "one_translation_or_bridge_per_session"
+    T_ROWS = "t_impl_u"
+    COVER = "u"
+    COVER_ROWS = "u_impl_y_and_w"
+
+    def __init__(self, name, objective, operational_constraints: bool = False, names: bool = False,
+                 warm_start: bool = False, prune: bool = True, profile: bool = False, backend: str = "gurobi",
+                 formulation: str = "current", tuned: bool = True):
+        # profile=True records the time and memory of each build phase and family, and the solves (see profile())
+        # formulation is current, minimal or strengthened (see incremental.FORMULATIONS)
+        self.formulation = self._check_formulation(formulation)
+        self.profiler = Profiler(profile)
+        # The model is built with gurobipy whatever the backend, which solves it (gurobi, highs or cpsat, backends.py)
+        self.backend = get_backend(backend)
+        self.result = None
+        with self.profiler.phase("load_instance"):
+            self.instance = load_instance(name)
+            self.data = self.instance.compile()
+        self.operational_constraints = operational_constraints
+        # Rules of the operational constraints, the default ones for operational_constraints=True (rules.py)
+        self.rules = as_rules(operational_constraints)
+        self.rule_groups = {}
+
+        # Static analysis of the instance (analysis.py): the variables it shows are always 0 are fixed, and with OF2
+        # alone (prune=True) the sessions that can never be fully covered get no interpreter variables
+        with self.profiler.phase("analysis"):
+            self.analysis = Analysis(self.data, bridging=True)
+        self.pruned = self._pruned_sessions(objective, prune)
 
         self.model = gp.Model("BridgeISP")
         self.model.reset()
-
-        self.objective = objective
+        self.profiler.model = self.model
+        # Constraints are added one family at a time with the matrix API, names=True gives them readable names
+        self.builder = MatrixBuilder(self.model, names, self.profiler)
 
         self.x = None
         self.y = None
@@ -20,14 +56,23 @@ class ISPBridge:
         self.u = None
 
         self.is_optimized = False
-        self._add_variables()
-        self._add_base_constraints()
+        with self.profiler.phase("_add_variables"):
+            self._add_variables()
+        with self.profiler.phase("_add_base_constraints"):
+            self._add_base_constraints()
+        if formulation == "strengthened":
+            with self.profiler.phase("_add_valid_inequalities"):
+                self._add_valid_inequalities()
         if operational_constraints:
-            self._add_operational_constraints()
+            with self.profiler.phase("_add_operational_constraints"):
+                self._add_operational_constraints()
 
-        self.model.update()
-        self._add_objective()
-        self.model.update()
+        with self.profiler.phase("_add_objective"):
+            self.model.update()
+            # A list of objectives is optimized in lexicographic order, see IncrementalModel.set_lexicographic
+            self._add_objective(objective)
+            self._apply_analysis()
+            self.model.update()
 
         self.model._x = self.x
         self.model._y = self.y
@@ -36,230 +81,281 @@ class ISPBridge:
         self.model._w = self.w
         self.model._u = self.u
 
+        # Changes applied later with the methods of IncrementalModel
+        self._init_changes()
+
         self.model.setParam("TimeLimit", 600)
+        # Gurobi parameters tuned for the class of the instance (tuning.py), tuned=False keeps the defaults
+        self.tuning = tuning.apply_profile(self) if tuned else None
+
+        # warm_start=True starts Gurobi from the greedy and local search solution of heuristics.py, without bridges
+        if warm_start:
+            with self.profiler.phase("warm_start"):
+                self.set_start(heuristics.solve(self.data, self.objective, operational_constraints,
+                                                heuristics.WARM_START_TIME_LIMIT))
 
     def _add_variables(self):
         # === Variables ===
-        interpreters = self.instance.interpreters
-        sessions = self.instance.sessions
-
-        # x_i,s = 1 if interpreter i is assigned to session s, 0 otherwise
-        self.x = self.model.addVars(interpreters, sessions, vtype=GRB.BINARY, name="x")
-
-        # y_i,l1,l2 = 1 if the pair (l1, l2) is covered directly in session s, 0 otherwise
-        self.y = self.model.addVars(
-            [
-                (s, l1, l2)
-                for s in sessions
-                for l1, l2 in itertools.combinations(self.instance.languages_per_session[s], 2)
-            ],
-            vtype=GRB.BINARY, name="y"
-        )
-
-        # z_i,s,l1,l2 = 1 if interpreter i covers the pair (l1, l2) in session s, 0 otherwise
-        # Here, the languages are not restricted to the session languages
-        self.z = self.model.addVars(
-            [
-                (i, s, l1, l2)
-                for i in interpreters
-                for s in sessions
-                for l1, l2 in itertools.combinations(self.instance.languages_per_interpreter[i], 2)
-                if l1 in self.instance.languages_per_session[s] and l2 in self.instance.languages_per_session[s]
-            ],
-            vtype=GRB.BINARY, name="z"
-        )
+        # Interpreters, sessions, blocks and languages are referred to by their integer id in self.data, and a
+        # language pair (l1, l2) by its pair id p. Each family is a VariableFamily: its keys are index arrays
+        data = self.data
+        n_interpreters, n_sessions = data.n_interpreters, data.n_sessions
+
+        # x_i,s = 1 if interpreter i is assigned to session s, 0 otherwise (column i * n_sessions + s of the family)
+        x_i, x_s = np.divmod(np.arange(n_interpreters * n_sessions), n_sessions)
+        self.x = self.builder.add_variables("x", (x_i, x_s), GRB.BINARY)
+
+        # y_s,p = 1 if the pair p = (l1, l2) is covered directly in session s, 0 otherwise
+        y_s = np.repeat(np.arange(n_sessions), np.diff(data.session_pair_ptr))
+        y_p = data.session_pair_indices
+        self.y = self.builder.add_variables("y", (y_s, y_p), GRB.BINARY)
+
+        # z_i,s,p = 1 if interpreter i covers the pair p = (l1, l2) in session s, 0 otherwise
+        # z_pair[k] is the y variable that the k-th z variable covers
+        self.z_pair, z_i = csr_expand(data.pair_interpreter_ptr, data.pair_interpreter_indices, y_p)
+        # Pruned sessions do not count in OF2 whatever their interpreters do
+        kept = ~self.pruned[y_s[self.z_pair]]
+        self.z_pair, z_i = self.z_pair[kept], z_i[kept]
+        self.z = self.builder.add_variables("z", (z_i, y_s[self.z_pair], y_p[self.z_pair]), GRB.BINARY)
 
         # t[s] = 1 if all pairs are covered in session s, 0 otherwise
-        self.t = self.model.addVars(sessions, vtype=GRB.BINARY, name="t")
-
-        # w[i1, i2, s, l1, l2, l_prime] = 1 if i1 and i2 are assigned to session s to cover the pair (l1, l2) via
+        self.t = self.builder.add_variables("t", (np.arange(n_sessions),), GRB.BINARY)
+
+        # u[s, p] = 1 if the pair p = (l1, l2) is covered in session s (directly or via bridge), 0 otherwise
+        # u has the same keys as y
+        self.u = self.builder.add_variables("u", (y_s, y_p), GRB.BINARY)
+
+        # Relay variables, described by two pairs of arrays:
+        # relay_slots: (i * n_sessions + s, column) for each interpreter i a relay variable occupies in session s
+        # relay_cover: (y variable, column) for the pair each relay variable covers, used by constraint 8
+        self.relay_slots, self.relay_cover = self._add_relay_variables(self._pair_templates())
+
+    def _pair_templates(self, entries=None):
+        # Yields, for each language pair p used by a session, (p, l1, l2, entries), entries being the y variables
+        # of p. The relay variables of a pair do not depend on the session, they are enumerated once per pair and
+        # repeated over its sessions. Given entries, only the pairs of these y variables are yielded
+        data = self.data
+        if entries is not None:
+            entries = np.asarray(entries, dtype=np.int64)
+            y_p = self.y.keys_array[1][entries]
+            for p in np.unique(y_p).tolist():
+                l1, l2 = data.pair_languages[p].tolist()
+                yield p, l1, l2, entries[y_p == p]
+            return
+        y_s = self.y.keys_array[0]
+        for p in np.flatnonzero(np.diff(data.pair_session_ptr)).tolist():
+            l1, l2 = data.pair_languages[p].tolist()
+            entries = data.pair_session_entries[data.pair_session_ptr[p]:data.pair_session_ptr[p + 1]]
+            # Pruned sessions get no relays, like they get no z variables
+            entries = entries[~self.pruned[y_s[entries]]]
+            if len(entries):
+                yield p, l1, l2, entries
+
+    def _add_relay_variables(self, templates):
+        # Adds the relay variables of the pairs of templates (see _pair_templates), returns their relay_slots and
+        # relay_cover arrays
+        data = self.data
+        n_before = len(self.builder.families.get("w", ()))
+        speaks = data.language_matrix
+        y_s = self.y.keys_array[0]
+
+        # w[i1, i2, s, p, l_prime] = 1 if i1 and i2 are assigned to session s to cover the pair p = (l1, l2) via
         # a bridge language l_prime, 0 otherwise
-        self.w = self.model.addVars(
-            [
-                (i1, i2, s, l1, l2, l_prime)
-                for i1, i2 in itertools.combinations(interpreters, 2)
-                for s in sessions
-                for l1, l2 in itertools.combinations(self.instance.languages_per_session[s], 2)
-                for l_prime in set(self.instance.languages_per_interpreter[i1]).intersection(self.instance.languages_per_interpreter[i2])
-                if l_prime not in (l1, l2) and (l1 in self.instance.languages_per_interpreter[i1]
-                                                and l2 in self.instance.languages_per_interpreter[i2])
-            ],
-            vtype=GRB.BINARY, name="w"
-        )
-
-        # u[s, l1, l2] = 1 if the pair (l1, l2) is covered in session s (directly or via bridge), 0 otherwise
-        self.u = self.model.addVars(
-            [
-                (s, l1, l2)
-                for s in sessions
-                for l1, l2 in itertools.combinations(self.instance.languages_per_session[s], 2)
-            ],
-            vtype=GRB.BINARY, name="u"
-        )
+        # Either interpreter of the pair can take the l1 side of the relay
+        keys, cover = [], []
+        for p, l1, l2, entries in templates:
+            for l_prime in range(data.n_languages):
+                if l_prime in (l1, l2):
+                    continue
+                first_half = speaks[:, l1] & speaks[:, l_prime]
+                second_half = speaks[:, l2] & speaks[:, l_prime]
+                i1, i2 = np.nonzero(np.triu(np.outer(first_half, second_half) | np.outer(second_half, first_half), 1))
+                if not len(i1):
+                    continue
+                n = len(i1)
+                keys.append((np.tile(i1, len(entries)), np.tile(i2, len(entries)), np.repeat(y_s[entries], n),
+                             np.full(n * len(entries), p), np.full(n * len(entries), l_prime)))
+                cover.append((np.repeat(entries, n),))
+        self.w = self.builder.add_variables("w", concatenate_keys(keys, 5), GRB.BINARY)
+
+        w_i1, w_i2, w_s = (k[n_before:] for k in self.w.keys_array[:3])
+        columns = self.w.columns[n_before:]
+        return ((np.concatenate([w_i1 * data.n_sessions + w_s, w_i2 * data.n_sessions + w_s]),
+                 np.concatenate([columns, columns])),
+                (concatenate_keys(cover, 1)[0], columns))
+
+    def _add_pair_relays(self, entries):
+        # Relay variables of the y variables entries added by IncrementalModel.add_session and
+        # update_session_languages, returns their relay_slots and relay_cover arrays
+        return self._add_relay_variables(self._pair_templates(entries))
+
+    def _x_columns(self, i, s):
+        return self.x.start + i * self.data.n_sessions + s
 
     def _add_base_constraints(self):
         # === Constraints ===
-        blocks = self.instance.blocks
-        interpreters = self.instance.interpreters
-        sessions = self.instance.sessions
+        data = self.data
+        n_interpreters, n_sessions = data.n_interpreters, data.n_sessions
+        x_i, x_s = self.x.keys_array
+        y_s, y_p = self.y.keys_array
+        z_i, z_s, z_p = self.z.keys_array
+        n_y, n_z = len(self.y), len(self.z)
+        y_rows = np.arange(n_y)
 
         # 1: An interpreter can only be assigned to one session in a block
-        for b in blocks:
-            for i in interpreters:
-                self.model.addConstr(quicksum(self.x[i, s] for s in self.instance.sessions_per_block[b]) <= 1,
-                                     name=f"one_session_per_interpreter_{i}_{b}")
+        self.builder.add_constraints(
+            "one_session_per_interpreter", data.n_blocks * n_interpreters,
+            data.session_block[x_s] * n_interpreters + x_i, self.x.columns, 1.0, GRB.LESS_EQUAL, 1.0,
+            lambda k: f"one_session_per_interpreter_{k % n_interpreters}_{k // n_interpreters}"
+        )
 
         # 2: In a given session, translation l1 to l2 can only be covered if an interpreter that speaks both
-        # languages is assigned
-        for s in sessions:
-            languages = self.instance.languages_per_session[s]
-            for l1, l2 in itertools.combinations(languages, 2):
-                eligible_interpreters = [i for i in interpreters if l1 in self.instance.languages_per_interpreter[i] and
-                                         l2 in self.instance.languages_per_interpreter[i]]
-                self.model.addConstr(
-                    quicksum(self.x[i, s] for i in eligible_interpreters) >= self.y[s, l1, l2],
-                    name=f"cover_pair_{s}_{l1}_{l2}"
-                )
+        # languages is assigned (implied by 3 and 4, left out of the minimal formulation)
+        if self.formulation != "minimal":
+            self.builder.add_constraints(
+                "cover_pair", n_y,
+                np.concatenate([self.z_pair, y_rows]),
+                np.concatenate([self._x_columns(z_i, z_s), self.y.columns]),
+                np.concatenate([np.ones(n_z), -np.ones(n_y)]), GRB.GREATER_EQUAL, 0.0,
+                lambda k: f"cover_pair_{y_s[k]}_{y_p[k]}"
+            )
 
         # 3: A given interpreter can only cover one translation pair in a session
-        for i in interpreters:
-            for s in sessions:
-                z_terms = [self.z[i, s, l1, l2] for (i2, s2, l1, l2) in self.z if i2 == i and s2 == s]
-                w_terms = [self.w[i1, i2, s, l1, l2, l_prime]
-                           for (i1, i2, s2, l1, l2, l_prime) in self.w
-                           if s2 == s and (i1 == i or i2 == i)]
-                self.model.addConstr(
-                    quicksum(z_terms + w_terms) <= self.x[i, s],
-                    name=f"one_translation_or_bridge_per_session_{i}_{s}"
-                )
+        slot_rows, slot_columns = self.relay_slots
+        participation_rows = np.concatenate([z_i * n_sessions + z_s, slot_rows])
+        participation_columns = np.concatenate([self.z.columns, slot_columns])
+        self.builder.add_constraints(
+            "one_translation_or_bridge_per_session", n_interpreters * n_sessions,
+            np.concatenate([participation_rows, np.arange(n_interpreters * n_sessions)]),
+            np.concatenate([participation_columns, self.x.columns]),
+            np.concatenate([np.ones(len(participation_rows)), -np.ones(len(self.x))]), GRB.LESS_EQUAL, 0.0,
+            lambda k: f"one_translation_or_bridge_per_session_{k // n_sessions}_{k % n_sessions}"
+        )
 
         # 4: A language pair is considered covered if at least one interpreter is actively assigned to interpret it
-        for s in sessions:
-            languages = self.instance.languages_per_session[s]
-            language_pairs = list(itertools.combinations(languages, 2))
-            for l1, l2 in language_pairs:
-                self.model.addConstr(
-                    self.y[s, l1, l2] <= quicksum(
-                        self.z[i, s, l1, l2] for i in interpreters if (i, s, l1, l2) in self.z),
-                    name=f"y_impl_z_{s}_{l1}_{l2}"
-                )
+        self.builder.add_constraints(
+            "y_impl_z", n_y,
+            np.concatenate([y_rows, self.z_pair]),
+            np.concatenate([self.y.columns, self.z.columns]),
+            np.concatenate([np.ones(n_y), -np.ones(n_z)]), GRB.LESS_EQUAL, 0.0,
+            lambda k: f"y_impl_z_{y_s[k]}_{y_p[k]}"
+        )
 
         # 5: A session can only be considered fully covered if all language pairs used in the session are covered
-        for s in sessions:
-            languages = self.instance.languages_per_session[s]
-            language_pairs = list(itertools.combinations(languages, 2))
-            for l1, l2 in language_pairs:
-                self.model.addConstr(self.t[s] <= self.u[s, l1, l2], name=f"t_impl_u_{s}_{l1}_{l2}")
+        # (one row per session in the minimal formulation)
+        if self.formulation == "minimal":
+            self._add_session_cover_rows("t_impl_all_u")
+        else:
+            self.builder.add_constraints(
+                "t_impl_u", n_y,
+                np.concatenate([y_rows, y_rows]),
+                np.concatenate([self.t.start + y_s, self.u.columns]),
+                np.concatenate([np.ones(n_y), -np.ones(n_y)]), GRB.LESS_EQUAL, 0.0,
+                lambda k: f"t_impl_u_{y_s[k]}_{y_p[k]}"
+            )
 
         # 8: A session can be covered by a bridge or directly by interpreters
-        for s in sessions:
-            languages = self.instance.languages_per_session[s]
-            language_pairs = list(itertools.combinations(languages, 2))
-            for l1, l2 in language_pairs:
-                self.model.addConstr(
-                    self.u[s, l1, l2] <= self.y[s, l1, l2] + quicksum(self.w[i1, i2, s, l1, l2, l_prime]
-                                                                      for i1, i2 in itertools.combinations(interpreters, 2)
-                                                                      for l_prime in self.instance.languages
-                                                                      if (i1, i2, s, l1, l2, l_prime) in self.w),
-                    name=f"u_impl_y_and_w_{s}_{l1}_{l2}"
-                )
+        cover_rows, cover_columns = self.relay_cover
+        self.builder.add_constraints(
+            "u_impl_y_and_w", n_y,
+            np.concatenate([y_rows, y_rows, cover_rows]),
+            np.concatenate([self.u.columns, self.y.columns, cover_columns]),
+            np.concatenate([np.ones(n_y), -np.ones(n_y), -np.ones(len(cover_rows))]), GRB.LESS_EQUAL, 0.0,
+            lambda k: f"u_impl_y_and_w_{y_s[k]}_{y_p[k]}"
+        )
 
         # 9: One interpreter can only participate in one translation pair in a session
-        for i in self.instance.interpreters:
-            for s in self.instance.sessions:
-                participations = []
-
-                for (i1, i2, s1, l1, l2, l_prime) in self.w:
-                    if (i1 == i or i2 == i) and s1 == s:
-                        participations.append(self.w[i1, i2, s, l1, l2, l_prime])
-
-                for (i1, s1 , l1, l2) in self.z:
-                    if i1 == i and s1 == s:
-                        participations.append(self.z[i1, s, l1, l2])
-
-                if participations:
-                    self.model.addConstr(
-                        quicksum(participations) <= 1,
-                        name=f"one_bridge_only_{i}"
-                    )
+        # Only the (interpreter, session) slots with at least one participation get a row. It is constraint 3 with
+        # x <= 1 as right-hand side, left out of the minimal formulation
+        slots, rows = np.unique(participation_rows, return_inverse=True)
+        self.bridge_slots = slots
+        if self.formulation != "minimal":
+            self.builder.add_constraints(
+                "one_bridge_only", len(slots), rows, participation_columns, 1.0, GRB.LESS_EQUAL, 1.0,
+                lambda k: f"one_bridge_only_{slots[k] // n_sessions}_{slots[k] % n_sessions}"
+            )
 
 
     def _add_operational_constraints(self):
         # === Additional Constraints ===
         # 6: An interpreter can only be assigned to a maximum of 15 sessions
-        interpreters = self.instance.interpreters
-        sessions = self.instance.sessions
-        blocks = self.instance.blocks
-        for i in interpreters:
-            self.model.addConstr(quicksum(self.x[i, s] for s in sessions) <= 15,
-                                 name=f"max_sessions_per_interpreter_{i}")
-
         # 7: An interpreter can only be assigned to a maximum of 3 consecutive blocks
-        for i in interpreters:
-            for k in range(len(blocks) - 3):
-                group = blocks[k:k + 4]
-                sessions_in_group = sum((self.instance.sessions_per_block[b] for b in group), [])
-                self.model.addConstr(
-                    quicksum(self.x[i, s] for s in sessions_in_group) <= 3,
-                    name=f"max_3_consecutive_blocks_{i}_from_{group[0]}"
-                )
-
-    def _add_objective(self):
-        sessions = self.instance.sessions
-        if self.objective == "OF1":
-            self.model.setObjective(gp.quicksum(self.u[s, l1, l2] for (s, l1, l2) in self.u.keys()), GRB.MAXIMIZE)
-        elif self.objective == "OF2":
-            self.model.setObjective(quicksum(self.t[s] for s in sessions), GRB.MAXIMIZE)
-        else:
-            raise ValueError("Objective function must be either 'OF1' or 'OF2', got: " + self.objective)
+        # These are the default rules, any other ones are given as Rules (rules.py). Each rule family is added in bulk
+        # from a prefix index of x over the blocks
+        self.rule_groups = self.rules.add_constraints(self.builder, self.x, self.data)
 
     def optimize(self):
-        self.model.optimize()
+        self.result = self.backend.solve(self.model, self.profiler)
+        self.builder.set_solution(self.result.x)
         self.is_optimized = True
 
+    def profile(self):
+        # Build phases, families and solves recorded with profile=True
+        return self.profiler.report(self.builder)
+
     def print_results(self):
         if not self.is_optimized:
             print("Model has not been optimized yet. Call optimize() first.")
             return
 
-        w = self.model._w
-        z = self.model._z
-        self.model.printAttr("X")
+        self._print_values()
 
         print("\n--- Result ---")
-        if self.model.status == GRB.OPTIMAL or self.model.status == GRB.TIME_LIMIT:
-            print(f"Objective value: {self.model.ObjVal}")
-            for i1, i2, s, l1, l2, lp in w:
-                if w[i1, i2, s, l1, l2, lp].X > 0.5:
-                    print(f"{i1} and {i2} cover the pair ({l1}, {l2}) in {s} via bridge language {lp}.")
+        if self.result.status == GRB.OPTIMAL or self.result.status == GRB.TIME_LIMIT:
+            print(f"Objective value: {self.result.objective}")
+            for i1, i2, s, l1, l2, lp in self.relays():
+                print(f"{i1} and {i2} cover the pair ({l1}, {l2}) in {s} via bridge language {lp}.")
 
-            for i, s, l1, l2 in z:
-                if z[i, s, l1, l2].X > 0.5:
-                    print(f"{i} assigned to {s} covers pair ({l1}, {l2}).")
+            for i, s, l1, l2 in self.assignments():
+                print(f"{i} assigned to {s} covers pair ({l1}, {l2}).")
 
         if self.objective == "OF2":
-            for s in self.instance.sessions:
-                if self.model._t[s].X > 0.5:
-                    print(f"Session {s} is fully covered.")
-
+            for s in np.flatnonzero(self.t.X > 0.5).tolist():
+                print(f"Session {self.data.sessions[s]} is fully covered.")
+
+
+    def assignments(self):
+        # Names (interpreter, session, l1, l2) of the pairs covered directly in the solution
+        data = self.data
+        selected = self.z.X > 0.5
+        return [
+            (data.interpreters[i], data.sessions[s], *data.pair_names(p))
+            for i, s, p in zip(*(k[selected].tolist() for k in self.z.keys_array))
+        ]
+
+    def relays(self):
+        # Names (i1, i2, session, l1, l2, l_prime) of the bridges used in the solution
+        data = self.data
+        return [
+            (data.interpreters[i1], data.interpreters[i2], data.sessions[s], *data.pair_names(p),
+             data.languages[l_prime])
+            for i1, i2, s, p, l_prime in self.relay_ids().tolist()
+        ]
+
+    def relay_ids(self, values=None):
+        # Rows (i1, i2, s, p, l_prime) of the bridges used in the solution, values being the values of all the
+        # columns if they have already been read (MatrixBuilder.values)
+        w = self.w.X if values is None else values[self.w.columns]
+        selected = w > 0.5
+        return np.stack([k[selected] for k in self.w.keys_array], axis=1).astype(np.int64).reshape(-1, 5)
 
     @property
     def runtime(self):
         if not self.is_optimized:
             print("Model has not been optimized yet. Call optimize() first.")
             return None
-        return self.model.Runtime
+        return self.result.runtime
 
     @property
     def mip_gap(self):
         if not self.is_optimized:
             print("Model has not been optimized yet. Call optimize() first.")
             return None
-        return self.model.MIPGap
+        return self.result.mip_gap
 
     @property
     def objective_value(self):
         if not self.is_optimized:
             print("Model has not been optimized yet. Call optimize() first.")
             return None
-        return self.model.ObjVal
\ No newline at end of file
+        return self.result.objective
\ No newline at end of file
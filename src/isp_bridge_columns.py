@@ -0,0 +1,209 @@
+from isp_bridge import ISPBridge
+from matrix import concatenate_keys
+from gurobipy import GRB
+import numpy as np
+
+
+class ISPBridgeColumns(ISPBridge):
+    # Same model as ISPBridge, but the relay variables w are generated by column generation instead of all at once.
+    # The model starts from the direct assignments and, for each pair that no interpreter covers directly, one relay.
+    # optimize() solves the LP relaxation, prices the relays with the duals of constraints 3 (one translation per
+    # interpreter and session) and 8 (pair covered directly or by a relay), adds the ones with a positive reduced
+    # cost and starts again until there is none. The MIP is then solved with the relays generated so far, which may
+    # miss relays only an integer solution would use: mip_gap is given to the bound of the LP relaxation of the full
+    # model (lp_bound).
+
+    def __init__(self, name, objective, operational_constraints: bool = False, names: bool = False,
+                 warm_start: bool = False, prune: bool = True, profile: bool = False, backend: str = "gurobi",
+                 formulation: str = "current", tuned: bool = True, max_iterations=100):
+        # The pricing needs the duals of the LP relaxations, read from Gurobi
+        if backend != "gurobi":
+            raise ValueError("ISPBridgeColumns only supports the gurobi backend")
+        self.max_iterations = max_iterations
+        self.iterations = 0
+        self.lp_bound = None
+        self.converged = False
+        self._runtime = 0.0
+        super().__init__(name, objective, operational_constraints, names, warm_start, prune, profile, backend,
+                         formulation, tuned)
+
+    def _add_relay_variables(self, templates):
+        # Initial relays: the cheapest one (for zero duals) of each pair without eligible interpreter
+        n_eligible = np.diff(self.data.pair_interpreter_ptr)
+        entries = np.array([k for p, l1, l2, entries in templates if not n_eligible[p] for k in entries.tolist()],
+                           dtype=np.int64)
+        slot_costs = np.zeros((self.data.n_interpreters, self.data.n_sessions))
+        return self._add_relay_columns(*self._best_relays(entries, slot_costs, np.ones(len(entries))))
+
+    def _add_relay_columns(self, keys, cover, vtype=GRB.BINARY):
+        # Adds the relays keys (i1, i2, s, p, l_prime) covering the y variables cover, returns their relay_slots and
+        # relay_cover arrays
+        data = self.data
+        n_before = len(self.builder.families.get("w", ()))
+        self.w = self.builder.add_variables("w", keys, vtype)
+
+        w_i1, w_i2, w_s = (k[n_before:] for k in self.w.keys_array[:3])
+        columns = self.w.columns[n_before:]
+        return ((np.concatenate([w_i1 * data.n_sessions + w_s, w_i2 * data.n_sessions + w_s]),
+                 np.concatenate([columns, columns])),
+                (cover, columns))
+
+    def _best_relays(self, entries, slot_costs, values):
+        # For each y variable entries[k], the relay (i1, i2, l_prime) of least slot_costs[i1, s] + slot_costs[i2, s],
+        # kept if that cost is below values[k]. Returns the keys of the kept relays that are not in the model yet, and
+        # the y variable each one covers
+        data = self.data
+        speaks = data.language_matrix
+        y_s, y_p = (k[entries] for k in self.y.keys_array)
+        keys, cover = [], []
+        if data.n_interpreters < 2:
+            return concatenate_keys(keys, 5), np.zeros(0, dtype=np.int64)
+        for p in np.unique(y_p).tolist():
+            on_p = np.flatnonzero(y_p == p)
+            l1, l2 = data.pair_languages[p].tolist()
+            # first[i, l_prime] (second[i, l_prime]): interpreter i can take the l1 (l2) side of a bridge via l_prime
+            first = speaks[:, [l1]] & speaks
+            second = speaks[:, [l2]] & speaks
+            first[:, [l1, l2]] = False
+            second[:, [l1, l2]] = False
+
+            # The two cheapest interpreters of each side, for each entry and bridge language
+            costs = slot_costs[:, y_s[on_p]].T[:, :, None]
+            sides = []
+            for half in (first, second):
+                side = np.where(half[None], costs, np.inf)
+                cheapest = np.argpartition(side, 1, axis=1)[:, :2]
+                cheapest_costs = np.take_along_axis(side, cheapest, axis=1)
+                swap = cheapest_costs[:, 0] > cheapest_costs[:, 1]
+                cheapest[:, [0, 1]] = np.where(swap[:, None], cheapest[:, [1, 0]], cheapest)
+                cheapest_costs[:, [0, 1]] = np.where(swap[:, None], cheapest_costs[:, [1, 0]], cheapest_costs)
+                sides.append((cheapest, cheapest_costs))
+            (a, a_costs), (b, b_costs) = sides
+
+            # Both sides need distinct interpreters: the second cheapest of one side replaces a shared cheapest
+            same = a[:, 0] == b[:, 0]
+            use_b2 = a_costs[:, 0] + b_costs[:, 1] <= a_costs[:, 1] + b_costs[:, 0]
+            i1 = np.where(same & ~use_b2, a[:, 1], a[:, 0])
+            i2 = np.where(same & use_b2, b[:, 1], b[:, 0])
+            cost = np.where(same, np.minimum(a_costs[:, 0] + b_costs[:, 1], a_costs[:, 1] + b_costs[:, 0]),
+                            a_costs[:, 0] + b_costs[:, 0])
+
+            l_prime = np.argmin(cost, axis=1)
+            rows = np.arange(len(on_p))
+            best = cost[rows, l_prime]
+            kept = np.isfinite(best) & (best < values[on_p] - 1e-6)
+            if not kept.any():
+                continue
+            i1, i2 = i1[rows, l_prime][kept], i2[rows, l_prime][kept]
+            keys.append((np.minimum(i1, i2), np.maximum(i1, i2), y_s[on_p][kept], np.full(kept.sum(), p),
+                         l_prime[kept]))
+            cover.append(entries[on_p][kept])
+
+        keys = concatenate_keys(keys, 5)
+        cover = np.concatenate(cover) if cover else np.zeros(0, dtype=np.int64)
+        if "w" in self.builder.families and len(self.w):
+            new = self.w.positions(keys, strict=False) < 0
+            keys, cover = tuple(k[new] for k in keys), cover[new]
+        return keys, cover
+
+    def _price(self):
+        # Relays with a positive reduced cost in the LP solution: a relay of interpreters i1 and i2 in session s
+        # covering the k-th y variable has the reduced cost pi_8[k] - pi_3[i1, s] - pi_3[i2, s]
+        data = self.data
+        n_sessions = self.n_original_sessions
+        slot_costs = np.zeros((data.n_interpreters, data.n_sessions))
+        slot_costs[:, :n_sessions] = self.builder.constraints[self.SLOT_ROWS].Pi.reshape(-1, n_sessions)
+        for key, row in self._rows.items():
+            if key[0] == "slot":
+                slot_costs[key[1], key[2]] = row.Pi
+        # Constraint 9 (one participation per slot), that the relays join when their slot has a row
+        if "one_bridge_only" in self.builder.constraints:
+            i, s = np.divmod(self.bridge_slots, n_sessions)
+            slot_costs[i, s] += self.builder.constraints["one_bridge_only"].Pi
+
+        n_cover = self.builder.constraints[self.COVER_ROWS].size
+        values = np.zeros(len(self.y))
+        values[:n_cover] = self.builder.constraints[self.COVER_ROWS].Pi
+        for k in range(n_cover, len(self.y)):
+            values[k] = self._cover_row(k).Pi
+
+        # Pruned sessions get no relays
+        y_s = self.y.keys_array[0]
+        pruned = np.zeros(len(self.y), dtype=bool)
+        original = y_s < len(self.pruned)
+        pruned[original] = self.pruned[y_s[original]]
+        entries = np.flatnonzero((values > 1e-6) & ~pruned)
+        return self._best_relays(entries, slot_costs, values[entries])
+
+    def _add_relays_to_rows(self, relays):
+        super()._add_relays_to_rows(relays)
+        if "one_bridge_only" not in self.builder.constraints:
+            return
+        # 9: the relays join the row of their slots that have one
+        (slots, slot_columns), _ = relays
+        i, s = np.divmod(slots, self.data.n_sessions)
+        codes = np.where(s < self.n_original_sessions, i * self.n_original_sessions + s, -1)
+        rows = np.minimum(np.searchsorted(self.bridge_slots, codes), len(self.bridge_slots) - 1)
+        found = self.bridge_slots[rows] == codes
+        constraints = self.builder.constraints["one_bridge_only"]
+        for row, var in zip(rows[found].tolist(), self.builder.variables(slot_columns[found])):
+            self.model.chgCoeff(constraints[row].item(), var, 1.0)
+
+    def _set_vtype(self, vtype):
+        for family in self.builder.families.values():
+            for part in family.parts:
+                if part.size:
+                    part.VType = vtype
+
+    def optimize(self):
+        # Duals are only given for a single objective: several ones are blended for the pricing, each one weighted
+        # above any value of the next ones
+        objectives, tolerances = self.objectives, self.objective_tolerances
+        if len(objectives) > 1:
+            self._add_objective(objectives[0])
+            weight = max(len(self.y), len(self.t)) + 1
+            self.model.setObjective(sum(weight ** (len(objectives) - 1 - k) * self._objective_expression(objective)
+                                        for k, objective in enumerate(objectives)), GRB.MAXIMIZE)
+        self._runtime = 0.0
+        self.converged = False
+        self.lp_bound = None
+
+        self._set_vtype(GRB.CONTINUOUS)
+        for self.iterations in range(1, self.max_iterations + 1):
+            self.profiler.optimize(self.model, "lp")
+            self._runtime += self.model.Runtime
+            if self.model.Status != GRB.OPTIMAL:
+                break
+            keys, cover = self._price()
+            if not len(cover):
+                self.converged = True
+                self.lp_bound = self.model.ObjVal
+                break
+            relays = self._add_relay_columns(keys, cover, GRB.CONTINUOUS)
+            self.model.update()
+            self._add_relays_to_rows(relays)
+        self._set_vtype(GRB.BINARY)
+
+        if len(objectives) > 1:
+            self._add_objective(objectives, *tolerances)
+        self.result = self.backend.solve(self.model, self.profiler)
+        self._runtime += self.model.Runtime
+        self.is_optimized = True
+
+    @property
+    def runtime(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return None
+        return self._runtime
+
+    @property
+    def mip_gap(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return None
+        if self.model.NumObj > 1 or not self.converged or not self.model.SolCount:
+            return super().mip_gap
+        # The objectives are integer, and lp_bound bounds the model with all the relays
+        bound = np.floor(self.lp_bound + 1e-6)
+        return max(bound - self.model.ObjVal, 0.0) / max(abs(self.model.ObjVal), 1e-10)
@@ -0,0 +1,112 @@
+from isp_bridge import ISPBridge
+from matrix import concatenate_keys
+import gurobipy as gp
+from gurobipy import GRB
+import numpy as np
+
+
+class ISPBridgeCompact(ISPBridge):
+    # Same model as ISPBridge, but a bridge is described by two half-links instead of one variable per pair of
+    # interpreters, so the number of relay variables grows linearly with the number of interpreters
+
+    def _add_relay_variables(self, templates):
+        data = self.data
+        speaks = data.language_matrix
+        y_s = self.y.keys_array[0]
+        h_before = len(self.builder.families.get("h", ()))
+        r_before = len(self.builder.families.get("r", ()))
+
+        # h[i, s, p, l_prime, l] = 1 if interpreter i translates between l (l1 or l2) and the bridge language
+        # l_prime in session s, as one half of a bridge covering the pair p = (l1, l2), 0 otherwise
+        # A half-link is only created if another interpreter can take the other half
+        # r[s, p, l_prime] = 1 if the pair p = (l1, l2) is covered in session s via the bridge language l_prime,
+        # 0 otherwise
+        # half_rows[k] is the row of constraint 10 of the k-th half-link: 2 * (its r variable) + (0 for l1, 1 for l2)
+        h_keys, r_keys, r_cover, half_rows = [], [], [], []
+        n_r = r_before
+        for p, l1, l2, entries in templates:
+            h_i, h_bridge, h_side, bridges = [], [], [], []
+            for l_prime in range(data.n_languages):
+                if l_prime in (l1, l2):
+                    continue
+                halves = []
+                for l, other in ((l1, l2), (l2, l1)):
+                    partners = speaks[:, other] & speaks[:, l_prime]
+                    halves.append(speaks[:, l] & speaks[:, l_prime] & (partners.sum() - partners > 0))
+                if not halves[0].any():
+                    continue
+                for side, half in enumerate(halves):
+                    interpreters = np.flatnonzero(half)
+                    h_i.append(interpreters)
+                    h_bridge.append(np.full(len(interpreters), len(bridges)))
+                    h_side.append(np.full(len(interpreters), side))
+                bridges.append(l_prime)
+            if not bridges:
+                continue
+
+            h_i, h_bridge, h_side = np.concatenate(h_i), np.concatenate(h_bridge), np.concatenate(h_side)
+            n_entries, n_halves, n_bridges = len(entries), len(h_i), len(bridges)
+            h_keys.append((np.tile(h_i, n_entries), np.repeat(y_s[entries], n_halves), np.full(n_entries * n_halves, p),
+                           np.tile(np.array(bridges)[h_bridge], n_entries),
+                           np.tile(np.where(h_side == 0, l1, l2), n_entries)))
+            entry_positions = np.repeat(np.arange(n_entries), n_halves)
+            half_rows.append((2 * (n_r + entry_positions * n_bridges + np.tile(h_bridge, n_entries))
+                              + np.tile(h_side, n_entries),))
+            r_keys.append((np.repeat(y_s[entries], n_bridges), np.full(n_entries * n_bridges, p),
+                           np.tile(bridges, n_entries)))
+            r_cover.append((np.repeat(entries, n_bridges),))
+            n_r += n_entries * n_bridges
+
+        self.h = self.builder.add_variables("h", concatenate_keys(h_keys, 5), GRB.BINARY)
+        self.r = self.builder.add_variables("r", concatenate_keys(r_keys, 3), GRB.BINARY)
+        half_rows = concatenate_keys(half_rows, 1)[0]
+        self.half_rows = half_rows if h_before == 0 else np.concatenate([self.half_rows, half_rows])
+
+        self.w = {}
+
+        h_i, h_s = (k[h_before:] for k in self.h.keys_array[:2])
+        return (h_i * data.n_sessions + h_s, self.h.columns[h_before:]), \
+            (concatenate_keys(r_cover, 1)[0], self.r.columns[r_before:])
+
+    def _add_base_constraints(self):
+        super()._add_base_constraints()
+
+        # 10: A bridge via l_prime is only used if both of its halves are covered by an interpreter
+        # Constraint 3 keeps the two halves on different interpreters, as each one covers at most one translation
+        r_s, r_p, r_l = self.r.keys_array
+        n_r = len(self.r)
+        self.builder.add_constraints(
+            "bridge_half", 2 * n_r,
+            np.concatenate([2 * np.arange(n_r), 2 * np.arange(n_r) + 1, self.half_rows]),
+            np.concatenate([self.r.columns, self.r.columns, self.h.columns]),
+            np.concatenate([np.ones(2 * n_r), -np.ones(len(self.h))]), GRB.LESS_EQUAL, 0.0,
+            lambda k: f"bridge_half_{r_s[k // 2]}_{r_p[k // 2]}_{r_l[k // 2]}_{k % 2}"
+        )
+
+    def _add_pair_relays(self, entries):
+        h_before, r_before = len(self.h), len(self.r)
+        relays = super()._add_pair_relays(entries)
+        self.model.update()
+
+        # 10: for the new bridges
+        half_rows = self.half_rows[h_before:]
+        for k in range(r_before, len(self.r)):
+            for side in range(2):
+                halves = [self.h.var(h_before + j) for j in np.flatnonzero(half_rows == 2 * k + side).tolist()]
+                self.model.addLConstr(gp.LinExpr([1.0] + [-1.0] * len(halves), [self.r.var(k)] + halves),
+                                      GRB.LESS_EQUAL, 0.0)
+        return relays
+
+    def relay_ids(self, values=None):
+        # Pair the selected half-links back into (i1, i2, s, p, l_prime) bridges: the half-link of row 2k (side l1)
+        # and of row 2k + 1 (side l2) of each selected r[k], the first one of each row if there are several
+        h = self.h.X if values is None else values[self.h.columns]
+        r = self.r.X if values is None else values[self.r.columns]
+        selected = h > 0.5
+        rows, first = np.unique(self.half_rows[selected], return_index=True)
+        h_i = self.h.keys_array[0][selected][first].astype(np.int64)
+        k = np.flatnonzero(r > 0.5)
+        i1 = h_i[np.searchsorted(rows, 2 * k)]
+        i2 = h_i[np.searchsorted(rows, 2 * k + 1)]
+        r_s, r_p, r_l = (key[k].astype(np.int64) for key in self.r.keys_array)
+        return np.stack([i1, i2, r_s, r_p, r_l], axis=1)
@@ -0,0 +1,258 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+import time
+
+import numpy as np
+
+from instance import Instance
+from instance_cache import content_hash, load_instance
+from isp import ISP
+from heuristics import evaluate, solution_values
+from isp_flow import _Values
+from rules import as_rules
+
+
+# Block subproblems already built by this process during ISPDecomposed.optimize(), by (content hash of the instance
+# file, block, objective, threads, time limit), so that an edited instance or other parameters give a new model
+_subproblems = {}
+
+
+def _init_worker():
+    import gurobipy as gp
+    gp.setParam("OutputFlag", 0)
+
+
+def _solve_block(name, b, objective, costs, threads, time_limit):
+    # Solves the ISP model of the sessions of block b alone, maximizing the objective minus costs[i] for every
+    # session interpreter i is assigned to (costs is None without Lagrangian multipliers)
+    key = (content_hash(name), b, objective, threads, time_limit)
+    if key not in _subproblems:
+        data = load_instance(name).compile()
+        block = Instance.from_compiled(f"{name}[{data.blocks[b]}]", data.subset([b]))
+        sub = ISP(block, objective)
+        sub.model.setParam("OutputFlag", 0)
+        sub.model.setParam("Threads", threads)
+        if time_limit is not None:
+            sub.model.setParam("TimeLimit", time_limit)
+        _subproblems[key] = (sub, np.array(data.block_sessions(b)))
+    sub, sessions = _subproblems[key]
+
+    # The costs of the previous call are still in the objective of a cached subproblem
+    sub.x.mvar.Obj = 0.0 if costs is None else -costs[sub.x.keys_array[0]]
+    sub.optimize()
+
+    z_i, z_s, z_p = (k[sub.z.X > 0.5] for k in sub.z.keys_array)
+    return {
+        "objective": sub.model.ObjVal if sub.model.SolCount else 0.0,
+        "bound": sub.model.ObjBound,
+        "runtime": sub.model.Runtime,
+        "z": np.stack([z_i, sessions[z_s], z_p], axis=1),
+    }
+
+
+class ISPDecomposed:
+    # ISP solved one block at a time, the block subproblems being solved in parallel on a process pool.
+    # Without operational constraints, constraint 1 is the only one linking sessions and it stays within a block,
+    # so the blocks are independent and the merged solution is optimal (up to the MIP gap of each block).
+    # With operational constraints, constraints 6 and 7 link the blocks: they are relaxed with Lagrangian
+    # multipliers (lambda[i] for 6, mu[i, w] for 7), updated by subgradient steps. Each iteration gives an upper
+    # bound, and its solution is repaired into a feasible one by dropping assignments, which gives a lower bound.
+
+    def __init__(self, name, objective, operational_constraints: bool = False, workers=None, iterations=50,
+                 threads=1, time_limit=None):
+        if objective not in ("OF1", "OF2"):
+            raise ValueError("Objective function must be either 'OF1' or 'OF2', got: " + objective)
+        rules = as_rules(operational_constraints)
+        if rules is not None and not rules.is_default:
+            raise ValueError("ISPDecomposed only relaxes the default operational rules (15 sessions, 3 consecutive "
+                             "blocks)")
+        self.name = name
+        self.instance = load_instance(name)
+        self.data = self.instance.compile()
+        self.objective = objective
+        self.operational_constraints = operational_constraints
+        self.workers = workers or os.cpu_count()
+        self.iterations = iterations
+        # Gurobi threads and time limit of each block subproblem
+        self.threads = threads
+        self.time_limit = time_limit
+
+        self.x = _Values()
+        self.y = _Values()
+        self.z = _Values()
+        self.t = _Values()
+
+        self.is_optimized = False
+        self._runtime = None
+        self._objective_value = None
+        self._bound = None
+        self.history = []
+
+    @staticmethod
+    def supports(objective, operational_constraints: bool = False, bridging=None):
+        return not bridging
+
+    def _solve_blocks(self, pool, costs):
+        # costs[i, b] is the cost of assigning interpreter i to a session of block b
+        args = [
+            (self.name, b, self.objective, None if costs is None else costs[:, b], self.threads, self.time_limit)
+            for b in range(self.data.n_blocks)
+        ]
+        if pool is None:
+            return [_solve_block(*a) for a in args]
+        return list(pool.map(_solve_block, *zip(*args)))
+
+    def _assignment_counts(self, z):
+        # counts[i, b] = number of sessions of block b interpreter i is assigned to
+        counts = np.zeros((self.data.n_interpreters, self.data.n_blocks))
+        np.add.at(counts, (z[:, 0], self.data.session_block[z[:, 1]]), 1)
+        return counts
+
+    def _repair(self, z):
+        # Keeps, for each interpreter, its most valuable assignments first, as long as it stays within 15 sessions
+        # and 3 sessions in any 4 consecutive blocks. A pair covered by several interpreters is worth less to each.
+        data = self.data
+        keep = np.zeros(len(z), dtype=bool)
+        _, pair_index, multiplicity = np.unique(z[:, 1:], axis=0, return_inverse=True, return_counts=True)
+        value = 1.0 / multiplicity[pair_index.ravel()]
+        if self.objective == "OF2":
+            # An assignment to a session that is fully covered is worth more
+            value += np.isin(z[:, 1], self._full_sessions(z))
+        for i in np.unique(z[:, 0]).tolist():
+            blocks = []
+            for k in sorted(np.flatnonzero(z[:, 0] == i).tolist(), key=lambda k: -value[k]):
+                b = int(data.session_block[z[k, 1]])
+                if len(blocks) < 15 and all(
+                    sum(1 for b2 in blocks if w <= b2 <= w + 3) < 3 for w in range(b - 3, b + 1)
+                ):
+                    blocks.append(b)
+                    keep[k] = True
+        return z[keep]
+
+    def _full_sessions(self, z):
+        data = self.data
+        return [
+            s for s in range(data.n_sessions)
+            if set(data.session_pairs(s)) <= set(z[z[:, 1] == s, 2].tolist())
+        ]
+
+    def optimize(self):
+        start = time.perf_counter()
+        pool = ProcessPoolExecutor(self.workers, initializer=_init_worker) if self.workers > 1 else None
+        try:
+            if self.operational_constraints:
+                best_z = self._optimize_lagrangian(pool)
+            else:
+                results = self._solve_blocks(pool, None)
+                best_z = np.concatenate([r["z"] for r in results])
+                self._objective_value = float(sum(r["objective"] for r in results))
+                self._bound = float(sum(r["bound"] for r in results))
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            else:
+                # The workers of a pool take their subproblems with them, the ones built here are freed
+                _subproblems.clear()
+        self._runtime = time.perf_counter() - start
+
+        self.x, self.y, self.z, self.t = solution_values(self.data, best_z)
+        self.is_optimized = True
+
+    def _optimize_lagrangian(self, pool):
+        data = self.data
+        n_interpreters, n_blocks = data.n_interpreters, data.n_blocks
+        n_windows = max(n_blocks - 3, 0)
+        # windows[w, b] = 1 if block b is in the window of constraint 7 starting at block w
+        windows = np.zeros((n_windows, n_blocks))
+        for w in range(n_windows):
+            windows[w, w:w + 4] = 1.0
+
+        lam = np.zeros(n_interpreters)
+        mu = np.zeros((n_interpreters, n_windows))
+        step_scale = 2.0
+        best_z, best_lower, best_upper, stalled = None, -np.inf, np.inf, 0
+        for iteration in range(self.iterations):
+            costs = lam[:, None] + mu @ windows
+            results = self._solve_blocks(pool, costs)
+            z = np.concatenate([r["z"] for r in results])
+            counts = self._assignment_counts(z)
+
+            upper = sum(r["bound"] for r in results) + 15.0 * lam.sum() + 3.0 * mu.sum()
+            if upper < best_upper - 1e-6:
+                best_upper, stalled = upper, 0
+            else:
+                stalled += 1
+
+            feasible = self._repair(z)
+            lower = evaluate(self.data, self.objective, feasible)
+            if lower > best_lower:
+                best_z, best_lower = feasible, lower
+            self.history.append((iteration, upper, lower))
+
+            # The objective is integer, so the bound can be rounded down
+            if np.floor(best_upper + 1e-6) <= best_lower:
+                break
+
+            # Subgradient of the dual function, projected so that the multipliers stay nonnegative
+            g_lam = 15.0 - counts.sum(axis=1)
+            g_mu = 3.0 - counts @ windows.T
+            g_lam[(lam <= 0) & (g_lam > 0)] = 0.0
+            g_mu[(mu <= 0) & (g_mu > 0)] = 0.0
+            norm = np.sum(g_lam ** 2) + np.sum(g_mu ** 2)
+            if norm == 0:
+                # The relaxed solution satisfies the relaxed constraints with complementary slackness: optimal
+                break
+            if stalled >= 3:
+                step_scale, stalled = step_scale / 2, 0
+            step = step_scale * (upper - best_lower) / norm
+            lam = np.maximum(0.0, lam - step * g_lam)
+            mu = np.maximum(0.0, mu - step * g_mu)
+
+        self._objective_value = float(best_lower)
+        self._bound = float(min(best_upper, np.floor(best_upper + 1e-6)))
+        return best_z
+
+    def print_results(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return
+
+        print("\n--- Result ---")
+        print(f"Objective value: {self._objective_value} (upper bound: {self._bound})")
+        for i, s, l1, l2 in self.assignments():
+            print(f"{i} assigned to {s} covers pair ({l1}, {l2})")
+
+    def assignments(self):
+        # Names (interpreter, session, l1, l2) of the pairs covered in the solution
+        data = self.data
+        return [(data.interpreters[i], data.sessions[s], *data.pair_names(p)) for (i, s, p) in self.z]
+
+    @property
+    def runtime(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return None
+        return self._runtime
+
+    @property
+    def bound(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return None
+        return self._bound
+
+    @property
+    def mip_gap(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return None
+        if self._objective_value == 0:
+            return 0.0 if self._bound == 0 else float("inf")
+        return abs(self._bound - self._objective_value) / abs(self._objective_value)
+
+    @property
+    def objective_value(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return None
+        return self._objective_value
@@ -0,0 +1,270 @@
+from instance_cache import load_instance
+from collections import deque
+import time
+
+
+class _Value:
+    # Stands in for a Gurobi variable once solved, so that results are read through .X as for ISP
+    __slots__ = ("X",)
+
+    def __init__(self, value=0.0):
+        self.X = value
+
+
+class _Values(dict):
+    # Values of a variable family once solved, when only the nonzero ones are stored: the others read as 0
+    def __missing__(self, key):
+        return _Value(0.0)
+
+
+def hopcroft_karp(adjacency, n_right):
+    # Maximum matching in a bipartite graph, adjacency[u] lists the right vertices of the left vertex u
+    # Returns match_left, with match_left[u] the right vertex matched to u or -1
+    n_left = len(adjacency)
+    match_left = [-1] * n_left
+    match_right = [-1] * n_right
+
+    # Greedy initial matching, most augmenting phases are then avoided
+    for u in range(n_left):
+        for v in adjacency[u]:
+            if match_right[v] == -1:
+                match_left[u] = v
+                match_right[v] = u
+                break
+
+    while True:
+        # BFS from the free left vertices, layering the graph along alternating paths
+        dist = [-1] * n_left
+        queue = deque(u for u in range(n_left) if match_left[u] == -1)
+        for u in queue:
+            dist[u] = 0
+        found = False
+        while queue:
+            u = queue.popleft()
+            for v in adjacency[u]:
+                w = match_right[v]
+                if w == -1:
+                    found = True
+                elif dist[w] == -1:
+                    dist[w] = dist[u] + 1
+                    queue.append(w)
+        if not found:
+            return match_left
+
+        # Iterative DFS along the layers, looking for vertex-disjoint shortest augmenting paths
+        pointer = [0] * n_left
+        for root in range(n_left):
+            if match_left[root] != -1:
+                continue
+            stack = [root]
+            while stack:
+                u = stack[-1]
+                if pointer[u] == len(adjacency[u]):
+                    dist[u] = -1
+                    stack.pop()
+                    continue
+                v = adjacency[u][pointer[u]]
+                pointer[u] += 1
+                w = match_right[v]
+                if w == -1:
+                    # Augment along the stack: each vertex takes the right vertex it was exploring
+                    for u2 in reversed(stack):
+                        v2 = adjacency[u2][pointer[u2] - 1]
+                        match_right[v2] = u2
+                        match_left[u2] = v2
+                    break
+                if dist[w] == dist[u] + 1:
+                    stack.append(w)
+
+
+def max_flow(n_nodes, edges, source, sink):
+    # Dinic's algorithm, edges is a list of (tail, head, capacity)
+    # Returns the flow on each edge, in the same order as edges
+    head = []
+    capacity = []
+    adjacency = [[] for _ in range(n_nodes)]
+    for tail, to, cap in edges:
+        adjacency[tail].append(len(head))
+        head.append(to)
+        capacity.append(cap)
+        adjacency[to].append(len(head))
+        head.append(tail)
+        capacity.append(0)
+
+    while True:
+        level = [-1] * n_nodes
+        level[source] = 0
+        queue = deque([source])
+        while queue:
+            u = queue.popleft()
+            for e in adjacency[u]:
+                if capacity[e] > 0 and level[head[e]] == -1:
+                    level[head[e]] = level[u] + 1
+                    queue.append(head[e])
+        if level[sink] == -1:
+            break
+
+        pointer = [0] * n_nodes
+        while True:
+            # Iterative DFS for one blocking path, then push its bottleneck
+            path = []
+            u = source
+            while u != sink:
+                while pointer[u] < len(adjacency[u]):
+                    e = adjacency[u][pointer[u]]
+                    if capacity[e] > 0 and level[head[e]] == level[u] + 1:
+                        break
+                    pointer[u] += 1
+                if pointer[u] == len(adjacency[u]):
+                    if u == source:
+                        break
+                    level[u] = -1
+                    u = head[path.pop() ^ 1]
+                    pointer[u] += 1
+                    continue
+                e = adjacency[u][pointer[u]]
+                path.append(e)
+                u = head[e]
+            if u != sink:
+                break
+            pushed = min(capacity[e] for e in path)
+            for e in path:
+                capacity[e] -= pushed
+                capacity[e ^ 1] += pushed
+
+    return [capacity[2 * k + 1] for k in range(len(edges))]
+
+
+class ISPFlow:
+    # Exact combinatorial solver for OF1 without bridging, as long as the only operational rule is a cap on the
+    # number of sessions per interpreter (constraint 7 couples the blocks in a way a flow cannot represent).
+    # Without a cap, each block is an independent maximum bipartite matching between interpreters and the language
+    # pairs of its sessions (Hopcroft-Karp). With a cap, the blocks are linked through the max-flow network
+    # source -> interpreter (cap) -> (interpreter, block) (1) -> (s, l1, l2) (1) -> sink (Dinic).
+
+    def __init__(self, name, objective, operational_constraints: bool = False, max_sessions=None):
+        if not self.supports(objective, operational_constraints):
+            raise ValueError("ISPFlow only solves OF1 without operational constraints")
+        self.instance = load_instance(name)
+        self.data = self.instance.compile()
+        self.max_sessions = max_sessions
+
+        self.x = None
+        self.y = None
+        self.z = None
+        self.t = None
+
+        self.is_optimized = False
+        self._runtime = None
+        self._objective_value = None
+        self._add_variables()
+
+    @staticmethod
+    def supports(objective, operational_constraints: bool = False, bridging=None):
+        return objective == "OF1" and not operational_constraints and not bridging
+
+    def _add_variables(self):
+        data = self.data
+        interpreters = range(data.n_interpreters)
+        sessions = range(data.n_sessions)
+
+        # Same keys as the variables of ISP
+        self.x = {(i, s): _Value() for i in interpreters for s in sessions}
+        self.y = {(s, p): _Value() for s in sessions for p in data.session_pairs(s)}
+        self.z = {(i, s, p): _Value() for (s, p) in self.y for i in data.eligible_interpreters(p)}
+        self.t = {s: _Value() for s in sessions}
+
+    def _solve_per_block(self):
+        data = self.data
+        matching = []
+        for b in range(data.n_blocks):
+            pairs = [(s, p) for s in data.block_sessions(b) for p in data.session_pairs(s)]
+            adjacency = [[] for _ in range(data.n_interpreters)]
+            for k, (s, p) in enumerate(pairs):
+                for i in data.eligible_interpreters(p):
+                    adjacency[i].append(k)
+            match_left = hopcroft_karp(adjacency, len(pairs))
+            matching.extend((i, *pairs[k]) for i, k in enumerate(match_left) if k != -1)
+        return matching
+
+    def _solve_with_cap(self):
+        data = self.data
+        pairs = list(self.y)
+
+        # Nodes: source, interpreters, (interpreter, block) slots, pairs, sink
+        source = 0
+        interpreter_node = 1
+        slot_node = interpreter_node + data.n_interpreters
+        pair_node = slot_node + data.n_interpreters * data.n_blocks
+        sink = pair_node + len(pairs)
+
+        edges = [(source, interpreter_node + i, self.max_sessions) for i in range(data.n_interpreters)]
+        edges += [(interpreter_node + i, slot_node + i * data.n_blocks + b, 1)
+                  for i in range(data.n_interpreters) for b in range(data.n_blocks)]
+        assignment_edges = []
+        for k, (s, p) in enumerate(pairs):
+            b = int(data.session_block[s])
+            for i in data.eligible_interpreters(p):
+                assignment_edges.append((i, s, p))
+                edges.append((slot_node + i * data.n_blocks + b, pair_node + k, 1))
+        first_assignment = len(edges) - len(assignment_edges)
+        edges += [(pair_node + k, sink, 1) for k in range(len(pairs))]
+
+        flow = max_flow(sink + 1, edges, source, sink)
+        return [assignment for k, assignment in enumerate(assignment_edges) if flow[first_assignment + k] > 0]
+
+    def optimize(self):
+        start = time.perf_counter()
+        matching = self._solve_per_block() if self.max_sessions is None else self._solve_with_cap()
+        self._runtime = time.perf_counter() - start
+
+        for i, s, p in matching:
+            self.x[i, s].X = 1.0
+            self.y[s, p].X = 1.0
+            self.z[i, s, p].X = 1.0
+        for s, t in self.t.items():
+            t.X = 1.0 if all(self.y[s, p].X > 0.5 for p in self.data.session_pairs(s)) else 0.0
+
+        self._objective_value = float(len(matching))
+        self.is_optimized = True
+
+    def print_results(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return
+
+        print("\n--- Result ---")
+        print(f"Objective value: {self._objective_value}")
+        for i, s, l1, l2 in self.assignments():
+            print(f"{i} assigned to {s} covers pair ({l1}, {l2})")
+
+    def assignments(self):
+        # Names (interpreter, session, l1, l2) of the pairs covered in the solution
+        data = self.data
+        return [
+            (data.interpreters[i], data.sessions[s], *data.pair_names(p))
+            for (i, s, p), var in self.z.items()
+            if var.X > 0.5
+        ]
+
+    @property
+    def runtime(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return None
+        return self._runtime
+
+    @property
+    def mip_gap(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return None
+        # The matching is optimal by construction
+        return 0.0
+
+    @property
+    def objective_value(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return None
+        return self._objective_value
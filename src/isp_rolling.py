@@ -0,0 +1,211 @@
+import time
+
+import numpy as np
+
+from instance import Instance
+from instance_cache import load_instance
+from isp import ISP
+from heuristics import evaluate, solution_values, upper_bound
+from isp_flow import _Values
+from profiling import _megabytes, _rss
+from rules import BLOCKS_PER_DAY, as_rules
+
+
+class ISPRolling:
+    # ISP solved on a rolling horizon, for schedules of many days: the ISP model of the first window_days days is
+    # solved, the assignments of its first window_days - overlap_days days are fixed, and the window slides to the
+    # first day that is not fixed. The operational rules (rules.py) are the only links between blocks, so each window
+    # gets the rows of the rules that overlap its blocks, restricted to them, with the sessions of the fixed blocks
+    # of a row taken from its limit (for the default rules: the sessions of an interpreter so far count in its 15,
+    # and its assignments in the last 3 fixed blocks in the windows of 4 blocks overlapping them).
+    # Each window is a model of its own, so the memory and time of a step do not grow with the horizon. The fixed
+    # assignments are yielded by steps() as soon as their days are fixed, and written to stream (a file) if given.
+    # The solution is feasible for ISP, but not optimal: the gap is to the bound of the static analysis.
+
+    def __init__(self, name, objective, operational_constraints: bool = False, window_days=2, overlap_days=1,
+                 blocks_per_day=None, threads=None, time_limit=None, backend: str = "gurobi",
+                 stream=None):
+        if objective not in ("OF1", "OF2"):
+            raise ValueError("Objective function must be either 'OF1' or 'OF2', got: " + objective)
+        if not 0 <= overlap_days < window_days:
+            raise ValueError(f"The overlap must be at least 0 and less than the window ({window_days} days), "
+                             f"got: {overlap_days}")
+        self.instance = load_instance(name)
+        self.data = self.instance.compile()
+        self.objective = objective
+        self.operational_constraints = operational_constraints
+        self.rules = as_rules(operational_constraints)
+        # Days of the rules by default
+        if blocks_per_day is None:
+            blocks_per_day = self.rules.blocks_per_day if self.rules is not None else BLOCKS_PER_DAY
+        self.window_blocks = window_days * blocks_per_day
+        self.step_blocks = (window_days - overlap_days) * blocks_per_day
+        # Solver, Gurobi threads and time limit of each window (the ISP defaults when None)
+        self.backend = backend
+        self.threads = threads
+        self.time_limit = time_limit
+        self.stream = stream
+
+        self.x = _Values()
+        self.y = _Values()
+        self.z = _Values()
+        self.t = _Values()
+
+        self.is_optimized = False
+        self._runtime = None
+        self._objective_value = None
+        self._bound = None
+        # Blocks, size, times and peak memory of each window
+        self.history = []
+
+    @staticmethod
+    def supports(objective, operational_constraints: bool = False, bridging=None):
+        return not bridging
+
+    def steps(self):
+        # Solves the windows one after the other, and yields the fixed assignments (interpreter, session, pair ids)
+        # of each one with its measures
+        data = self.data
+        n_interpreters, n_blocks = data.n_interpreters, data.n_blocks
+        # Rows of the rules over all the blocks, and fixed_before[i, b] the sessions of interpreter i before block b
+        groups = self.rules.compile(n_blocks, data.interpreters) if self.rules is not None else {}
+        fixed_before = np.zeros((n_interpreters, n_blocks + 1))
+        first = 0
+        while first < n_blocks:
+            last = min(first + self.window_blocks, n_blocks)
+            fixed = n_blocks if last == n_blocks else first + self.step_blocks
+            blocks = list(range(first, last))
+            sessions = np.array([s for b in blocks for s in data.block_sessions(b)], dtype=np.int64)
+
+            rss, start = _rss(), time.perf_counter()
+            window = self._window(blocks, groups, fixed_before)
+            build_time = time.perf_counter() - start
+            window.optimize()
+            window_rss = _rss() - rss
+            sub = window.data
+            # A window stopped by its time limit without any solution fixes no assignment
+            selected = window.z.X > 0.5 if window.result.sol_count else np.zeros(len(window.z), dtype=bool)
+            z_i, z_s, z_p = (k[selected] for k in window.z.keys_array)
+            kept = sub.session_block[z_s] < fixed - first
+            z = np.stack([z_i[kept], sessions[z_s[kept]], z_p[kept]], axis=1)
+            step = {
+                "blocks": [first, last],
+                "fixed_blocks": [first, fixed],
+                "variables": window.model.NumVars,
+                "constraints": window.model.NumConstrs,
+                "build_time": build_time,
+                "solve_time": window.runtime,
+                "window_objective": window.objective_value if window.result.sol_count else None,
+                "mip_gap": window.mip_gap if window.result.sol_count else None,
+                # Memory taken by the window model while it is solved
+                "window_rss_mb": _megabytes(window_rss),
+            }
+            window.model.dispose()
+            # Resident memory once the window is freed, which stays flat across the steps unless memory is kept
+            step["rss_mb"] = _megabytes(_rss())
+
+            # Only the assignments covering a pair are kept, an interpreter assigned without covering any is free
+            assigned = np.unique(z[:, :2], axis=0)
+            blocks_of = data.session_block[assigned[:, 1]]
+            counts = np.zeros((n_interpreters, fixed - first))
+            np.add.at(counts, (assigned[:, 0], blocks_of - first), 1)
+            fixed_before[:, first + 1:fixed + 1] = fixed_before[:, first, None] + np.cumsum(counts, axis=1)
+            first = fixed
+            yield z, step
+
+    def _window(self, blocks, groups, fixed_before):
+        # ISP model of the blocks, with the rows of the rules restricted to them
+        data = self.data
+        first, last = blocks[0], blocks[-1] + 1
+        instance = Instance.from_compiled(f"{self.instance.name}[{data.blocks[first]}:{data.blocks[last - 1]}]",
+                                          data.subset(blocks))
+        window = ISP(instance, self.objective, backend=self.backend)
+        window.model.setParam("OutputFlag", 0)
+        if self.threads is not None:
+            window.model.setParam("Threads", self.threads)
+        if self.time_limit is not None:
+            window.model.setParam("TimeLimit", self.time_limit)
+        if not groups:
+            return window
+
+        clipped = {}
+        for name, rows in groups.items():
+            row_i, starts, ends, limits = (row[(rows[1] < last) & (rows[2] > first)] for row in rows)
+            # The sessions of the row in the fixed blocks, before this window, count in its limit
+            carried = fixed_before[row_i, first] - fixed_before[row_i, np.minimum(starts, first)]
+            clipped[name] = (row_i, np.maximum(starts, first) - first, np.minimum(ends, last) - first,
+                             np.maximum(limits - carried, 0.0))
+        self.rules.add_constraints(window.builder, window.x, window.data, clipped)
+        window.model.update()
+        return window
+
+    def optimize(self):
+        start = time.perf_counter()
+        parts = []
+        self.history = []
+        for z, step in self.steps():
+            parts.append(z)
+            self.history.append(step)
+            if self.stream is not None:
+                for i, s, l1, l2 in self._names(z):
+                    self.stream.write(f"{i},{s},{l1},{l2}\n")
+                self.stream.flush()
+        self._runtime = time.perf_counter() - start
+
+        z = np.concatenate(parts) if parts else np.zeros((0, 3), dtype=np.int64)
+        self._objective_value = evaluate(self.data, self.objective, z)
+        self._bound = upper_bound(self.data, self.objective, self.operational_constraints)
+        self.x, self.y, self.z, self.t = solution_values(self.data, z)
+        self.is_optimized = True
+
+    def _names(self, z):
+        data = self.data
+        return [(data.interpreters[i], data.sessions[s], *data.pair_names(p)) for (i, s, p) in np.asarray(z).tolist()]
+
+    def print_results(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return
+
+        print("\n--- Result ---")
+        print(f"Objective value: {self._objective_value} (upper bound: {self._bound})")
+        for step in self.history:
+            print(f"Blocks {step['fixed_blocks'][0]} to {step['fixed_blocks'][1] - 1} fixed: {step['variables']} "
+                  f"variables, solved in {step['solve_time']:.2f}s")
+        for i, s, l1, l2 in self.assignments():
+            print(f"{i} assigned to {s} covers pair ({l1}, {l2})")
+
+    def assignments(self):
+        # Names (interpreter, session, l1, l2) of the pairs covered in the solution
+        data = self.data
+        return [(data.interpreters[i], data.sessions[s], *data.pair_names(p)) for (i, s, p) in self.z]
+
+    @property
+    def runtime(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return None
+        return self._runtime
+
+    @property
+    def bound(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return None
+        return self._bound
+
+    @property
+    def mip_gap(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return None
+        if self._objective_value == 0:
+            return 0.0 if self._bound == 0 else float("inf")
+        return abs(self._bound - self._objective_value) / abs(self._objective_value)
+
+    @property
+    def objective_value(self):
+        if not self.is_optimized:
+            print("Model has not been optimized yet. Call optimize() first.")
+            return None
+        return self._objective_value
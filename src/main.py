@@ -1,7 +1,12 @@
 from argparse import ArgumentParser
-from isp import ISP
-from isp_bridge import ISPBridge
-import matplotlib.pyplot as plt
+from models import build_model, SOLVERS
+from backends import BACKENDS
+from rules import Rules
+from incremental import FORMULATIONS
+from solution import Solution
+from solution_cache import DEFAULT_MAX_BYTES, SolutionCache, cache_options, default_cache_dir
+import json
+import os
 import numpy as np
 
 parser = ArgumentParser()
@@ -11,7 +16,55 @@ group.add_argument("--OF1", action="store_true", help="Use objective function OF
 group.add_argument("--OF2", action="store_true", help="Use objective function OF2")
 
 parser.add_argument("--oper-constr", action="store_true", help="Use operational constraints", default=False)
-parser.add_argument("--bridging", action="store_true", help="Use bridging constraints", default=False)
+parser.add_argument("--rules", type=str, default=None, metavar="FILE",
+                    help="JSON file of operational rules replacing the default ones (implies --oper-constr, see "
+                         "rules.py)")
+parser.add_argument("--bridging", nargs="?", const="pairwise", choices=["pairwise", "compact", "columns"],
+                    default=None,
+                    help="Use bridging constraints, with one variable per pair of interpreters (pairwise, the default) "
+                         "or with per-interpreter half-links (compact) or with the pairwise relays generated by column "
+                         "generation (columns)")
+parser.add_argument("--formulation", choices=FORMULATIONS, default="current",
+                    help="Formulation of the Gurobi models: as described (current), without the rows implied by the "
+                         "others (minimal), or with valid inequalities from the static analysis (strengthened)")
+parser.add_argument("--no-tuning", action="store_true", default=False,
+                    help="Keep the Gurobi defaults instead of the parameters tuned for the class of the instance "
+                         "(tuning.py)")
+parser.add_argument("--solver", choices=SOLVERS, default="auto",
+                    help="Gurobi model (mip), combinatorial max-flow solver (flow, OF1 without operational constraints "
+                         "nor bridging only), flow whenever possible (auto, the default) or one Gurobi model per block "
+                         "solved in parallel (decomposed, no bridging, Lagrangian bounds with operational constraints) "
+                         "or the greedy and local search heuristic alone (heuristic, no bridging) or the Gurobi model "
+                         "with the interpreters speaking the same languages grouped (aggregated, no bridging) or ISP "
+                         "solved on a rolling horizon of a few days at a time (rolling, no bridging)")
+parser.add_argument("--backend", choices=BACKENDS, default="gurobi",
+                    help="Solver of the Gurobi models (--solver mip, the default with another backend than gurobi): "
+                         "Gurobi, HiGHS (through SciPy) or OR-Tools CP-SAT, all solving the same formulation")
+parser.add_argument("--window-days", type=int, default=2,
+                    help="Days of each window with --solver rolling (8 blocks a day)")
+parser.add_argument("--overlap-days", type=int, default=1,
+                    help="Last days of each window solved again in the next one with --solver rolling")
+parser.add_argument("--stream", type=str, default=None, metavar="FILE",
+                    help="With --solver rolling: write the assignments to FILE (CSV) as soon as their days are fixed")
+parser.add_argument("--warm-start", action="store_true", default=False,
+                    help="Start the Gurobi models from the heuristic solution")
+parser.add_argument("--lexicographic", action="store_true", default=False,
+                    help="Gurobi models only: maximize the chosen objective first, then the other one")
+parser.add_argument("--tolerance", type=float, default=0.0,
+                    help="Relative loss of the first objective allowed while the second one is maximized "
+                         "(with --lexicographic)")
+parser.add_argument("--profile", nargs="?", const="-", default=None, metavar="FILE",
+                    help="Gurobi models only (--solver mip): write the time and memory of each build phase and "
+                         "family, the presolve statistics and the incumbent/bound trajectory as JSON to FILE "
+                         "(standard output without FILE)")
+parser.add_argument("--save-solution", type=str, default=None, metavar="FILE",
+                    help="Write the assignments and bridges of the solution to FILE, as JSON (.json) or CSV")
+parser.add_argument("--solution-cache", nargs="?", const="", default=None, metavar="DIR",
+                    help="Return the cached solution of the instance when it is proven optimal, else start the Gurobi "
+                         "models from the closest cached one, and cache the solution found (in DIR, default: "
+                         "solutions/ in the instance cache directory)")
+parser.add_argument("--solution-cache-size", type=float, default=DEFAULT_MAX_BYTES / 2 ** 20, metavar="MB",
+                    help="Size of the solution cache above which the least recently used solutions are removed")
 parser.add_argument("--plot", action="store_true", help="Plot results", default=False)
 
 def determine_objective(args):
@@ -28,53 +81,93 @@ def random_light_color():
 if __name__ == "__main__":
     args = parser.parse_args()
     objective = determine_objective(args)
-    if not args.bridging:
-        model = ISP(args.instance, objective, args.oper_constr)
-    else:
-        model = ISPBridge(args.instance, objective, args.oper_constr)
-    print("Model is built")
-    model.optimize()
-
-    print(f"Objective value: {model.objective_value}")
-    print(f"MIP gap: {model.mip_gap:.4%}")
-    print(f"Runtime: {model.runtime:.2f}")
+    # The sessions that can never be fully covered are pruned with OF2, unless OF1 is optimized after it
+    if args.stream is not None and args.solver != "rolling":
+        parser.error("--stream needs --solver rolling")
+    stream = open(args.stream, "w") if args.stream is not None else None
+    operational_constraints = Rules.load(args.rules) if args.rules else args.oper_constr
+    cache, solution = None, None
+    if args.solution_cache is not None:
+        if args.lexicographic:
+            parser.error("--solution-cache does not support --lexicographic")
+        cache = SolutionCache(args.solution_cache or default_cache_dir(os.path.dirname(args.instance)),
+                              int(args.solution_cache_size * 2 ** 20))
+        options = cache_options(objective, operational_constraints, args.bridging, args.formulation)
+        cached = cache.optimal(args.instance, options)
+        if cached is not None:
+            # Proven optimal for this instance and these options: nothing to build nor solve
+            print(f"Optimal solution read from the solution cache (found in {cached.runtime:.2f}s)")
+            print(f"Objective value: {cached.objective_value}")
+            solution = cached.solution
+
+    if solution is None:
+        model = build_model(args.instance, objective, operational_constraints, args.bridging, args.solver,
+                            args.warm_start, prune=not args.lexicographic, profile=args.profile is not None,
+                            backend=args.backend, window_days=args.window_days, overlap_days=args.overlap_days,
+                            stream=stream, formulation=args.formulation, tuned=not args.no_tuning)
+        if args.profile is not None and not hasattr(model, "profile"):
+            parser.error("--profile needs a Gurobi model (--solver mip)")
+        if args.lexicographic:
+            if not hasattr(model, "set_lexicographic"):
+                parser.error("--lexicographic needs a Gurobi model (--solver mip)")
+            model.set_lexicographic([objective, "OF2" if objective == "OF1" else "OF1"], reltol=args.tolerance)
+        if cache is not None:
+            # Replaces the heuristic start of --warm-start
+            source = cache.start(model, args.instance, options)
+            if source is not None:
+                print(f"MIP start from the cached solution of {source}")
+        if getattr(model, "tuning", None) is not None:
+            print(f"Gurobi parameters tuned for {model.tuning}")
+        print("Model is built")
+        model.optimize()
+        if stream is not None:
+            stream.close()
+
+        print(f"Objective value: {model.objective_value}")
+        if args.lexicographic:
+            print(f"Objective values: {model.objective_values}")
+        if hasattr(model, "upper_bound"):
+            print(f"Upper bound: {model.upper_bound}")
+        print(f"MIP gap: {model.mip_gap:.4%}")
+        print(f"Runtime: {model.runtime:.2f}")
+
+        if args.profile == "-":
+            print(json.dumps(model.profile(), indent=2))
+        elif args.profile is not None:
+            with open(args.profile, "w") as f:
+                json.dump(model.profile(), f, indent=2)
+        if cache is not None:
+            cache.put(model, args.instance, options)
+
+        # Assignments, bridges and coverage read once from the solution, for the plot and the solution file
+        if args.plot or args.save_solution is not None:
+            solution = Solution.from_model(model)
+    if args.save_solution is not None:
+        solution.save(args.save_solution)
 
 
     if args.plot:
-        instance = model.instance
-        interpreters = instance.interpreters
-        sessions = instance.sessions
-        blocks = instance.blocks
+        # Only imported for the plot, it takes longer to load than most small instances take to solve
+        import matplotlib.pyplot as plt
+
+        data = solution.data
 
         fig, ax = plt.subplots(figsize=(12, 8))
-        for b in instance.sessions_per_block:
-            number_of_sessions = len(instance.sessions_per_block[b])
-            current = 0
-            width = 1 / number_of_sessions if number_of_sessions > 0 else 0
-            for s in instance.sessions_per_block[b]:
+        for b in range(data.n_blocks):
+            block_sessions = data.block_sessions(b)
+            width = 1 / len(block_sessions) if block_sessions else 0
+            day = b // 8
+            hour = 8 + b % 8
+            for k, s in enumerate(block_sessions):
+                current = k * width
                 # randomly assign a color to each session
-                day = blocks.index(b) // 8
-                hour = 8 + (blocks.index(b) % 8)
                 ax.broken_barh([(day + current, width)], (hour, 1), color=random_light_color())
-                ax.text(day + current, hour+0.15, f"{s}", fontsize=8, color='black')
-                current += width
-
-                assigned_interpreters = set(
-                    i for (i2, s2, l1, l2) in model.z.keys()
-                    if s2 == s and model.z[i2, s2, l1, l2].X > 0.5
-                    for i in [i2]
-                )
-                if args.bridging:
-                    assigned_interpreters.union(
-                        i for (i1, i2, s2, l1, l2, lp) in model.w.keys()
-                        if s2 == s and model.w[i1, i2, s2, l1, l2, lp].X > 0.5
-                        for i in [i1, i2]
-                    )
-
-                interps = [i.split()[-1] for i in assigned_interpreters]
+                ax.text(day + current, hour+0.15, f"{data.sessions[s]}", fontsize=8, color='black')
+
+                interps = [data.interpreters[i].split()[-1] for i in solution.session_interpreters(s).tolist()]
                 label = ', '.join(interps[:2]) + (f' +{len(interps) - 2}' if len(interps) > 2 else '')
 
-                ax.text(day + current - width / 2, hour + 0.5, label.strip(), fontsize=8, color='black', ha='center')
+                ax.text(day + current + width / 2, hour + 0.5, label.strip(), fontsize=8, color='black', ha='center')
 
         ax.set_xticks([i + 0.5 for i in range(5)])
         ax.set_xticklabels(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday'])
@@ -0,0 +1,219 @@
+from collections.abc import Mapping
+
+import gurobipy as gp
+import numpy as np
+import scipy.sparse as sp
+
+from profiling import Profiler
+
+
+def csr_expand(ptr, indices, rows):
+    # Every item of the CSR rows `rows` (duplicates allowed), returned as (position in rows, item) arrays
+    rows = np.asarray(rows, dtype=np.int64)
+    counts = ptr[rows + 1] - ptr[rows]
+    owner = np.repeat(np.arange(len(rows)), counts)
+    offsets = np.arange(owner.size) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, indices[np.repeat(ptr[rows], counts) + offsets]
+
+
+def concatenate_keys(parts, n_keys):
+    # Concatenates a list of key tuples, each a tuple of n_keys arrays, into a single tuple of arrays
+    if not parts:
+        return tuple(np.zeros(0, dtype=np.int64) for _ in range(n_keys))
+    return tuple(np.concatenate(k) for k in zip(*parts))
+
+
+class VariableFamily(Mapping):
+    # Variables of one family (x, y, z, ...), added to the model as a single MVar. keys is a tuple of integer arrays,
+    # keys[d][k] being the d-th index of the k-th variable. It reads like the tupledict returned by addVars, but the
+    # dictionary is only materialized on first lookup, bulk accesses go through the arrays and the MVar.
+    # A family extended after the model is built (see MatrixBuilder.add_variables) is made of several MVars, bulk
+    # attributes are then read and written with get and set.
+    # When the model is solved by another backend than Gurobi (see backends.py), X is read from its solution.
+    def __init__(self, mvar, keys, start):
+        self.parts = [mvar]
+        self.keys_array = tuple(np.asarray(k) for k in keys)
+        self.start = start
+        self.solution = None
+        self._columns = None
+        self._mvar = mvar
+        self._index = None
+        self._dict = None
+
+    @property
+    def mvar(self):
+        if self._mvar is None:
+            self._mvar = gp.MVar.fromlist([v for part in self.parts for v in part.tolist()])
+        return self._mvar
+
+    @property
+    def columns(self):
+        # Column of each variable in the model, contiguous unless the family has been extended
+        if self._columns is not None:
+            return self._columns
+        return self.start + np.arange(len(self))
+
+    def extend(self, mvar, keys, start):
+        # Appends the variables of mvar (columns start to start + len(mvar) - 1) to the family
+        self._columns = np.concatenate([self.columns, start + np.arange(len(keys[0]))])
+        self.parts.append(mvar)
+        self.keys_array = tuple(np.concatenate([k, np.asarray(q, dtype=k.dtype)])
+                                for k, q in zip(self.keys_array, keys))
+        self._mvar = None
+        self._index = None
+        self._dict = None
+        self.solution = None
+
+    def get(self, attr, positions=None):
+        # Values of a Gurobi attribute (X, UB, Start, ...) for the whole family, or at the given positions
+        if attr == "X" and self.solution is not None:
+            return self.solution if positions is None else self.solution[positions]
+        values = np.concatenate([np.atleast_1d(getattr(part, attr)) for part in self.parts if part.size])\
+            if len(self) else np.zeros(0)
+        return values if positions is None else values[positions]
+
+    def set(self, attr, values, positions=None):
+        positions = np.arange(len(self)) if positions is None else np.asarray(positions, dtype=np.int64)
+        values = np.broadcast_to(np.asarray(values, dtype=float), positions.shape)
+        offset = 0
+        for part in self.parts:
+            inside = (positions >= offset) & (positions < offset + part.size)
+            if inside.any():
+                setattr(part[positions[inside] - offset], attr, values[inside])
+            offset += part.size
+
+    def var(self, position):
+        # The Gurobi variable at the given position
+        for part in self.parts:
+            if position < part.size:
+                return part[position].item()
+            position -= part.size
+        raise IndexError(position)
+
+    @property
+    def X(self):
+        return self.get("X")
+
+    def positions(self, keys, strict=True):
+        # Position in the family of each key, keys being a tuple of index arrays like keys_array. Missing keys raise
+        # a KeyError, or are given the position -1 with strict=False
+        if self._index is None:
+            dims = tuple(int(k.max(initial=-1)) + 1 for k in self.keys_array)
+            own = np.ravel_multi_index(self.keys_array, dims) if len(self) else np.zeros(0, dtype=np.int64)
+            order = np.argsort(own, kind="stable")
+            self._index = (dims, own[order], order)
+        dims, own, order = self._index
+
+        keys = tuple(np.atleast_1d(np.asarray(q, dtype=np.int64)) for q in keys)
+        valid = np.ones(len(keys[0]), dtype=bool)
+        for q, dim in zip(keys, dims):
+            valid &= (q >= 0) & (q < dim)
+        codes = np.ravel_multi_index(tuple(np.where(valid, q, 0) for q in keys), dims) if all(dims) else keys[0] * 0
+        found = np.searchsorted(own, codes)
+        valid &= found < len(own)
+        valid[valid] &= own[found[valid]] == codes[valid]
+        if strict and not valid.all():
+            raise KeyError(tuple(q[~valid][0] for q in keys))
+        return np.where(valid, order[np.minimum(found, len(own) - 1)] if len(own) else -1, -1)
+
+    def _lookup(self):
+        if self._dict is None:
+            keys = [k.tolist() for k in self.keys_array]
+            keys = keys[0] if len(keys) == 1 else zip(*keys)
+            self._dict = gp.tupledict(zip(keys, [v for part in self.parts for v in part.tolist()]))
+        return self._dict
+
+    def __getitem__(self, key):
+        return self._lookup()[key]
+
+    def __iter__(self):
+        return iter(self._lookup())
+
+    def __len__(self):
+        return len(self.keys_array[0])
+
+
+class MatrixBuilder:
+    # Adds variables and constraints to a Gurobi model one family at a time: a constraint family is given as
+    # (row, column, coefficient) NumPy arrays, assembled into a SciPy sparse matrix and added with addMConstr.
+    # Columns are numbered in the order the variable families are added. Names are only generated with names=True,
+    # as building them is a large part of the construction time. Each family is measured by profiler, if enabled.
+    def __init__(self, model, names: bool = False, profiler=None):
+        self.model = model
+        self.names = names
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.n_columns = 0
+        self.families = {}
+        self.constraints = {}
+        self.solution = None
+
+    def add_variables(self, name, keys, vtype, lb=0.0, ub=None, obj=0.0):
+        # A family that already exists is extended with the new keys
+        size = len(keys[0])
+        with self.profiler.family(name, "variables", variables=size, first_column=self.n_columns):
+            return self._add_variables(name, keys, vtype, lb, ub, obj, size)
+
+    def _add_variables(self, name, keys, vtype, lb, ub, obj, size):
+        mvar = self.model.addMVar(size, lb=lb, ub=float("inf") if ub is None else ub, obj=obj, vtype=vtype)
+        if name in self.families:
+            family = self.families[name]
+            family.extend(mvar, keys, self.n_columns)
+        else:
+            family = VariableFamily(mvar, keys, self.n_columns)
+            self.families[name] = family
+        self.n_columns += size
+        if self.names and size:
+            self.model.update()
+            labels = [",".join(map(str, key)) for key in zip(*(np.asarray(k).tolist() for k in keys))]
+            self.model.setAttr("VarName", mvar.tolist(), [f"{name}[{label}]" for label in labels])
+        return family
+
+    def set_solution(self, x):
+        # Values of the columns found by another backend than Gurobi, None to read them from the Gurobi model
+        self.solution = x
+        for family in self.families.values():
+            family.solution = None if x is None else x[family.columns]
+
+    def values(self):
+        # Values of all the columns in the solution, read from Gurobi in a single getAttr call
+        if self.solution is not None and len(self.solution) == self.n_columns:
+            return self.solution
+        return np.array(self.model.getAttr("X", self.model.getVars()), dtype=float)
+
+    def variables(self, columns):
+        # Gurobi variables of the given model columns
+        columns = np.asarray(columns, dtype=np.int64)
+        variables = [None] * len(columns)
+        for family in self.families.values():
+            own = family.columns
+            if not len(own):
+                continue
+            positions = np.minimum(np.searchsorted(own, columns), len(own) - 1)
+            for k in np.flatnonzero(own[positions] == columns).tolist():
+                variables[k] = family.var(int(positions[k]))
+        return variables
+
+    def add_constraints(self, name, n_rows, rows, columns, values, sense, rhs, row_names=None):
+        # row_names(k) gives the name of the k-th row, it is only called with names=True
+        if n_rows == 0:
+            return None
+        with self.profiler.family(name, "constraints", rows=n_rows, nonzeros=len(rows)):
+            return self._add_constraints(name, n_rows, rows, columns, values, sense, rhs, row_names)
+
+    def _add_constraints(self, name, n_rows, rows, columns, values, sense, rhs, row_names):
+        self.model.update()
+        rows = np.asarray(rows)
+        values = np.broadcast_to(np.asarray(values, dtype=float), rows.shape)
+        matrix = sp.csr_matrix(
+            (values, (rows, np.asarray(columns))),
+            shape=(n_rows, self.n_columns)
+        )
+        # A writable array: addMConstr rejects read-only buffers, such as a broadcast scalar right-hand side
+        rhs = np.array(np.broadcast_to(np.asarray(rhs, dtype=float), n_rows))
+        constraints = self.model.addMConstr(matrix, None, sense, rhs)
+        self.constraints[name] = constraints
+        if self.names:
+            self.model.update()
+            names = [row_names(k) for k in range(n_rows)] if row_names else [f"{name}[{k}]" for k in range(n_rows)]
+            self.model.setAttr("ConstrName", constraints.tolist(), names)
+        return constraints
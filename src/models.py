@@ -0,0 +1,69 @@
+from isp import ISP
+from isp_bridge import ISPBridge
+from isp_bridge_compact import ISPBridgeCompact
+from isp_bridge_columns import ISPBridgeColumns
+from isp_flow import ISPFlow
+from isp_decomposed import ISPDecomposed
+from heuristics import ISPHeuristic
+from isp_aggregated import ISPAggregated
+from isp_rolling import ISPRolling
+
+SOLVERS = ["auto", "mip", "flow", "decomposed", "heuristic", "aggregated", "rolling"]
+
+
+def build_model(name, objective, operational_constraints: bool = False, bridging=None, solver="auto",
+                warm_start: bool = False, prune: bool = True, profile: bool = False, backend: str = "gurobi",
+                window_days=2, overlap_days=1, stream=None, formulation="current", tuned=True):
+    # operational_constraints is a bool (the default rules) or Rules (see rules.py).
+    # solver is "mip" for the Gurobi models, "flow" for the combinatorial ISPFlow solver, or "auto" to use ISPFlow
+    # whenever the options allow it (OF1, no operational constraints, no bridging), or "decomposed" to solve ISP
+    # one block at a time in parallel (ISPDecomposed), or "heuristic" for the greedy and local search solution alone
+    # (ISPHeuristic), or "aggregated" for the Gurobi model with identical interpreters grouped (ISPAggregated).
+    # warm_start=True gives the Gurobi models (mip, aggregated) the heuristic solution as MIP start, prune=False keeps
+    # the variables of the sessions that can never be fully covered in the mip models with OF2 (see analysis.py), and
+    # profile=True records the build and solve measures of the mip models (see profiling.py). backend is the solver of
+    # the mip models, gurobi or highs or cpsat (see backends.py): with another one than gurobi, auto means mip.
+    # "rolling" solves ISP on a rolling horizon of window_days days, fixing all but the last overlap_days days of each
+    # window (ISPRolling), its assignments being written to the stream file as they are fixed.
+    # formulation is the formulation of the mip models: current, minimal or strengthened (see incremental.py), auto
+    # still choosing ISPFlow when it can. tuned=False keeps the Gurobi defaults instead of the parameters tuned for the
+    # class of the instance (see tuning.py)
+    if formulation != "current" and solver not in ("auto", "mip"):
+        raise ValueError(f"Only the mip models have several formulations, got solver: {solver}")
+    if backend != "gurobi" and solver not in ("auto", "mip", "rolling"):
+        raise ValueError(f"The {backend} backend only solves the mip and rolling models, got solver: {solver}")
+    if solver == "flow" or (solver == "auto" and backend == "gurobi"
+                            and ISPFlow.supports(objective, operational_constraints, bridging)):
+        if bridging:
+            raise ValueError("ISPFlow does not support bridging")
+        return ISPFlow(name, objective, operational_constraints)
+    if solver == "decomposed":
+        if bridging:
+            raise ValueError("ISPDecomposed does not support bridging")
+        return ISPDecomposed(name, objective, operational_constraints)
+    if solver == "heuristic":
+        if bridging:
+            raise ValueError("ISPHeuristic does not support bridging")
+        return ISPHeuristic(name, objective, operational_constraints)
+    if solver == "aggregated":
+        if bridging:
+            raise ValueError("ISPAggregated does not support bridging")
+        return ISPAggregated(name, objective, operational_constraints, warm_start=warm_start)
+    if solver == "rolling":
+        if bridging:
+            raise ValueError("ISPRolling does not support bridging")
+        return ISPRolling(name, objective, operational_constraints, window_days, overlap_days, backend=backend,
+                          stream=stream)
+    if solver not in SOLVERS:
+        raise ValueError(f"Solver must be one of {SOLVERS}, got: {solver}")
+
+    options = {"warm_start": warm_start, "prune": prune, "profile": profile, "backend": backend,
+               "formulation": formulation, "tuned": tuned}
+    if not bridging:
+        return ISP(name, objective, operational_constraints, **options)
+    elif bridging == "compact":
+        return ISPBridgeCompact(name, objective, operational_constraints, **options)
+    elif bridging == "columns":
+        return ISPBridgeColumns(name, objective, operational_constraints, **options)
+    else:
+        return ISPBridge(name, objective, operational_constraints, **options)
@@ -0,0 +1,188 @@
+from contextlib import contextmanager, nullcontext
+import resource
+import time
+import tracemalloc
+
+from gurobipy import GRB
+import numpy as np
+
+# Number of the constraint families in the model descriptions (isp.py, isp_bridge.py, isp_bridge_compact.py)
+CONSTRAINT_NUMBERS = {
+    "one_session_per_interpreter": 1,
+    "cover_pair": 2,
+    "one_translation_per_session": 3,
+    "one_translation_or_bridge_per_session": 3,
+    "y_impl_z": 4,
+    "t_impl_y": 5,
+    "t_impl_u": 5,
+    "t_impl_all_y": 5,
+    "t_impl_all_u": 5,
+    "max_sessions_per_interpreter": 6,
+    "max_3_consecutive_blocks": 7,
+    "u_impl_y_and_w": 8,
+    "one_bridge_only": 9,
+    "bridge_half": 10,
+}
+
+
+def _megabytes(n_bytes):
+    return round(n_bytes / 2 ** 20, 3)
+
+
+def _rss():
+    # Current resident memory in bytes (Linux), the peak resident memory elsewhere
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _bound(value):
+    # Objective values of the callbacks, None when there is none yet (+-GRB.INFINITY)
+    return None if abs(value) >= GRB.INFINITY else float(value)
+
+
+class Profiler:
+    # Wall time and memory of the build phases of a model (instance load, each _add_* method) and of each family of
+    # variables and constraints (see MatrixBuilder), and the presolve statistics and incumbent/bound trajectory of its
+    # solves, captured from a Gurobi callback. report() returns them as a dictionary ready for JSON.
+    # A disabled profiler records nothing, and adds no callback to the solves.
+    # Memory is the resident memory of the process (current and peak) and the memory used by Gurobi. The peak memory
+    # allocated from Python during each measure is only recorded when tracemalloc is tracing (python -X tracemalloc),
+    # as it slows the build down about 4 times.
+    # callbacks are other Gurobi callbacks (model, where) called during the solves, enabled or not (service.py).
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.model = None
+        self.callbacks = []
+        self.phases = []
+        self.families = []
+        self.solves = []
+        self._peaks = []
+
+    def phase(self, name):
+        # Context manager measuring a build phase
+        if not self.enabled:
+            return nullcontext()
+        return self._measure(self.phases, {"name": name})
+
+    def family(self, name, kind, **counts):
+        # Context manager measuring the creation of a family of variables or constraints (kind), counts being
+        # its size (variables, or rows and nonzeros)
+        if not self.enabled:
+            return nullcontext()
+        record = {"name": name, "kind": kind}
+        if kind == "constraints":
+            record["number"] = CONSTRAINT_NUMBERS.get(name)
+        record.update(counts)
+        return self._measure(self.families, record)
+
+    @contextmanager
+    def _measure(self, records, record):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            # The peak of tracemalloc is shared: it is reset for each measure, and passed on to the enclosing one
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self._peaks.append(0)
+        rss = _rss()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 6)
+            record["rss_mb"] = _megabytes(_rss())
+            record["rss_delta_mb"] = _megabytes(_rss() - rss)
+            # ru_maxrss is in kilobytes on Linux
+            record["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 3)
+            if self.model is not None:
+                record["gurobi_mb"] = round(self.model.MemUsed * 1024, 3)
+            if tracing:
+                peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+                record["python_peak_mb"] = _megabytes(peak)
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+            records.append(record)
+
+    def solve(self, label="mip"):
+        # Context manager measuring a solve, giving its record to fill (None when disabled)
+        if not self.enabled:
+            return nullcontext()
+        return self._measure(self.solves, {"label": label, "presolve": {}, "trajectory": []})
+
+    def optimize(self, model, label="mip"):
+        # Solves model, with the callback recording its presolve statistics and trajectory when enabled
+        if not self.enabled:
+            if self.callbacks:
+                model.optimize(self._call_others)
+            else:
+                model.optimize()
+            return
+        with self.solve(label) as solve:
+            self._solve = solve
+            model.optimize(self._callback)
+        single = model.IsMIP and model.NumObj <= 1
+        solve.update({
+            "status": model.Status,
+            "runtime": model.Runtime,
+            "objective": model.ObjVal if model.SolCount else None,
+            "bound": _bound(model.ObjBound) if single else None,
+            "iterations": model.IterCount,
+            "nodes": model.NodeCount if model.IsMIP else None,
+        })
+        # The final point, also when the solve ends before any callback of the branch and bound
+        self.add_point(solve["trajectory"], model.Runtime, solve["objective"], solve["bound"])
+        if solve["presolve"]:
+            solve["presolve"]["columns"] = model.NumVars - solve["presolve"]["removed_columns"]
+            solve["presolve"]["rows"] = model.NumConstrs - solve["presolve"]["removed_rows"]
+
+    def _call_others(self, model, where):
+        for callback in self.callbacks:
+            callback(model, where)
+
+    def _callback(self, model, where):
+        self._call_others(model, where)
+        solve = self._solve
+        if where == GRB.Callback.PRESOLVE:
+            solve["presolve"] = {
+                "removed_columns": model.cbGet(GRB.Callback.PRE_COLDEL),
+                "removed_rows": model.cbGet(GRB.Callback.PRE_ROWDEL),
+                "sense_changes": model.cbGet(GRB.Callback.PRE_SENCHG),
+                "bound_changes": model.cbGet(GRB.Callback.PRE_BNDCHG),
+                "coefficient_changes": model.cbGet(GRB.Callback.PRE_COECHG),
+            }
+        elif where in (GRB.Callback.MIP, GRB.Callback.MIPSOL):
+            if where == GRB.Callback.MIP:
+                incumbent = model.cbGet(GRB.Callback.MIP_OBJBST)
+                bound = model.cbGet(GRB.Callback.MIP_OBJBND)
+            else:
+                incumbent = model.cbGet(GRB.Callback.MIPSOL_OBJBST)
+                bound = model.cbGet(GRB.Callback.MIPSOL_OBJBND)
+            self.add_point(solve["trajectory"], model.cbGet(GRB.Callback.RUNTIME), _bound(incumbent), _bound(bound))
+
+    @staticmethod
+    def add_point(trajectory, runtime, incumbent, bound):
+        # Only the changes of the incumbent or of the bound are kept
+        if not trajectory or (trajectory[-1]["incumbent"], trajectory[-1]["bound"]) != (incumbent, bound):
+            trajectory.append({"time": round(runtime, 6), "incumbent": incumbent, "bound": bound})
+
+    def report(self, builder):
+        # Everything recorded, with the nonzeros of each variable family and the size of the model
+        model = builder.model
+        model.update()
+        families = [dict(record) for record in self.families]
+        if families:
+            column_nonzeros = np.diff(model.getA().tocsc().indptr)
+            for record in families:
+                if record["kind"] == "variables":
+                    start = record.pop("first_column")
+                    record["nonzeros"] = int(column_nonzeros[start:start + record["variables"]].sum())
+        return {
+            "phases": self.phases,
+            "families": families,
+            "size": {"variables": model.NumVars, "constraints": model.NumConstrs, "nonzeros": model.NumNZs},
+            "solves": self.solves,
+        }
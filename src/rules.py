@@ -0,0 +1,186 @@
+import json
+
+import numpy as np
+
+# Blocks of a day, as in the timetable of main.py (8h to 16h)
+BLOCKS_PER_DAY = 8
+
+# Constraints 6 and 7 of the model: at most 15 sessions per interpreter, and at most 3 sessions in any 4 consecutive
+# blocks, whether or not they are on the same day
+DEFAULT_RULES = [
+    {"type": "max_sessions", "limit": 15},
+    {"type": "max_consecutive", "limit": 3, "across_days": True},
+]
+RULE_TYPES = ["max_sessions", "max_consecutive", "max_per_day", "break"]
+
+
+def as_rules(operational_constraints):
+    # The operational constraints of the models are either a bool (True for the default rules) or Rules
+    if isinstance(operational_constraints, Rules):
+        return operational_constraints
+    return Rules() if operational_constraints else None
+
+
+def block_index(keys, session_block, n_blocks, n_interpreters):
+    # Prefix index of the (interpreter, session) entries of an x family over the block timeline: order sorts them by
+    # interpreter then block, and the entries of interpreter i in blocks a to e - 1 are order[ptr[i, a]:ptr[i, e]]
+    x_i, x_s = keys
+    sort_keys = x_i.astype(np.int64) * n_blocks + session_block[x_s]
+    order = np.argsort(sort_keys, kind="stable")
+    bounds = np.arange(n_interpreters)[:, None] * n_blocks + np.arange(n_blocks + 1)
+    return order, np.searchsorted(sort_keys[order], bounds)
+
+
+class Rules:
+    # Operational rules, each one a limit on the number of sessions of an interpreter in intervals of consecutive
+    # blocks (a day being blocks_per_day blocks):
+    # - max_sessions: at most limit sessions in all the blocks;
+    # - max_consecutive: at most limit sessions in any limit + 1 consecutive blocks of a day (of any blocks with
+    #   "across_days": true);
+    # - max_per_day: at most limit sessions a day;
+    # - break: at least free (1 by default) of the length blocks from block start of a day (0 being the first one)
+    #   stay free, every day or on the days listed in "days".
+    # A rule applies to every interpreter, or to the ones named in its "interpreters" list, and all rules apply
+    # together. compile() turns them into rows (interpreter, first block, end block, limit), added in bulk to the x
+    # family of a model by add_constraints(). Without rules, the models use DEFAULT_RULES.
+
+    def __init__(self, rules=None, blocks_per_day=BLOCKS_PER_DAY):
+        self.rules = [dict(rule) for rule in (DEFAULT_RULES if rules is None else rules)]
+        self.blocks_per_day = blocks_per_day
+        if blocks_per_day < 1:
+            raise ValueError(f"A day must have at least one block, got: {blocks_per_day}")
+        for rule in self.rules:
+            if rule.get("type") not in RULE_TYPES:
+                raise ValueError(f"Rule type must be one of {RULE_TYPES}, got: {rule.get('type')}")
+            if rule["type"] == "break":
+                start, length = rule.get("start", -1), rule.get("length", 0)
+                if start < 0 or length < 1 or start + length > blocks_per_day:
+                    raise ValueError(f"A break must have a start and a length within the day, got: {rule}")
+                if not 1 <= rule.get("free", 1) <= rule["length"]:
+                    raise ValueError(f"The free blocks of a break must be between 1 and its length, got: {rule}")
+            elif not isinstance(rule.get("limit"), int) or rule["limit"] < 0:
+                raise ValueError(f"A {rule['type']} rule needs a nonnegative integer limit, got: {rule}")
+
+    @classmethod
+    def load(cls, path):
+        # A JSON file of a list of rules, or of {"blocks_per_day": 8, "rules": [...]}
+        with open(path) as f:
+            spec = json.load(f)
+        if isinstance(spec, list):
+            return cls(spec)
+        return cls(spec["rules"], spec.get("blocks_per_day", BLOCKS_PER_DAY))
+
+    @property
+    def is_default(self):
+        return self.rules == DEFAULT_RULES
+
+    def family(self, k):
+        # Name of the constraint family of the k-th rule, those of constraints 6 and 7 for the default rules
+        rule = self.rules[k]
+        name = {
+            "max_sessions": lambda: "max_sessions_per_interpreter",
+            "max_consecutive": lambda: f"max_{rule['limit']}_consecutive_blocks",
+            "max_per_day": lambda: f"max_{rule['limit']}_sessions_per_day",
+            "break": lambda: f"break_{rule['start']}_{rule['length']}",
+        }[rule["type"]]()
+        previous = [self.family(k2) for k2 in range(k)]
+        return name if name not in previous else f"{name}_{previous.count(name) + 1}"
+
+    def intervals(self, rule, n_blocks):
+        # (first block, end block, limit) arrays of the intervals of blocks a rule limits
+        day = self.blocks_per_day
+        days = np.arange(-(-n_blocks // day))
+        day_start, day_end = days * day, np.minimum((days + 1) * day, n_blocks)
+        kind, limit = rule["type"], rule.get("limit")
+        if kind == "max_sessions":
+            starts, ends = np.array([0]), np.array([n_blocks])
+        elif kind == "max_consecutive":
+            if rule.get("across_days", False):
+                starts = np.arange(max(n_blocks - limit, 0))
+            else:
+                starts = np.concatenate([np.arange(a, e - limit) for a, e in zip(day_start, day_end)]
+                                        + [np.zeros(0, dtype=np.int64)])
+            ends = starts + limit + 1
+        elif kind == "max_per_day":
+            starts, ends = day_start, day_end
+        else:
+            if "days" in rule:
+                days = np.array(rule["days"], dtype=np.int64)
+                days = days[days < len(day_start)]
+            starts = days * day + rule["start"]
+            ends = np.minimum(starts + rule["length"], n_blocks)
+            keep = starts < ends
+            starts, ends = starts[keep], ends[keep]
+            limit = ends - starts - rule.get("free", 1)
+        starts = starts.astype(np.int64)
+        return starts, ends.astype(np.int64), np.maximum(np.broadcast_to(limit, starts.shape), 0).astype(float)
+
+    def applies(self, rule, interpreters):
+        # applies[i] is True if the rule applies to interpreter i (interpreters being the names, by id)
+        if "interpreters" not in rule:
+            return np.ones(len(interpreters), dtype=bool)
+        names = set(rule["interpreters"])
+        unknown = names - set(interpreters)
+        if unknown:
+            raise ValueError(f"Unknown interpreters in rule {rule['type']}: {sorted(unknown)}")
+        return np.array([name in names for name in interpreters], dtype=bool)
+
+    def compile(self, n_blocks, interpreters):
+        # Rows of each rule family: (interpreter, first block, end block, limit) arrays, by interpreter then block
+        groups = {}
+        for k, rule in enumerate(self.rules):
+            starts, ends, limits = self.intervals(rule, n_blocks)
+            members = np.flatnonzero(self.applies(rule, interpreters))
+            row_i = np.repeat(members, len(starts))
+            groups[self.family(k)] = (row_i, np.tile(starts, len(members)), np.tile(ends, len(members)),
+                                      np.tile(limits, len(members)))
+        return groups
+
+    def add_constraints(self, builder, x, data, groups=None):
+        # Adds the rows of groups (compile() on data by default) to the model of builder, over its x family keyed by
+        # (interpreter, session). Each row sums the entries of its interpreter between its blocks, read from the
+        # prefix index of the family, so the time is linear in the number of nonzeros. Returns the groups.
+        from gurobipy import GRB
+
+        if groups is None:
+            groups = self.compile(data.n_blocks, data.interpreters)
+        order, ptr = block_index(x.keys_array, data.session_block, data.n_blocks, data.n_interpreters)
+        columns = x.columns[order]
+        for name, (row_i, starts, ends, limits) in groups.items():
+            low = ptr[row_i, starts]
+            counts = ptr[row_i, ends] - low
+            rows = np.repeat(np.arange(len(row_i)), counts)
+            positions = np.repeat(low - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            builder.add_constraints(
+                name, len(row_i), rows, columns[positions], 1.0, GRB.LESS_EQUAL, limits,
+                lambda k, name=name: f"{name}_{row_i[k]}_from_{starts[k]}"
+            )
+        return groups
+
+    def session_caps(self, n_blocks, interpreters):
+        # Most sessions each interpreter can have under the rules: each rule gives the blocks minus, for disjoint
+        # intervals (the earliest ending first), the blocks of the interval beyond its limit
+        caps = np.full(len(interpreters), n_blocks, dtype=np.int64)
+        for rule in self.rules:
+            starts, ends, limits = self.intervals(rule, n_blocks)
+            cap, end = n_blocks, -1
+            for k in np.argsort(ends, kind="stable").tolist():
+                if starts[k] >= end:
+                    cap -= max(int(ends[k] - starts[k] - limits[k]), 0)
+                    end = ends[k]
+            caps = np.where(self.applies(rule, interpreters), np.minimum(caps, cap), caps)
+        return caps
+
+    def check(self, data, z):
+        # Rows violated by the assignments z (rows (i, s, p)), as (family, interpreter, first block, sessions, limit)
+        assigned = np.unique(np.asarray(z, dtype=np.int64).reshape(-1, 3)[:, :2], axis=0)
+        counts = np.zeros((data.n_interpreters, data.n_blocks + 1))
+        np.add.at(counts, (assigned[:, 0], data.session_block[assigned[:, 1]] + 1), 1)
+        prefix = np.cumsum(counts, axis=1)
+        violations = []
+        for name, (row_i, starts, ends, limits) in self.compile(data.n_blocks, data.interpreters).items():
+            sessions = prefix[row_i, ends] - prefix[row_i, starts]
+            for k in np.flatnonzero(sessions > limits).tolist():
+                violations.append((name, int(row_i[k]), int(starts[k]), int(sessions[k]), float(limits[k])))
+        return violations
+
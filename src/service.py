@@ -0,0 +1,480 @@
+from argparse import ArgumentParser
+import asyncio
+import collections
+import itertools
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+import traceback
+
+# Solve service: a long-running process with a pool of worker processes, each one keeping gurobipy, the models, its
+# Gurobi environment and the compiled instances loaded between jobs, so that a job only pays for its build and
+# solve. Clients talk to it over a Unix socket with one JSON object per line: a "solve" request gets back the events
+# of its job ("queued", "started", "progress", then one of "result", "error" or "cancelled"), and "cancel",
+# "status" and "shutdown" requests get back a single reply. This module only imports the standard library at the
+# top, so that the client commands start quickly: the workers import the models themselves.
+
+DEFAULT_SOCKET = os.environ.get("ISP_SERVICE_SOCKET") or os.path.join(tempfile.gettempdir(),
+                                                                      f"isp-service-{os.getuid()}.sock")
+# Options of a solve job and their defaults, the instance being required
+JOB_OPTIONS = {"instance": None, "objective": "OF1", "oper_constr": False, "rules": None, "bridging": None,
+               "solver": "auto", "backend": "gurobi", "formulation": "current", "time_limit": None,
+               "solution": False, "solution_cache": None}
+# Minimum time between two progress events of a job, in seconds
+PROGRESS_INTERVAL = 0.2
+# Time given to a Gurobi solve to stop after a cancellation before its worker is killed, in seconds
+CANCEL_GRACE = 2.0
+
+parser = ArgumentParser(description="Persistent solve service for the ISP models, and its client")
+commands = parser.add_subparsers(dest="command", required=True)
+serve = commands.add_parser("serve", help="Run the service")
+serve.add_argument("--workers", type=int, default=None,
+                   help="Number of jobs solved at the same time (default: all CPUs)")
+serve.add_argument("--threads", type=int, default=None,
+                   help="Total number of Gurobi threads, split evenly across the workers (default: all CPUs)")
+serve.add_argument("--preload", type=str, nargs="*", default=[],
+                   help="Instance files compiled by every worker when it starts")
+solve = commands.add_parser("solve", help="Solve an instance with the service")
+solve.add_argument("--instance", type=str, required=True, help="Path to instance file")
+solve.add_argument("--objective", choices=["OF1", "OF2"], default="OF1", help="Objective function")
+solve.add_argument("--oper-constr", action="store_true", default=False, help="Use operational constraints")
+solve.add_argument("--rules", type=str, default=None, metavar="FILE",
+                   help="JSON file of operational rules replacing the default ones (implies --oper-constr)")
+solve.add_argument("--bridging", nargs="?", const="pairwise", choices=["pairwise", "compact", "columns"], default=None,
+                   help="Use bridging constraints, as in main.py")
+solve.add_argument("--solver", type=str, default="auto", help="Model class, as in main.py (default: auto)")
+solve.add_argument("--backend", type=str, default="gurobi", help="Solver of the mip models, as in main.py")
+solve.add_argument("--formulation", type=str, default="current",
+                   help="Formulation of the mip models, as in main.py")
+solve.add_argument("--time-limit", type=float, default=None, help="Time limit of the solve, in seconds")
+solve.add_argument("--solution", action="store_true", default=False,
+                   help="Also return the solution (Solution.to_json of solution.py)")
+solve.add_argument("--solution-cache", type=str, default=None, metavar="DIR",
+                   help="Solution cache of the job, as in main.py (the directory must be given)")
+solve.add_argument("--progress", action="store_true", default=False,
+                   help="Print all the events of the job as they come, not only the last one")
+cancel = commands.add_parser("cancel", help="Cancel a queued or running job")
+cancel.add_argument("job", type=int, help="Id of the job")
+commands.add_parser("status", help="Show the workers and the queued jobs")
+commands.add_parser("shutdown", help="Stop the service")
+for command in commands.choices.values():
+    command.add_argument("--socket", type=str, default=DEFAULT_SOCKET,
+                         help="Unix socket of the service (default: $ISP_SERVICE_SOCKET or a file in the "
+                              "temporary directory)")
+
+
+def run(job, threads, send, stop):
+    # Builds and solves job in a worker with threads Gurobi threads, send(event) reporting its progress, stop()
+    # telling a Gurobi solve to stop. Returns the result event
+    from models import build_model
+    from rules import Rules
+    from batch import set_limits
+    from solution import Solution
+    from solution_cache import SolutionCache, cache_options
+
+    start = time.perf_counter()
+    operational_constraints = Rules.load(job["rules"]) if job["rules"] else job["oper_constr"]
+    cache = None
+    if job["solution_cache"]:
+        cache = SolutionCache(job["solution_cache"])
+        options = cache_options(job["objective"], operational_constraints, job["bridging"], job["formulation"])
+        cached = cache.optimal(job["instance"], options)
+        if cached is not None:
+            # Proven optimal: the job ends without a model, runtime being the one of the solve that found it
+            result = {"event": "result", "model": None, "objective_value": cached.objective_value, "mip_gap": 0.0,
+                      "runtime": cached.runtime, "build_time": 0.0, "cached": True}
+            if job["solution"]:
+                result["solution"] = cached.entry["solution"]
+            return result
+    model = build_model(job["instance"], job["objective"], operational_constraints, job["bridging"], job["solver"],
+                        backend=job["backend"], formulation=job["formulation"])
+    build_time = time.perf_counter() - start
+    set_limits(model, threads, job["time_limit"])
+    if cache is not None:
+        cache.start(model, job["instance"], options)
+
+    # Models solved by Gurobi through their profiler get the progress of the branch and bound, and stop gracefully
+    interruptible = hasattr(model, "profiler") and model.backend.name == "gurobi"
+    send({"event": "started", "model": type(model).__name__, "build_time": build_time,
+          "interruptible": interruptible})
+    if interruptible:
+        model.profiler.callbacks.append(_progress_callback(send, stop))
+    model.optimize()
+
+    result = {"event": "result", "model": type(model).__name__, "objective_value": model.objective_value,
+              "mip_gap": model.mip_gap, "runtime": model.runtime, "build_time": build_time, "cached": False}
+    if getattr(model, "result", None) is not None:
+        result["status"] = model.result.status
+    if hasattr(model, "upper_bound"):
+        result["upper_bound"] = model.upper_bound
+    if job["solution"]:
+        result["solution"] = Solution.from_model(model).to_json()
+    if cache is not None:
+        cache.put(model, job["instance"], options)
+    return result
+
+
+def _progress_callback(send, stop):
+    from gurobipy import GRB
+    from profiling import _bound
+
+    last = {"time": 0.0, "point": None}
+
+    def callback(model, where):
+        if stop():
+            model.terminate()
+            return
+        if where != GRB.Callback.MIP:
+            return
+        runtime = model.cbGet(GRB.Callback.RUNTIME)
+        point = (_bound(model.cbGet(GRB.Callback.MIP_OBJBST)), _bound(model.cbGet(GRB.Callback.MIP_OBJBND)))
+        if point != last["point"] and runtime - last["time"] >= PROGRESS_INTERVAL:
+            last["time"], last["point"] = runtime, point
+            send({"event": "progress", "time": round(runtime, 3), "incumbent": point[0], "bound": point[1]})
+
+    return callback
+
+
+def _worker(index, connection, cancelled, threads, preload):
+    # Worker process: solves the jobs received on connection one at a time, and sends back their events as
+    # (job id, event). cancelled.value is the id of the job to stop
+    # A process group of its own, with the processes its jobs start (the pool of ISPDecomposed), so that stopping
+    # the worker stops them too
+    os.setpgrp()
+    import gurobipy as gp
+    from instance_cache import load_instance
+    # Imported before the first job, which would pay for it otherwise
+    import models  # noqa: F401
+    import solution  # noqa: F401
+
+    # The default environment is started once, and shared by the models of all the jobs
+    gp.setParam("OutputFlag", 0)
+    for path in preload:
+        load_instance(path)
+    connection.send((None, {"event": "ready", "worker": index}))
+
+    while True:
+        task = connection.recv()
+        if task is None:
+            return
+        job_id, job = task
+
+        def send(event):
+            event["job"] = job_id
+            event["worker"] = index
+            connection.send((job_id, event))
+
+        try:
+            result = run(job, threads, send, lambda: cancelled.value == job_id)
+        except Exception as e:
+            traceback.print_exc()
+            result = {"event": "error", "error": f"{type(e).__name__}: {e}"}
+        send(result)
+
+
+class Worker:
+    # A worker process of the service, with a pipe of its own: a worker killed while it writes an event only breaks
+    # its own pipe, and the end of the pipe tells the service that the worker is gone. Not a daemon process, so that
+    # its jobs can start processes of their own (ISPDecomposed, as in batch.py): the service stops it explicitly
+    def __init__(self, index, context, threads, preload):
+        self.index = index
+        self.connection, child = context.Pipe()
+        self.cancelled = context.Value("q", -1, lock=False)
+        self.job = None
+        self.ready = False
+        self.process = context.Process(target=_worker, args=(index, child, self.cancelled, threads, preload))
+        self.process.start()
+        child.close()
+
+    def stop(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except OSError:
+            # Its process group is not created yet, or is already gone
+            pass
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class Service:
+    # Queue of the jobs and the workers solving them. Jobs wait in the service, not in the workers, so that a queued
+    # job is cancelled by removing it, and is always given to the next idle worker
+    def __init__(self, workers=None, threads=None, preload=()):
+        self.n_workers = max(1, workers or os.cpu_count())
+        self.threads = max(1, (threads or os.cpu_count()) // self.n_workers)
+        self.preload = [os.path.abspath(path) for path in preload]
+        # Spawned rather than forked: the workers must not inherit the event loop of the service
+        self.context = multiprocessing.get_context("spawn")
+        self.workers = [None] * self.n_workers
+        self.queue = collections.deque()
+        self.jobs = {}
+        self.ids = itertools.count()
+        self.loop = None
+        self.stopped = None
+        # Tasks of the open connections and of the event streams of their jobs, ended at shutdown
+        self.clients = set()
+        self.streams = set()
+
+    def _start_worker(self, index):
+        worker = Worker(index, self.context, self.threads, self.preload)
+        self.workers[index] = worker
+        self.loop.add_reader(worker.connection.fileno(), self._receive, worker)
+
+    def _replace_worker(self, worker):
+        self.loop.remove_reader(worker.connection.fileno())
+        worker.stop()
+        self._start_worker(worker.index)
+
+    def submit(self, options):
+        # Adds a job and returns its id and the asyncio queue of its events
+        unknown = set(options) - set(JOB_OPTIONS)
+        if unknown:
+            raise ValueError(f"Unknown job options: {sorted(unknown)}")
+        job = {**JOB_OPTIONS, **options}
+        if not job["instance"]:
+            raise ValueError("A job needs an instance")
+        job_id = next(self.ids)
+        self.jobs[job_id] = {"options": job, "events": asyncio.Queue(), "worker": None, "interruptible": False,
+                             "cancelled": False, "submitted": time.perf_counter()}
+        self.queue.append(job_id)
+        self._publish(job_id, {"event": "queued", "job": job_id, "position": len(self.queue)})
+        self._dispatch()
+        return job_id, self.jobs[job_id]["events"]
+
+    def cancel(self, job_id):
+        # Queued jobs are removed, running ones are stopped: Gurobi solves through their callback (with CANCEL_GRACE
+        # seconds to stop, the worker being killed after it), the others by killing their worker
+        job = self.jobs.get(job_id)
+        if job is None or job["cancelled"]:
+            return False
+        job["cancelled"] = True
+        if job["worker"] is None:
+            self.queue.remove(job_id)
+            self._finish(job_id, {"event": "cancelled", "job": job_id})
+            return True
+        worker = self.workers[job["worker"]]
+        if job["interruptible"]:
+            worker.cancelled.value = job_id
+            self.loop.call_later(CANCEL_GRACE, self._kill, worker, job_id)
+        else:
+            self._kill(worker, job_id)
+        return True
+
+    def _kill(self, worker, job_id):
+        if self.workers[worker.index] is not worker or worker.job != job_id:
+            return
+        self._replace_worker(worker)
+        self._finish(job_id, {"event": "cancelled", "job": job_id})
+
+    def _dispatch(self):
+        for worker in self.workers:
+            if not self.queue:
+                return
+            if worker.ready and worker.job is None:
+                job_id = self.queue.popleft()
+                worker.job = job_id
+                self.jobs[job_id]["worker"] = worker.index
+                worker.connection.send((job_id, self.jobs[job_id]["options"]))
+
+    def _publish(self, job_id, event):
+        job = self.jobs.get(job_id)
+        if job is not None:
+            job["events"].put_nowait(event)
+
+    def _finish(self, job_id, event):
+        # Last event of a job: its worker takes the next one
+        job = self.jobs.pop(job_id, None)
+        if job is None:
+            return
+        event["latency"] = time.perf_counter() - job["submitted"]
+        job["events"].put_nowait(event)
+        worker = self.workers[job["worker"]] if job["worker"] is not None else None
+        if worker is not None and worker.job == job_id:
+            worker.job = None
+            worker.cancelled.value = -1
+        self._dispatch()
+
+    def _receive(self, worker):
+        # Event of a worker, or the end of its pipe when it died on its own
+        try:
+            job_id, event = worker.connection.recv()
+        except (EOFError, OSError):
+            job_id = worker.job
+            self._replace_worker(worker)
+            if job_id is not None:
+                self._finish(job_id, {"event": "error", "job": job_id,
+                                      "error": f"Worker exited with code {worker.process.exitcode}"})
+            return
+        if event["event"] == "ready":
+            worker.ready = True
+            self._dispatch()
+            return
+        job = self.jobs.get(job_id)
+        if job is None or worker.job != job_id:
+            return
+        if event["event"] == "started":
+            job["interruptible"] = event["interruptible"]
+        if event["event"] in ("result", "error"):
+            self._finish(job_id, {"event": "cancelled", "job": job_id} if job["cancelled"] else event)
+        elif not job["cancelled"]:
+            self._publish(job_id, event)
+
+    def status(self):
+        return {
+            "event": "status",
+            "workers": [{"worker": w.index, "ready": w.ready, "job": w.job, "pid": w.process.pid}
+                        for w in self.workers],
+            "queued": list(self.queue),
+            "threads": self.threads,
+        }
+
+    async def client(self, reader, writer):
+        # One connection: each line is a request, the events of the solve requests are written as they come
+        tasks = []
+        self.clients.add(asyncio.current_task())
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    command = request.pop("command", "solve")
+                    if command == "solve":
+                        task = asyncio.create_task(self._stream(writer, *self.submit(request)))
+                        tasks.append(task)
+                        self.streams.add(task)
+                        task.add_done_callback(self.streams.discard)
+                    elif command == "cancel":
+                        self._write(writer, {"event": "cancel", "job": request["job"],
+                                             "ok": self.cancel(request["job"])})
+                    elif command == "status":
+                        self._write(writer, self.status())
+                    elif command == "shutdown":
+                        self._write(writer, {"event": "shutdown"})
+                        self.stopped.set()
+                    else:
+                        raise ValueError(f"Unknown command: {command}")
+                except (ValueError, KeyError, TypeError) as e:
+                    self._write(writer, {"event": "error", "error": f"{type(e).__name__}: {e}"})
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # Client gone away, or service shutting down
+            pass
+        finally:
+            # The jobs of a client gone away are cancelled, their events having nowhere to go
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+            self.clients.discard(asyncio.current_task())
+
+    async def _stream(self, writer, job_id, events):
+        try:
+            while True:
+                event = await events.get()
+                self._write(writer, event)
+                await writer.drain()
+                if event["event"] in ("result", "error", "cancelled"):
+                    return
+        except (asyncio.CancelledError, ConnectionError):
+            self.cancel(job_id)
+
+    async def _shutdown(self):
+        # The queued and running jobs end with a cancelled event, written to their clients (for at most CANCEL_GRACE
+        # seconds), then the connections are closed before the workers are stopped
+        self.queue.clear()
+        for job_id in list(self.jobs):
+            self.jobs[job_id]["cancelled"] = True
+            self._finish(job_id, {"event": "cancelled", "job": job_id, "shutdown": True})
+        if self.streams:
+            await asyncio.wait(self.streams, timeout=CANCEL_GRACE)
+        clients = list(self.clients)
+        for task in clients:
+            task.cancel()
+        await asyncio.gather(*clients, return_exceptions=True)
+
+    @staticmethod
+    def _write(writer, event):
+        writer.write(json.dumps(event).encode() + b"\n")
+
+    async def serve(self, path):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        for index in range(self.n_workers):
+            self._start_worker(index)
+        if os.path.exists(path):
+            os.remove(path)
+        server = await asyncio.start_unix_server(self.client, path, limit=2 ** 26)
+        print(f"Serving on {path} with {self.n_workers} workers of {self.threads} Gurobi threads each", flush=True)
+        try:
+            async with server:
+                await self.stopped.wait()
+                await self._shutdown()
+        finally:
+            # Also when the service is interrupted, as nothing else stops workers that are not daemons
+            for worker in self.workers:
+                self.loop.remove_reader(worker.connection.fileno())
+                worker.stop()
+            os.remove(path)
+
+
+class Client:
+    # Connection to the service, one request per line and one event per line
+    def __init__(self, path=DEFAULT_SOCKET):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+        self.file = self.socket.makefile("rwb")
+
+    def send(self, request):
+        self.file.write(json.dumps(request).encode() + b"\n")
+        self.file.flush()
+
+    def receive(self):
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("The service closed the connection")
+        return json.loads(line)
+
+    def solve(self, **options):
+        # Events of a solve job, the last one being its result, error or cancellation. Relative instance, rules and
+        # solution cache paths are relative to the client
+        for key in ("instance", "rules", "solution_cache"):
+            if options.get(key):
+                options[key] = os.path.abspath(options[key])
+        self.send({"command": "solve", **options})
+        while True:
+            event = self.receive()
+            yield event
+            if event["event"] in ("result", "error", "cancelled"):
+                return
+
+    def request(self, command, **options):
+        self.send({"command": command, **options})
+        return self.receive()
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    if args.command == "serve":
+        asyncio.run(Service(args.workers, args.threads, args.preload).serve(args.socket))
+        sys.exit()
+
+    client = Client(args.socket)
+    if args.command == "solve":
+        options = {key: getattr(args, key) for key in JOB_OPTIONS}
+        for event in client.solve(**options):
+            if args.progress or event["event"] in ("result", "error", "cancelled"):
+                print(json.dumps(event), flush=True)
+        sys.exit(0 if event["event"] == "result" else 1)
+    elif args.command == "cancel":
+        print(json.dumps(client.request("cancel", job=args.job)))
+    else:
+        print(json.dumps(client.request(args.command)))
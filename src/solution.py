@@ -0,0 +1,207 @@
+import csv
+import json
+import os
+
+import numpy as np
+
+from heuristics import y_entries
+
+# Coverage of a (session, pair) entry: not covered, covered by an interpreter, or only through a bridge
+NOT_COVERED, DIRECT, RELAY = 0, 1, 2
+COVERAGE = ["none", "direct", "relay"]
+
+CSV_HEADER = ["session", "interpreter", "l1", "l2", "relay_interpreter", "bridge_language"]
+
+
+def _ptr(sorted_ids, n):
+    # CSR pointers of ids sorted in increasing order: the entries of id k are ptr[k]:ptr[k + 1]
+    return np.searchsorted(sorted_ids, np.arange(n + 1))
+
+
+class Solution:
+    # Solution of a model as integer arrays, read once after optimize(): the direct assignments (i, s, p) and the
+    # bridges (i1, i2, s, p, l_prime), with the indexes the post-processing needs (interpreters of a session,
+    # sessions of an interpreter, assignments of a block, coverage of each pair of each session), all built with
+    # numpy in time linear in the size of the solution. Names are only looked up when the results are reported.
+
+    def __init__(self, data, direct, relays=None):
+        self.data = data
+        direct = np.asarray(direct, dtype=np.int64).reshape(-1, 3)
+        relays = (np.zeros((0, 5), dtype=np.int64) if relays is None
+                  else np.asarray(relays, dtype=np.int64).reshape(-1, 5))
+        # Sorted by session, then interpreter
+        self.direct = direct[np.lexsort((direct[:, 2], direct[:, 0], direct[:, 1]))]
+        self.relays = relays[np.lexsort((relays[:, 1], relays[:, 0], relays[:, 2]))]
+        self._direct_ptr = _ptr(self.direct[:, 1], data.n_sessions)
+        self._relay_ptr = _ptr(self.relays[:, 2], data.n_sessions)
+
+        # Assigned (i, s) pairs, directly or in a bridge, sorted by session then interpreter
+        pairs = np.concatenate([self.direct[:, [0, 1]], self.relays[:, [0, 2]], self.relays[:, [1, 2]]])
+        codes = np.unique(pairs[:, 1] * data.n_interpreters + pairs[:, 0])
+        self.assigned = np.stack([codes % data.n_interpreters, codes // data.n_interpreters], axis=1)
+        self._session_ptr = _ptr(self.assigned[:, 1], data.n_sessions)
+        self._by_interpreter = np.argsort(self.assigned[:, 0], kind="stable")
+        self._interpreter_ptr = _ptr(self.assigned[self._by_interpreter, 0], data.n_interpreters)
+        blocks = data.session_block[self.assigned[:, 1]]
+        self._by_block = np.argsort(blocks, kind="stable")
+        self._block_ptr = _ptr(blocks[self._by_block], data.n_blocks)
+
+        # coverage[e] for the entry e of session_pair_indices (the y variables of the models)
+        self.coverage = np.zeros(len(data.session_pair_indices), dtype=np.int8)
+        self.coverage[y_entries(data, self.relays[:, 2], self.relays[:, 3])] = RELAY
+        self.coverage[y_entries(data, self.direct[:, 1], self.direct[:, 2])] = DIRECT
+        covered = np.concatenate([[0], np.cumsum(self.coverage > 0)])
+        ptr = data.session_pair_ptr
+        self.n_covered = covered[ptr[1:]] - covered[ptr[:-1]]
+        n_pairs = np.diff(ptr)
+        # Covered pairs over the pairs of each session, 0 for a session without pairs
+        self.coverage_ratios = np.where(n_pairs > 0, self.n_covered / np.maximum(n_pairs, 1), 0.0)
+        # A session without any pair is fully covered, as in the models
+        self.fully_covered = self.n_covered == n_pairs
+
+    @classmethod
+    def from_model(cls, model, relays=True):
+        # Solution of an optimized model. The Gurobi models are read with a single bulk read of all their columns,
+        # the aggregated model from its split per interpreter, the others (flow, heuristic, decomposed, rolling)
+        # from the values they store
+        data = model.data
+        if hasattr(model, "split"):
+            return cls(data, model.split())
+        builder = getattr(model, "builder", None)
+        if builder is None:
+            keys = [key for key, var in model.z.items() if var.X > 0.5]
+            return cls(data, np.array(keys, dtype=np.int64).reshape(-1, 3))
+        values = builder.values()
+        selected = values[model.z.columns] > 0.5
+        direct = np.stack([k[selected] for k in model.z.keys_array], axis=1)
+        bridges = model.relay_ids(values) if relays and hasattr(model, "relay_ids") else None
+        return cls(data, direct, bridges)
+
+    def objective_value(self, objective):
+        if objective == "OF1":
+            return float(np.count_nonzero(self.coverage))
+        return float(np.count_nonzero(self.fully_covered))
+
+    def session_interpreters(self, s):
+        # Interpreters assigned to session s, directly or in a bridge
+        return self.assigned[self._session_ptr[s]:self._session_ptr[s + 1], 0]
+
+    def interpreter_sessions(self, i):
+        # Sessions of interpreter i, in increasing order
+        return self.assigned[self._by_interpreter[self._interpreter_ptr[i]:self._interpreter_ptr[i + 1]], 1]
+
+    def block_assignments(self, b):
+        # (interpreter, session) rows assigned in block b
+        return self.assigned[self._by_block[self._block_ptr[b]:self._block_ptr[b + 1]]]
+
+    def session_assignments(self, s):
+        # (i, s, p) rows of session s
+        return self.direct[self._direct_ptr[s]:self._direct_ptr[s + 1]]
+
+    def session_relays(self, s):
+        # (i1, i2, s, p, l_prime) rows of session s
+        return self.relays[self._relay_ptr[s]:self._relay_ptr[s + 1]]
+
+    def covered_pairs(self):
+        # (s, p, coverage) rows of the covered pairs, coverage being DIRECT or RELAY
+        data = self.data
+        entries = np.flatnonzero(self.coverage)
+        sessions = np.repeat(np.arange(data.n_sessions), np.diff(data.session_pair_ptr))
+        return np.stack([sessions[entries], data.session_pair_indices[entries], self.coverage[entries]], axis=1)
+
+    def assignments(self):
+        # Names (interpreter, session, l1, l2) of the pairs covered directly, as model.assignments()
+        data = self.data
+        return [(data.interpreters[i], data.sessions[s], *data.pair_names(p)) for i, s, p in self.direct.tolist()]
+
+    def relay_names(self):
+        # Names (i1, i2, session, l1, l2, l_prime) of the bridges, as model.relays()
+        data = self.data
+        return [(data.interpreters[i1], data.interpreters[i2], data.sessions[s], *data.pair_names(p),
+                 data.languages[l_prime]) for i1, i2, s, p, l_prime in self.relays.tolist()]
+
+    def coverage_by_session(self):
+        # Coverage ratio of each session, by name
+        return dict(zip(self.data.sessions, self.coverage_ratios.tolist()))
+
+    def to_json(self):
+        # Ids into the name lists of the instance, languages instead of pairs: [i, s, l1, l2] for an assignment and
+        # [i1, i2, s, l1, l2, l_prime] for a bridge
+        data = self.data
+        direct_languages = data.pair_languages[self.direct[:, 2]].astype(np.int64)
+        relay_languages = data.pair_languages[self.relays[:, 3]].astype(np.int64)
+        return {
+            "interpreters": data.interpreters,
+            "sessions": data.sessions,
+            "languages": data.languages,
+            "assignments": np.column_stack([self.direct[:, :2], direct_languages]).tolist(),
+            "relays": np.column_stack([self.relays[:, :3], relay_languages, self.relays[:, 4]]).tolist(),
+        }
+
+    @classmethod
+    def from_json(cls, data, spec):
+        # Solution of the instance data from to_json(), possibly written for another compilation of the instance
+        ids = [cls._ids(spec[key], getattr(data, key)) for key in ("interpreters", "sessions", "languages")]
+        interpreters, sessions, languages = ids
+        direct = np.asarray(spec["assignments"], dtype=np.int64).reshape(-1, 4)
+        relays = np.asarray(spec["relays"], dtype=np.int64).reshape(-1, 6)
+        return cls(
+            data,
+            np.column_stack([interpreters[direct[:, 0]], sessions[direct[:, 1]],
+                             data.pair_id[languages[direct[:, 2]], languages[direct[:, 3]]]]),
+            np.column_stack([interpreters[relays[:, 0]], interpreters[relays[:, 1]], sessions[relays[:, 2]],
+                             data.pair_id[languages[relays[:, 3]], languages[relays[:, 4]]],
+                             languages[relays[:, 5]]]),
+        )
+
+    @staticmethod
+    def _ids(names, known):
+        # Ids in known of the names, which must all be there
+        position = {name: k for k, name in enumerate(known)}
+        unknown = [name for name in names if name not in position]
+        if unknown:
+            raise ValueError(f"Names not in the instance: {unknown[:5]}")
+        return np.array([position[name] for name in names], dtype=np.int64)
+
+    def save(self, path):
+        # JSON (.json) or CSV (any other extension): one row per assignment, and per bridge with its second
+        # interpreter and bridge language
+        if os.path.splitext(path)[1] == ".json":
+            with open(path, "w") as f:
+                json.dump(self.to_json(), f, separators=(",", ":"))
+            return
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_HEADER)
+            writer.writerows((s, i, l1, l2, "", "") for i, s, l1, l2 in self.assignments())
+            writer.writerows((s, i1, l1, l2, i2, lp) for i1, i2, s, l1, l2, lp in self.relay_names())
+
+    @classmethod
+    def load(cls, path, data):
+        # Solution of the instance data saved by save()
+        if os.path.splitext(path)[1] == ".json":
+            with open(path) as f:
+                return cls.from_json(data, json.load(f))
+        with open(path, newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header != CSV_HEADER:
+                raise ValueError(f"Solution CSV header must be {CSV_HEADER}, got: {header}")
+            rows = list(reader)
+        direct = [row for row in rows if not row[4]]
+        relays = [row for row in rows if row[4]]
+        return cls.from_json(data, {
+            "interpreters": data.interpreters,
+            "sessions": data.sessions,
+            "languages": data.languages,
+            "assignments": cls._rows(data, direct, [1, 0, 2, 3]),
+            "relays": cls._rows(data, relays, [1, 4, 0, 2, 3, 5]),
+        })
+
+    @classmethod
+    def _rows(cls, data, rows, columns):
+        # Ids of the name columns of the CSV rows, in the order of to_json
+        kinds = {0: data.sessions, 1: data.interpreters, 4: data.interpreters}
+        table = [[row[c] for row in rows] for c in columns]
+        ids = [cls._ids(names, kinds.get(c, data.languages)) for names, c in zip(table, columns)]
+        return np.stack(ids, axis=1).tolist() if rows else []
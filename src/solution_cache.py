@@ -0,0 +1,283 @@
+from argparse import ArgumentParser
+import glob
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from gurobipy import GRB
+
+from instance_cache import DEFAULT_CACHE_DIR, content_hash, load_instance
+from rules import BLOCKS_PER_DAY, Rules, as_rules
+from solution import Solution
+
+# Bumped whenever the entries change, so that older entries are not read anymore
+FORMAT_VERSION = 1
+# Size of the cache directory above which the least recently used entries are removed, in bytes
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+
+parser = ArgumentParser(description="List or clear the solution cache")
+parser.add_argument("--cache-dir", type=str, default=None,
+                    help="Cache directory (default: solutions/ in $ISP_CACHE_DIR, or in .cache next to the instances)")
+parser.add_argument("--instances-dir", type=str, default="instances", help="Directory of the instance files")
+parser.add_argument("--clear", action="store_true", default=False, help="Remove every entry of the cache")
+
+
+def default_cache_dir(directory):
+    # Next to the compiled instances of the instance files of directory (instance_cache.py)
+    root = os.environ.get("ISP_CACHE_DIR") or os.path.join(directory, DEFAULT_CACHE_DIR)
+    return os.path.join(root, "solutions")
+
+
+def cache_options(objective, operational_constraints=False, bridging=None, formulation="current"):
+    # Options of a solve that change its solutions: the backend, warm start and limits only change how fast they
+    # are found. The default rules are True whether or not they are given as Rules
+    rules = as_rules(operational_constraints)
+    if rules is None or (rules.is_default and rules.blocks_per_day == BLOCKS_PER_DAY):
+        operational_constraints = rules is not None
+    else:
+        operational_constraints = {"blocks_per_day": rules.blocks_per_day, "rules": rules.rules}
+    return {"objective": objective, "operational_constraints": operational_constraints, "bridging": bridging,
+            "formulation": formulation}
+
+
+class CachedResult:
+    # Proven optimal solution read from the cache, with the attributes main.py reports of a solved model
+    def __init__(self, entry, data):
+        self.entry = entry
+        self.data = data
+        self.solution = Solution.from_json(data, entry["solution"])
+        self.objective_value = entry["objective"]
+        self.mip_gap = 0.0
+        # Time of the solve that found it
+        self.runtime = entry["runtime"]
+
+
+class SolutionCache:
+    # Solutions of the models by instance content and options, one JSON file per (options, instance) in cache_dir:
+    # its name is the hash of the options, then the content hash of the instance file (instance_cache.py), so that
+    # an edited instance is a new entry. A proven optimal entry is returned as it is (optimal()), and any other
+    # solution with the same options gives a MIP start (start()): the one of the same instance, or else the one
+    # whose instance has the most interpreter and session names in common, mapped by name. Reading an entry marks
+    # it as used, and the least recently used entries are removed once the directory is above max_bytes.
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def path(self, instance, options):
+        return os.path.join(self.cache_dir, f"{self._options_key(options)}-{content_hash(instance)[:32]}.json")
+
+    def get(self, instance, options):
+        # Entry of the instance file solved with options, None if there is none
+        path = self.path(instance, options)
+        entry = self._read(path)
+        if entry is not None:
+            self._touch(path)
+        return entry
+
+    def optimal(self, instance, options):
+        # CachedResult of the proven optimal entry of the instance, None if there is none
+        entry = self.get(instance, options)
+        if entry is None or not entry["optimal"]:
+            return None
+        return CachedResult(entry, load_instance(instance).compile())
+
+    def start(self, model, instance, options):
+        # Gives model (ISP, ISPBridge) the closest cached solution as MIP start. Returns the name of the instance
+        # of that solution, None if no entry has the options or any interpreter and session name in common
+        if not hasattr(model, "set_start"):
+            return None
+        data = model.data
+        entry, path = self.get(instance, options), self.path(instance, options)
+        if entry is None:
+            entry, path = self._closest(data, options)
+        if entry is None:
+            return None
+        self._touch(path)
+        model.set_start(feasible_start(model, map_assignments(data, entry["solution"]), options))
+        return entry["instance_name"]
+
+    def put(self, model, instance, options):
+        # Stores the solution of the solved model, unless the entry of the instance is already as good. Returns
+        # True if it was stored
+        result = getattr(model, "result", None)
+        if result is not None:
+            if not result.sol_count:
+                return False
+            optimal = result.status == GRB.OPTIMAL
+        else:
+            optimal = model.mip_gap < 1e-9
+        previous = self.get(instance, options)
+        if previous is not None and (previous["optimal"] or (previous["objective"] >= model.objective_value
+                                                             and not optimal)):
+            return False
+
+        entry = {"version": FORMAT_VERSION, "instance": content_hash(instance),
+                 "instance_name": os.path.basename(instance), "options": options,
+                 "objective": model.objective_value, "optimal": optimal, "mip_gap": model.mip_gap,
+                 "runtime": model.runtime, "solution": Solution.from_model(model).to_json()}
+        path = self.path(instance, options)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Written to a temporary file first, so that concurrent runs never read a partial entry
+            temporary = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, "w") as f:
+                json.dump(entry, f, separators=(",", ":"))
+            os.replace(temporary, path)
+        except OSError:
+            # The cache is only an optimization, as the instance cache
+            return False
+        self.evict(keep=path)
+        return True
+
+    def evict(self, keep=None):
+        # Removes the least recently used entries (but keep) until the directory is within max_bytes, returns the
+        # number of entries removed
+        entries = []
+        for path in glob.glob(os.path.join(self.cache_dir, "*.json")):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def entries(self):
+        # (path, entry) of every entry, the most recently used first
+        paths = sorted(glob.glob(os.path.join(self.cache_dir, "*.json")), key=os.path.getmtime, reverse=True)
+        return [(path, entry) for path in paths if (entry := self._read(path)) is not None]
+
+    def clear(self):
+        for path in glob.glob(os.path.join(self.cache_dir, "*.json")):
+            os.remove(path)
+
+    # === Internals ===
+    @staticmethod
+    def _options_key(options):
+        digest = hashlib.sha256(f"isp-solution-v{FORMAT_VERSION}".encode())
+        digest.update(json.dumps(options, sort_keys=True).encode())
+        return digest.hexdigest()[:16]
+
+    def _closest(self, data, options):
+        # Entry with the options whose instance shares the most interpreter and session names with data, the most
+        # recently used one among equals
+        interpreters, sessions = set(data.interpreters), set(data.sessions)
+        best, best_path, best_score = None, None, 0
+        pattern = os.path.join(self.cache_dir, f"{self._options_key(options)}-*.json")
+        for path in sorted(glob.glob(pattern), key=os.path.getmtime, reverse=True):
+            entry = self._read(path)
+            if entry is None:
+                continue
+            spec = entry["solution"]
+            common_sessions = len(sessions.intersection(spec["sessions"]))
+            score = len(interpreters.intersection(spec["interpreters"])) + common_sessions
+            if common_sessions and score > best_score:
+                best, best_path, best_score = entry, path, score
+        return best, best_path
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            # Missing or partial entry
+            return None
+        return entry if entry.get("version") == FORMAT_VERSION else None
+
+    @staticmethod
+    def _touch(path):
+        # The modification time is the last use of an entry
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+
+def map_assignments(data, spec):
+    # Direct assignments (i, s, p) of a solution written by Solution.to_json() for another instance, by interpreter,
+    # session and language name. Those of names not in data, or of a language pair it does not have, are left out
+    def ids(names, known):
+        position = {name: k for k, name in enumerate(known)}
+        return np.array([position.get(name, -1) for name in names], dtype=np.int64)
+
+    interpreters = ids(spec["interpreters"], data.interpreters)
+    sessions = ids(spec["sessions"], data.sessions)
+    languages = ids(spec["languages"], data.languages)
+    rows = np.asarray(spec["assignments"], dtype=np.int64).reshape(-1, 4)
+    i, s = interpreters[rows[:, 0]], sessions[rows[:, 1]]
+    l1, l2 = languages[rows[:, 2]], languages[rows[:, 3]]
+    known = (i >= 0) & (s >= 0) & (l1 >= 0) & (l2 >= 0)
+    i, s, l1, l2 = i[known], s[known], l1[known], l2[known]
+    p = data.pair_id[l1, l2].astype(np.int64)
+    return np.column_stack([i, s, p])[p >= 0]
+
+
+def feasible_start(model, z, options):
+    # The assignments z that the model can start from: those of its z variables, then at most one pair per
+    # interpreter and session, one session per interpreter and block (the first one), and the operational rules
+    # followed block by block, as an assignment the instance has changed under would violate them
+    data = model.data
+    z = z[model.z.positions(tuple(z.T), strict=False) >= 0]
+    z = z[np.sort(np.unique(z[:, 0] * data.n_sessions + z[:, 1], return_index=True)[1])]
+    blocks = data.session_block[z[:, 1]].astype(np.int64)
+    first = np.unique(z[:, 0] * data.n_blocks + blocks, return_index=True)[1]
+    first_session = np.full((data.n_interpreters, data.n_blocks), -1, dtype=np.int64)
+    first_session[z[first, 0], blocks[first]] = z[first, 1]
+    z = z[first_session[z[:, 0], blocks] == z[:, 1]]
+
+    rules = as_rules(_rules(options["operational_constraints"]))
+    if rules is None or not len(z):
+        return z
+    row_i, starts, ends, limits = (np.concatenate(a) for a in zip(*rules.compile(data.n_blocks,
+                                                                                data.interpreters).values()))
+    order = np.argsort(row_i, kind="stable")
+    ptr = np.searchsorted(row_i[order], np.arange(data.n_interpreters + 1))
+    used = np.zeros(len(row_i))
+    keep = []
+    for k in np.argsort(data.session_block[z[:, 1]], kind="stable").tolist():
+        i, b = int(z[k, 0]), int(data.session_block[z[k, 1]])
+        rows = order[ptr[i]:ptr[i + 1]]
+        rows = rows[(starts[rows] <= b) & (b < ends[rows])]
+        if np.all(used[rows] < limits[rows]):
+            used[rows] += 1
+            keep.append(k)
+    return z[np.sort(keep)]
+
+
+def _rules(operational_constraints):
+    # Operational constraints of cache_options(), as the models take them
+    if isinstance(operational_constraints, dict):
+        return Rules(operational_constraints["rules"], operational_constraints["blocks_per_day"])
+    return operational_constraints
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    cache = SolutionCache(args.cache_dir or default_cache_dir(args.instances_dir))
+    if args.clear:
+        cache.clear()
+    now = time.time()
+    for path, entry in cache.entries():
+        size = os.path.getsize(path) / 1024
+        age = (now - os.path.getmtime(path)) / 60
+        options = entry["options"]
+        print(f"{entry['instance_name']} {options['objective']} oper-constr={bool(options['operational_constraints'])} "
+              f"bridging={options['bridging']} {options['formulation']}: {entry['objective']:g}"
+              f"{' (optimal)' if entry['optimal'] else ''}, {size:.0f} KiB, used {age:.0f} min ago")
@@ -0,0 +1,292 @@
+from argparse import ArgumentParser
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from incremental import FORMULATIONS
+
+# Gurobi parameters tuned, with the values the sweep tries (the first one is the Gurobi default)
+PARAMETER_GRID = {
+    "MIPFocus": [0, 1, 2, 3],
+    "Presolve": [-1, 0, 1, 2],
+    "Cuts": [-1, 0, 1, 2, 3],
+    "Symmetry": [-1, 0, 1, 2],
+    "Method": [-1, 0, 1, 2, 3],
+}
+# Profiles of the instance classes, written by tune() and applied by apply_profile() ($ISP_TUNING_PROFILES
+# overrides it)
+DEFAULT_PROFILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tuning_profiles.json")
+# Relative gain a parameter value must bring to the sweep to be kept, below it the runtimes are mostly noise
+MIN_IMPROVEMENT = 0.05
+# Largest distance (in powers of 2, over all the sizes of the class) of a profile applied to another class
+MAX_DISTANCE = 2
+SIZES = ["sessions", "interpreters", "blocks", "languages"]
+
+parser = ArgumentParser(description="Tune the Gurobi parameters of the models per instance class")
+commands = parser.add_subparsers(dest="command", required=True)
+tune_parser = commands.add_parser("tune", help="Find the best parameters of each class of the instances")
+validate_parser = commands.add_parser("validate",
+                                      help="Compare the default and tuned parameters on other (held-out) instances")
+show_parser = commands.add_parser("show", help="Print the stored profiles")
+for command in (tune_parser, validate_parser):
+    command.add_argument("--instances", type=str, nargs="+", required=True, help="Instance files")
+    command.add_argument("--model", choices=["ISP", "ISPBridge", "ISPBridgeCompact"], default="ISP", help="Model")
+    command.add_argument("--objective", choices=["OF1", "OF2"], default="OF1", help="Objective function")
+    command.add_argument("--oper-constr", action="store_true", default=False, help="Use operational constraints")
+    command.add_argument("--formulation", choices=FORMULATIONS, default="current", help="Formulation of the model")
+    command.add_argument("--seeds", type=int, nargs="+", default=[0, 1],
+                         help="Gurobi seeds each instance is solved with, to average out the variability")
+    command.add_argument("--threads", type=int, default=1, help="Gurobi Threads parameter")
+    command.add_argument("--time-limit", type=float, default=60.0,
+                         help="Time limit per solve, in seconds (an unsolved run counts twice the limit)")
+tune_parser.add_argument("--method", choices=["sweep", "gurobi"], default="sweep",
+                         help="Sweep of PARAMETER_GRID one parameter at a time (sweep), or the Gurobi tuning tool on "
+                              "the largest instance of each class (gurobi)")
+tune_parser.add_argument("--rounds", type=int, default=2, help="Passes of the sweep over the parameters")
+tune_parser.add_argument("--tune-time-limit", type=float, default=600.0,
+                         help="Time given to the Gurobi tuning tool per class, in seconds")
+for command in commands.choices.values():
+    command.add_argument("--profiles", type=str, default=None,
+                         help="Profiles file (default: $ISP_TUNING_PROFILES or src/tuning_profiles.json)")
+
+# Profiles read by this process, by path: (modification time, profiles)
+_loaded = {}
+
+
+def profiles_path(path=None):
+    return path or os.environ.get("ISP_TUNING_PROFILES") or DEFAULT_PROFILES
+
+
+def load_profiles(path=None):
+    # Profiles by class key, read again when the file changes, {} without a file
+    path = profiles_path(path)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    if path not in _loaded or _loaded[path][0] != mtime:
+        with open(path) as f:
+            _loaded[path] = (mtime, json.load(f))
+    return _loaded[path][1]
+
+
+def save_profiles(profiles, path=None):
+    path = profiles_path(path)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(profiles, f, indent=2, sort_keys=True)
+    os.replace(temporary, path)
+
+
+def bucket(n):
+    # n rounded to a power of 2
+    return 2 ** int(round(math.log2(max(n, 1))))
+
+
+def variant(model):
+    # Model class, objective, operational constraints and formulation of a model
+    name = f"{type(model).__name__}-{model.objective}-{'oper' if model.rules is not None else 'none'}"
+    return name if model.formulation == "current" else f"{name}-{model.formulation}"
+
+
+def instance_class(model):
+    # Class of the instance of a model: its variant, and its numbers of sessions, interpreters and blocks and mean
+    # number of languages per session, rounded to powers of 2
+    data = model.data
+    n_pairs = np.diff(data.session_pair_ptr)
+    # k languages make k(k - 1)/2 pairs
+    languages = (1 + np.sqrt(1 + 8 * n_pairs)) / 2
+    return {"variant": variant(model), "sessions": bucket(data.n_sessions),
+            "interpreters": bucket(data.n_interpreters), "blocks": bucket(data.n_blocks),
+            "languages": bucket(float(languages.mean()) if len(languages) else 1)}
+
+
+def class_key(cls):
+    return f"{cls['variant']}/S{cls['sessions']}-I{cls['interpreters']}-B{cls['blocks']}-L{cls['languages']}"
+
+
+def find_profile(profiles, cls):
+    # Profile of the class, else the one of the closest class of the same variant within MAX_DISTANCE, else None
+    key = class_key(cls)
+    if key in profiles:
+        return key, profiles[key]
+    best, best_distance = (None, None), MAX_DISTANCE + 1
+    for other, profile in sorted(profiles.items()):
+        if profile["class"]["variant"] != cls["variant"]:
+            continue
+        distance = sum(abs(math.log2(profile["class"][size]) - math.log2(cls[size])) for size in SIZES)
+        if distance < best_distance:
+            best, best_distance = (other, profile), distance
+    return best
+
+
+def apply_profile(model, path=None):
+    # Sets the parameters of the profile of the class of model on its Gurobi model, returns the key of the profile
+    # applied (None without one). Only the gurobi backend reads them
+    if model.backend.name != "gurobi":
+        return None
+    profiles = load_profiles(path)
+    if not profiles:
+        return None
+    key, profile = find_profile(profiles, instance_class(model))
+    if profile is None:
+        return None
+    for name, value in profile["params"].items():
+        model.model.setParam(name, value)
+    return key
+
+
+def run(model, params, seeds, threads, time_limit):
+    # Solves model once per seed with params (the others at their defaults), returns the runtimes, a run without a
+    # proven optimum counting as 2 * time_limit (PAR2)
+    from gurobipy import GRB
+
+    runtimes = []
+    for seed in seeds:
+        gurobi = model.model
+        gurobi.setParam("OutputFlag", 0)
+        gurobi.reset(1)
+        gurobi.resetParams()
+        gurobi.setParam("OutputFlag", 0)
+        gurobi.setParam("Threads", threads)
+        gurobi.setParam("Seed", seed)
+        gurobi.setParam("TimeLimit", time_limit)
+        for name, value in params.items():
+            gurobi.setParam(name, value)
+        gurobi.optimize()
+        runtimes.append(gurobi.Runtime if gurobi.Status == GRB.OPTIMAL else 2 * time_limit)
+    return runtimes
+
+
+def score(models, params, seeds, threads, time_limit):
+    # Total runtime of the models with params (see run())
+    return sum(sum(run(model, params, seeds, threads, time_limit)) for model in models)
+
+
+def sweep(models, seeds, threads, time_limit, rounds=2):
+    # Best parameters of PARAMETER_GRID for the total runtime of the models: each parameter in turn takes the value
+    # that improves the total by MIN_IMPROVEMENT or more, the others kept at their best values so far
+    best, best_score = {}, score(models, {}, seeds, threads, time_limit)
+    default_score = best_score
+    for _ in range(rounds):
+        improved = False
+        for name, values in PARAMETER_GRID.items():
+            for value in values:
+                if best.get(name, values[0]) == value:
+                    continue
+                candidate = {k: v for k, v in {**best, name: value}.items() if v != PARAMETER_GRID[k][0]}
+                candidate_score = score(models, candidate, seeds, threads, time_limit)
+                if candidate_score < best_score * (1 - MIN_IMPROVEMENT):
+                    best, best_score, improved = candidate, candidate_score, True
+        if not improved:
+            break
+    return best, best_score, default_score
+
+
+def gurobi_tune(models, seeds, threads, time_limit, tune_time_limit):
+    # Parameters of PARAMETER_GRID found by the Gurobi tuning tool on the largest model, scored as sweep() does
+    largest = max(models, key=lambda model: model.model.NumVars)
+    gurobi = largest.model
+    gurobi.setParam("OutputFlag", 0)
+    gurobi.reset(1)
+    gurobi.resetParams()
+    gurobi.setParam("OutputFlag", 0)
+    gurobi.setParam("Threads", threads)
+    gurobi.setParam("TimeLimit", time_limit)
+    gurobi.setParam("TuneTimeLimit", tune_time_limit)
+    gurobi.setParam("TuneResults", 1)
+    gurobi.tune()
+    params = {}
+    if gurobi.TuneResultCount > 0:
+        gurobi.getTuneResult(0)
+        for name in PARAMETER_GRID:
+            _, _, value, _, _, default = gurobi.getParamInfo(name)
+            if value != default:
+                params[name] = value
+    return (params, score(models, params, seeds, threads, time_limit),
+            score(models, {}, seeds, threads, time_limit))
+
+
+def build(instance, model_name, objective, oper_constr, formulation):
+    from batch import MODELS
+    from models import build_model
+
+    bridging, solver = MODELS[model_name]
+    return build_model(instance, objective, oper_constr, bridging, solver, formulation=formulation, tuned=False)
+
+
+def tune(instances, model_name, objective, oper_constr=False, formulation="current", method="sweep", seeds=(0,),
+         threads=1, time_limit=60.0, rounds=2, tune_time_limit=600.0, path=None):
+    # Tunes the parameters of each class of the instances and stores its profile, returns the profiles found
+    import gurobipy as gp
+
+    gp.setParam("OutputFlag", 0)
+    classes = {}
+    for instance in instances:
+        model = build(instance, model_name, objective, oper_constr, formulation)
+        cls = instance_class(model)
+        classes.setdefault(class_key(cls), (cls, []))[1].append((instance, model))
+
+    found = {}
+    for key, (cls, members) in sorted(classes.items()):
+        models = [model for _, model in members]
+        start = time.perf_counter()
+        if method == "sweep":
+            params, runtime, default_runtime = sweep(models, seeds, threads, time_limit, rounds)
+        else:
+            params, runtime, default_runtime = gurobi_tune(models, seeds, threads, time_limit, tune_time_limit)
+        found[key] = {"class": cls, "params": params, "runtime": runtime, "default_runtime": default_runtime,
+                      "instances": [os.path.basename(instance) for instance, _ in members], "method": method,
+                      "seeds": list(seeds), "time_limit": time_limit, "tuning_time": time.perf_counter() - start}
+        print(f"{key}: {params or 'defaults'}, {runtime:.3f}s against {default_runtime:.3f}s with the defaults "
+              f"({len(members)} instances)", flush=True)
+
+    profiles = dict(load_profiles(path))
+    profiles.update(found)
+    save_profiles(profiles, path)
+    return found
+
+
+def validate(instances, model_name, objective, oper_constr=False, formulation="current", seeds=(0,), threads=1,
+             time_limit=60.0, path=None):
+    # Runtimes of the instances with the default parameters and with their profile, one result per instance
+    import gurobipy as gp
+
+    gp.setParam("OutputFlag", 0)
+    profiles = load_profiles(path)
+    results = []
+    for instance in instances:
+        model = build(instance, model_name, objective, oper_constr, formulation)
+        key, profile = find_profile(profiles, instance_class(model))
+        default = run(model, {}, seeds, threads, time_limit)
+        tuned = default if profile is None else run(model, profile["params"], seeds, threads, time_limit)
+        results.append({"instance": os.path.basename(instance), "class": class_key(instance_class(model)),
+                        "profile": key, "default_runtime": sum(default), "tuned_runtime": sum(tuned)})
+        print(f"{os.path.basename(instance)}: profile {key}, {sum(tuned):.3f}s against {sum(default):.3f}s with the "
+              f"defaults", flush=True)
+    return results
+
+
+def speedup(results):
+    # Geometric mean of the default over tuned runtimes of the instances with a profile
+    ratios = [r["default_runtime"] / max(r["tuned_runtime"], 1e-6) for r in results if r["profile"] is not None]
+    return float(np.exp(np.mean(np.log(ratios)))) if ratios else None
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    if args.command == "show":
+        for key, profile in sorted(load_profiles(args.profiles).items()):
+            print(f"{key}: {profile['params'] or 'defaults'} ({profile['runtime']:.3f}s against "
+                  f"{profile['default_runtime']:.3f}s, {profile['method']} on {len(profile['instances'])} instances)")
+    elif args.command == "tune":
+        tune(args.instances, args.model, args.objective, args.oper_constr, args.formulation, args.method, args.seeds,
+             args.threads, args.time_limit, args.rounds, args.tune_time_limit, args.profiles)
+    else:
+        results = validate(args.instances, args.model, args.objective, args.oper_constr, args.formulation,
+                           args.seeds, args.threads, args.time_limit, args.profiles)
+        gain = speedup(results)
+        print("No profile matches the instances" if gain is None else f"Speedup (geometric mean): {gain:.2f}x")